@@ -1,8 +1,6 @@
-import asyncio
 from mpd import MPDClient
 import mpd.base as MPDBase
 import tinyxui
-import threading
 import datetime
 
 
@@ -57,56 +55,48 @@ def previous_song():
     client.previous()
 
 
-async def update_loop():
+def update():
     global last_song_file
-    while True:
-        try:
-            song = get_current_song()
-            status = client.status()
-            current_file = song["file"]
-            elapsed = int(status["time"].split(":")[0])
-            total = int(status["time"].split(":")[1])
-
-            progress = (elapsed / total) * 100
-            tinyxui.set_attribute("song_progress", "progress", progress)
-            tinyxui.set_data("elapsed_time", format_time(elapsed))
-            tinyxui.set_data("total_time", format_time(total))
-
-
-            if current_file != last_song_file:
-                # Song has changed
-                last_song_file = current_file
-
-                # Update labels
-                tinyxui.set_data("song_label", song["title"])
-                tinyxui.set_data("artist_label", song["artist"])
-                tinyxui.set_data("album_label", song["album"])
-
-
-                # Update album art
-                try:
-                    cover_art = client.albumart(song["file"])
-                    with open("out.png", "wb") as f:
-                        f.write(cover_art["binary"])
-                    tinyxui.refresh_image("cover_art")
-                except KeyError:
-                    pass
-                except MPDBase.CommandError:
-                    pass
-                    with open("out.png", "wb") as f:
-                        f.write(b"")
-                    tinyxui.refresh_image("cover_art")
-
-        except Exception:
-            # GUI not ready yet, or network hiccup
-            pass
-
-        await asyncio.sleep(0.1)
-
-
-# Run tinyxui in a separate thread
-def run_xui():
-    tinyxui.start("mpd.txm")
+    try:
+        song = get_current_song()
+        status = client.status()
+        current_file = song["file"]
+        elapsed = int(status["time"].split(":")[0])
+        total = int(status["time"].split(":")[1])
+
+        # Unchanged values are ignored by the model, so everything can
+        # be pushed every tick
+        tinyxui.model.update({
+            "song.progress": (elapsed / total) * 100,
+            "song.title": song["title"],
+            "song.artist": song["artist"],
+            "song.album": song["album"],
+            "time.elapsed": format_time(elapsed),
+            "time.total": format_time(total),
+        })
+
+        if current_file != last_song_file:
+            # Song has changed
+            last_song_file = current_file
+
+
+            # Update album art
+            try:
+                cover_art = client.albumart(song["file"])
+                with open("out.png", "wb") as f:
+                    f.write(cover_art["binary"])
+                tinyxui.refresh_image("cover_art")
+            except KeyError:
+                pass
+            except MPDBase.CommandError:
+                pass
+                with open("out.png", "wb") as f:
+                    f.write(b"")
+                tinyxui.refresh_image("cover_art")
+
+    except Exception:
+        # Network hiccup
+        pass
 
 
 # Bind buttons
@@ -116,5 +106,6 @@ tinyxui.bind_widget("previous_button", previous_song)
 
 
 if __name__ == "__main__":
-    threading.Thread(target=run_xui, daemon=True).start()
-    asyncio.run(update_loop())
+    # Poll mpd from the UI thread, no extra thread needed
+    tinyxui.every(100, update)
+    tinyxui.start("mpd.txm")
@@ -0,0 +1,101 @@
+import os
+
+# Windows are created hidden on SDL's dummy driver, so the tests don't need
+# a display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_RENDER_DRIVER", "software")
+
+import pytest
+import sdl2
+import sdl2.ext
+import sdl2.sdlttf
+from tinyxui import atlas, fonts, main, resources, scheduler
+
+
+@pytest.fixture
+def write_txm(tmp_path):
+    """
+    Returns a function that writes TXM text to a file and returns its path
+    """
+    count = [0]
+
+    def write(text):
+        count[0] += 1
+        path = tmp_path / f"document{count[0]}.txm"
+        path.write_text(text)
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def font():
+    """
+    The default font, the tests using it are skipped if it isn't installed
+    """
+    sdl2.ext.init()
+    sdl2.sdlttf.TTF_Init()
+    try:
+        try:
+            face = fonts.get()
+        except RuntimeError as e:
+            pytest.skip(str(e))
+        yield face
+    finally:
+        fonts.clear()
+        resources.release_all()
+        sdl2.sdlttf.TTF_Quit()
+        sdl2.ext.quit()
+
+
+@pytest.fixture
+def renderer():
+    """
+    A software renderer drawing to a 64x64 surface, for tests that need
+    textures but no window
+    """
+    surface = sdl2.SDL_CreateRGBSurfaceWithFormat(
+        0, 64, 64, 32, sdl2.SDL_PIXELFORMAT_ARGB8888)
+    sdl_renderer = sdl2.SDL_CreateSoftwareRenderer(surface)
+    yield sdl_renderer
+    atlas.clear()
+    fonts.release_renderer(sdl_renderer)
+    resources.release_all()
+    sdl2.SDL_DestroyRenderer(sdl_renderer)
+    sdl2.SDL_FreeSurface(surface)
+
+
+@pytest.fixture
+def app():
+    """
+    An App whose windows are opened headless. It is run for a single pass
+    at the end of the test, which closes everything like a normal quit.
+    """
+    instance = main.App()
+    yield instance
+    event = sdl2.SDL_Event()
+    event.type = sdl2.SDL_QUIT
+    sdl2.SDL_PushEvent(event)
+    instance.run()
+    main.bindings.clear()
+    main.model.values.clear()
+    main.model.take_pending()
+
+
+@pytest.fixture
+def open_window(app, write_txm):
+    """
+    Returns a function that opens a headless window of the app showing
+    TXM text, the tests using it are skipped if no font is installed
+    """
+    def open_window(text):
+        try:
+            return app.open(write_txm(text), headless=True)
+        except RuntimeError as e:
+            pytest.skip(str(e))
+    return open_window
+
+
+@pytest.fixture(autouse=True)
+def clear_timers():
+    yield
+    scheduler.clear()
@@ -0,0 +1,191 @@
+import gc
+import pytest
+import sdl2
+from PIL import Image
+from tinyxui import atlas, main, resources
+
+
+def surface(w, h):
+    return resources.track(
+        sdl2.SDL_CreateRGBSurfaceWithFormat(
+            0, w, h, 32, sdl2.SDL_PIXELFORMAT_ARGB8888),
+        "surface", w * h * 4)
+
+
+def test_page_rows(renderer):
+    page = atlas.Page(renderer, size=64)
+    assert page.allocate(10, 10) == (1, 1, 10, 10)
+    assert page.allocate(10, 8) == (13, 1, 10, 8)
+    # Too tall for the first row
+    assert page.allocate(10, 20) == (1, 13, 10, 20)
+    assert page.allocate(70, 10) is None
+    assert page.allocate(10, 40) is None
+
+
+def test_page_reuses_the_smallest_freed_space(renderer):
+    page = atlas.Page(renderer, size=64)
+    big = page.allocate(20, 20)
+    small = page.allocate(8, 8)
+    page.release(*big)
+    page.release(*small)
+    assert page.allocate(6, 6) == small
+    assert page.allocate(12, 12) == big
+    assert page.free == []
+
+
+def test_changed_image_keeps_its_space_when_it_fits(renderer):
+    first = atlas.add(renderer, "cover", surface(20, 20))
+    atlas.forget("cover")
+    assert atlas.get(renderer, "cover") is None
+
+    second = atlas.add(renderer, "cover", surface(10, 12))
+    assert second is first
+    assert second.rect == (first.x, first.y, 10, 12)
+    assert second.slot == (20, 20)
+
+
+def test_grown_image_frees_its_space(renderer):
+    first = atlas.add(renderer, "cover", surface(10, 10))
+    atlas.forget("cover")
+    second = atlas.add(renderer, "cover", surface(30, 30))
+    assert second is not first
+    assert (first.x, first.y, 10, 10) in first.page.free
+    # The freed space goes to the next image that fits
+    assert atlas.add(renderer, "icon", surface(8, 8)).rect[:2] == \
+        (first.x, first.y)
+
+
+def test_big_images_are_not_packed(renderer):
+    image = surface(atlas.MAX_SIZE + 1, 8)
+    assert not atlas.fits(image)
+    assert atlas.fits(surface(atlas.MAX_SIZE, atlas.MAX_SIZE))
+
+
+def test_refresh_updates_every_widget_showing_an_image(open_window, tmp_path):
+    path = tmp_path / "cover.png"
+    Image.new("RGBA", (16, 16), "red").save(path)
+    window = open_window(
+        f'image(id="a", src="{path}")\n'
+        f'image(id="b", src="{path}")\n')
+    window.render()
+    a, b = window.widget_map["a"], window.widget_map["b"]
+    assert a.texture_rect == b.texture_rect
+    old = a.texture_rect
+
+    Image.new("RGBA", (24, 8), "blue").save(path)
+    assert main.refresh_image("a")
+    window.render()
+    assert a.texture_rect[2:] == (24, 8)
+    assert b.texture_rect == a.texture_rect
+    assert old[:2] != a.texture_rect[:2]
+    assert old in atlas.pages[resources.address(window.sdl_renderer)][0].free
+
+
+class Owner:
+    """
+    Stand-in for a widget showing a packed image
+    """
+
+
+def test_space_is_freed_when_the_last_widget_lets_go(renderer):
+    image = surface(10, 10)
+    entry = atlas.add(renderer, "cover", image)
+    first, second = Owner(), Owner()
+    atlas.use(renderer, "cover", first)
+    atlas.use(renderer, "cover", second)
+
+    resources.release_owner(first)
+    assert atlas.get(renderer, "cover") is entry
+
+    resources.release_owner(second)
+    assert "cover" not in atlas.images
+    assert resources.address(image) not in resources.live
+    assert atlas.get(renderer, "cover") is None
+    assert entry.rect in entry.page.free
+
+
+def test_garbage_collected_widgets_let_go(renderer):
+    entry = atlas.add(renderer, "cover", surface(10, 10))
+    owner = Owner()
+    atlas.use(renderer, "cover", owner)
+    del owner
+    gc.collect()
+    resources.collect()
+    assert atlas.images == {} and atlas.users == {}
+    assert entry.rect in entry.page.free
+
+
+def test_showing_another_image_lets_the_old_one_go(renderer):
+    owner = Owner()
+    atlas.use(renderer, "first", owner)
+    atlas.add(renderer, "first", surface(8, 8))
+    atlas.add(renderer, "second", surface(8, 8))
+    atlas.use(renderer, "second", owner)
+    assert "first" not in atlas.images and "second" in atlas.images
+
+    atlas.use(renderer, None, owner)
+    assert atlas.images == {} and atlas.held[owner.resource_key] == set()
+
+
+def test_reloading_documents_keeps_images_bounded(open_window, tmp_path):
+    window = open_window('label() { "-" }\n')
+    for i in range(30):
+        image = tmp_path / f"icon{i}.png"
+        Image.new("RGBA", (16, 16), (i, 0, 0, 255)).save(image)
+        document = tmp_path / f"icons{i}.txm"
+        document.write_text(f'image(src="{image}")\nicon(src="{image}")\n')
+        window.load_txm(str(document))
+        gc.collect()
+        resources.collect()
+        window.render()
+
+    assert len(atlas.images) == 1
+    assert resources.stats()["categories"]["surface"]["count"] == 1
+    page, = atlas.pages[resources.address(window.sdl_renderer)]
+    assert page.bottom == 18
+
+
+def test_big_images_are_decoded_once(open_window, tmp_path, monkeypatch):
+    path = tmp_path / "cover.png"
+    Image.new("RGBA", (atlas.MAX_SIZE + 72, 200), "red").save(path)
+    document = f'image(id="cover", src="{path}")\n'
+    loads = []
+    load_image = resources.load_image
+    monkeypatch.setattr(resources, "load_image",
+                        lambda key: (loads.append(key), load_image(key))[1])
+
+    first, second = open_window(document), open_window(document)
+    first.render()
+    second.render()
+    assert loads == [str(path)]
+    assert first.widget_map["cover"].texture_rect == (0, 0, 200, 200)
+    assert second.widget_map["cover"].texture_rect == (0, 0, 200, 200)
+    assert resources.stats()["categories"]["surface"]["count"] == 1
+
+    # Pixels stay while any window shows the image
+    empty = tmp_path / "empty.txm"
+    empty.write_text('label() { "-" }\n')
+    first.load_txm(str(empty))
+    resources.collect()
+    assert str(path) in atlas.images
+    second.load_txm(str(empty))
+    resources.collect()
+    assert atlas.images == {}
+    assert "surface" not in resources.stats()["categories"]
+
+
+def test_refresh_reloads_big_images_everywhere(open_window, tmp_path):
+    path = tmp_path / "cover.png"
+    Image.new("RGBA", (200, 200), "red").save(path)
+    document = f'image(id="cover", src="{path}")\n'
+    first, second = open_window(document), open_window(document)
+    first.render()
+    second.render()
+
+    Image.new("RGBA", (300, 150), "blue").save(path)
+    assert main.refresh_image("cover")
+    first.render()
+    second.render()
+    for window in (first, second):
+        assert window.widget_map["cover"].texture_rect == (0, 0, 300, 150)
+    assert resources.stats()["categories"]["surface"]["count"] == 1
@@ -0,0 +1,51 @@
+from tinyxui import binding
+from tinyxui.txm import AST
+
+
+def test_set_reports_changes():
+    model = binding.Model()
+    assert model.set("title", "A")
+    assert not model.set("title", "A")
+    assert model.set("title", "B")
+    assert model["title"] == "B"
+    assert "title" in model
+    assert model.get("artist", "-") == "-"
+
+
+def test_pending_values_coalesce():
+    model = binding.Model()
+    model.update({"title": "A", "elapsed": 1})
+    model["elapsed"] = 2
+    model["elapsed"] = 3
+    assert model.take_pending() == {"title": "A", "elapsed": 3}
+    assert model.take_pending() == {}
+
+
+def test_unchanged_values_are_not_pending():
+    model = binding.Model()
+    model["title"] = "A"
+    model.take_pending()
+    model["title"] = "A"
+    assert model.take_pending() == {}
+
+
+def test_on_change_once_per_key_until_taken():
+    changed = []
+    model = binding.Model(on_change=changed.append)
+    model["title"] = "A"
+    model["title"] = "B"
+    model["elapsed"] = 1
+    model["title"] = "B"
+    assert changed == ["title", "elapsed"]
+
+    model.take_pending()
+    model["title"] = "C"
+    assert changed == ["title", "elapsed", "title"]
+
+
+def test_bound_keys():
+    widget = AST.parse_widget(
+        'label(bind="song.title", bind_visible="song.playing", text="-")')
+    assert binding.bound_keys(widget) == [
+        ("song.title", None), ("song.playing", "visible")]
+    assert binding.bound_keys(AST.parse_widget("label()")) == []
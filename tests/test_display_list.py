@@ -0,0 +1,127 @@
+import ctypes
+import sdl2
+from tinyxui import fonts
+from tinyxui.display_list import DisplayList
+
+RED = sdl2.SDL_Color(255, 0, 0, 255)
+BLUE = sdl2.SDL_Color(0, 0, 255, 255)
+
+
+def pixels(sdl_renderer):
+    """
+    Returns the rendered pixels as a list of 0xAARRGGBB values
+    """
+    buffer = (ctypes.c_uint32 * (64 * 64))()
+    sdl2.SDL_RenderReadPixels(sdl_renderer, None,
+                              sdl2.SDL_PIXELFORMAT_ARGB8888, buffer, 64 * 4)
+    return list(buffer)
+
+
+def test_rects_of_one_color_are_merged(renderer):
+    display_list = DisplayList(renderer)
+    display_list.fill_rect(0, 0, 4, 4, (255, 0, 0, 255))
+    display_list.fill_rect(8, 0, 4, 4, (255, 0, 0, 255))
+    display_list.fill_rect(0, 8, 4, 4, (0, 0, 255, 255))
+    display_list.fill_rect(0, 8, 0, 4, (0, 0, 255, 255))
+    assert [command[0] for command in display_list.commands] == \
+        ["fill", "fill"]
+    assert list(display_list.commands[0][2]) == [0, 0, 4, 4, 8, 0, 4, 4]
+
+
+def test_text_becomes_sprites(font, renderer):
+    display_list = DisplayList(renderer)
+    display_list.text(font, "Hi there", 0, 0, RED)
+    display_list.text(font, "More", 0, 20, BLUE)
+    assert len(display_list) == 1
+
+    kind, texture, vertices, indices = display_list.commands[0]
+    atlas = fonts.atlas_for(renderer)
+    assert kind == "sprites" and texture == atlas.texture
+    glyphs = len(atlas.layout(font, "Hi there", 0, 0)) + \
+        len(atlas.layout(font, "More", 0, 0))
+    assert len(vertices) == glyphs * 4
+    assert len(indices) == glyphs * 6
+    assert vertices[0][2] == (255, 0, 0, 255)
+    assert vertices[-1][2] == (0, 0, 255, 255)
+
+
+def test_text_is_drawn_in_its_color(font, renderer):
+    display_list = DisplayList(renderer)
+    display_list.text(font, "M", 4, 4, RED)
+    display_list.finish().replay(renderer)
+    drawn = [pixel for pixel in pixels(renderer) if pixel & 0xFFFFFF]
+    assert drawn
+    assert all(pixel & 0xFFFF == 0 for pixel in drawn)
+
+
+def test_list_is_stale_after_the_atlas_was_cleared(font, renderer):
+    display_list = DisplayList(renderer)
+    assert not display_list.stale()
+    display_list.text(font, "Hi", 0, 0, RED)
+    assert not display_list.stale()
+    fonts.atlas_for(renderer).clear()
+    assert display_list.stale()
+
+
+def test_dirty_layers_are_checked(font, renderer):
+    class Layer:
+        x = y = 0
+        width = height = 10
+        layer_dirty = False
+        layer_texture = None
+
+    layer = Layer()
+    layer.layer_list = DisplayList(renderer)
+    layer.layer_list.text(font, "Hi", 0, 0, RED)
+    display_list = DisplayList(renderer)
+    display_list.layer(layer)
+
+    fonts.atlas_for(renderer).clear()
+    # A clean layer keeps its rendered texture
+    assert not display_list.stale()
+    layer.layer_dirty = True
+    assert display_list.stale()
+
+
+def test_full_atlas_lays_the_string_out_again(font, renderer):
+    atlas = fonts.Atlas(renderer, size=48)
+    atlas.layout(font, "abcdefgh", 0, 0)
+    generation = atlas.generation
+    quads = atlas.layout(font, "ABCDEFGHIJ", 0, 0)
+    assert atlas.generation > generation
+    # Every glyph of the string is in the refilled atlas
+    sources = {source for source, _ in quads}
+    assert sources <= {glyph[:4] for glyph in atlas.glyphs.values()}
+    assert len(quads) == 10
+
+
+def test_resizable_widgets_are_drawn_at_their_current_size(renderer):
+    class Fill:
+        x, y, width, height = 2, 2, 10, 4
+
+    calls = []
+
+    def draw(widget, display_list):
+        calls.append((widget.x, widget.width))
+        display_list.fill_rect(widget.x, widget.y, widget.width,
+                               widget.height, (255, 0, 0, 255))
+
+    fill = Fill()
+    display_list = DisplayList(renderer)
+    display_list.resizable(fill, draw)
+    display_list.finish()
+
+    display_list.replay(renderer)
+    display_list.replay(renderer)
+    assert calls == [(2, 10)]
+    assert sum(1 for pixel in pixels(renderer) if pixel & 0xFF0000) == 40
+
+    # Moved widgets keep the position the list was built with, like the
+    # subtree of a layer while its texture is rendered
+    fill.x, fill.width = 30, 20
+    sdl2.SDL_SetRenderDrawColor(renderer, 0, 0, 0, 255)
+    sdl2.SDL_RenderClear(renderer)
+    display_list.replay(renderer)
+    assert calls == [(2, 10), (2, 20)]
+    assert fill.x == 30
+    assert sum(1 for pixel in pixels(renderer) if pixel & 0xFF0000) == 80
@@ -0,0 +1,63 @@
+from tinyxui import fonts, layout
+from tinyxui.txm import AST
+
+TEXT = "The quick brown fox jumps over the lazy dog"
+
+
+def test_wrap_fits_the_width(font):
+    width = fonts.text_width(font, "quick brown")
+    lines = fonts.wrap(font, TEXT, width)
+    assert len(lines) > 1
+    assert all(fonts.text_width(font, line) <= width for line in lines)
+    assert " ".join(lines) == TEXT
+
+
+def test_wrap_keeps_paragraphs(font):
+    lines = fonts.wrap(font, "One\nTwo", 1000)
+    assert lines == ("One", "Two")
+
+
+def test_wrap_breaks_long_words(font):
+    width = fonts.text_width(font, "abc")
+    lines = fonts.wrap(font, "abcdefghij", width)
+    assert "".join(lines) == "abcdefghij"
+    assert all(fonts.text_width(font, line) <= width for line in lines)
+
+
+def test_wrap_at_width_0_leaves_lines_alone(font, monkeypatch):
+    def fit(*args):
+        raise AssertionError("fit() called at width 0")
+    monkeypatch.setattr(fonts, "fit", fit)
+    assert fonts.wrap(font, "One two\nthree", 0) == ("One two", "three")
+
+
+def test_wrap_is_cached(font):
+    width = fonts.text_width(font, "quick brown")
+    assert fonts.wrap(font, TEXT, width) is fonts.wrap(font, TEXT, width)
+
+
+def test_ellipsize(font):
+    assert fonts.ellipsize(font, "Short", 1000) == "Short"
+    width = fonts.text_width(font, "The quick")
+    line = fonts.ellipsize(font, TEXT, width)
+    assert line.endswith(fonts.ELLIPSIS)
+    assert TEXT.startswith(line[:-1])
+    assert fonts.text_width(font, line) <= width
+
+
+def test_expanding_wrap_labels_measure_one_line_per_paragraph(font):
+    widget = AST.parse_widget(
+        f'label(wrap=true, expand=true) {{ "{TEXT}" }}')
+    assert layout.measure_label(widget, font) == (0, font.height)
+
+    widget.wrap_width = fonts.text_width(font, "quick brown")
+    lines = fonts.wrap(font, TEXT, widget.wrap_width)
+    assert layout.measure_label(widget, font)[1] == \
+        font.height + (len(lines) - 1) * font.line_skip
+
+
+def test_wrap_labels_ask_for_their_width(font):
+    widget = AST.parse_widget(f'label(wrap=true, width=60) {{ "{TEXT}" }}')
+    width, height = layout.measure_label(widget, font)
+    assert width == 60
+    assert height > font.height
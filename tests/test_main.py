@@ -0,0 +1,554 @@
+import ctypes
+import pytest
+import sdl2
+import threading
+from tinyxui import fonts, layout, main, resources, schema
+from tinyxui.txm import AST
+
+DOCUMENT = """\
+box(id="toolbar", class="toolbar") {
+    button(id="play", class="flat") { "Play" }
+    button(id="stop") { "Stop" }
+    label(id="status", class="status") { "Idle" }
+}
+"""
+
+
+def ids(widgets):
+    return [widget.props["id"] for widget in widgets]
+
+
+def test_query(open_window):
+    window = open_window(DOCUMENT)
+    assert ids(window.query("button")) == ["play", "stop"]
+    assert ids(window.query(".flat")) == ["play"]
+    assert ids(window.query("#status")) == ["status"]
+    assert ids(window.query("button.flat")) == ["play"]
+    assert ids(window.query("label, .flat, button")) == \
+        ["status", "play", "stop"]
+    assert window.query("#missing") == []
+    assert len(window.query("*")) == 5
+
+
+def test_query_states(open_window):
+    window = open_window(DOCUMENT)
+    assert window.query("button:hover") == []
+    window.widget_map["stop"].hovered = True
+    assert ids(window.query("button:hover")) == ["stop"]
+
+
+def test_query_rejects_unsupported_selectors(open_window):
+    window = open_window(DOCUMENT)
+    with pytest.raises(ValueError, match="Unsupported selector"):
+        window.query("box > label")
+
+
+def test_class_index_follows_changes(open_window):
+    window = open_window(DOCUMENT)
+    window.set_attribute("stop", "class", "flat")
+    window.set_attribute("play", "class", "wide")
+    assert ids(window.query(".flat")) == ["stop"]
+    assert ids(window.query(".wide")) == ["play"]
+
+
+def test_module_query_covers_every_window(open_window):
+    open_window(DOCUMENT)
+    open_window(DOCUMENT)
+    assert ids(main.query("#play")) == ["play", "play"]
+
+
+def test_set_attribute_where(open_window):
+    window = open_window(DOCUMENT)
+    assert window.set_attribute_where("button", "width", 80) == 2
+    assert [widget.props["width"] for widget in window.query("button")] == \
+        [80, 80]
+
+
+def test_set_attribute_where_validates_first(open_window):
+    window = open_window(DOCUMENT)
+    window.set_attribute_where("button", "width", 80)
+    with pytest.raises(ValueError):
+        main.set_attribute_where("button, label", "wrap", "sometimes")
+    with pytest.raises(ValueError):
+        window.set_attribute_where("button", "width", -1)
+    assert [widget.props["width"] for widget in window.query("button")] == \
+        [80, 80]
+
+
+def test_transaction_applies_once(open_window, monkeypatch):
+    window = open_window(DOCUMENT)
+    window.needs_redraw = window.needs_layout = False
+    toolbar = window.widget_map["toolbar"]
+    toolbar.measured = (1, 1)
+    calls = []
+    mark_ancestors = main.mark_ancestors
+    monkeypatch.setattr(main, "mark_ancestors",
+                        lambda changed: (calls.append(dict(changed)),
+                                         mark_ancestors(changed)))
+
+    with main.transaction():
+        assert window.set_many({"play": "Pause", "status": "Playing",
+                                "missing": "-"}) == 2
+        with main.transaction():
+            window.set_data("stop", "Halt")
+        assert not window.needs_redraw
+        assert toolbar.measured == (1, 1)
+
+    assert len(calls) == 1
+    assert set(ids(calls[0])) == {"play", "stop", "status"}
+    assert window.needs_redraw and window.needs_layout
+    assert toolbar.measured is None
+
+
+def test_unchanged_values_do_nothing(open_window):
+    window = open_window(DOCUMENT)
+    window.needs_redraw = window.needs_layout = False
+    window.set_data("status", "Idle")
+    window.set_attribute("play", "class", "flat")
+    assert not window.needs_redraw
+
+
+def place(widget, x, y, width, height):
+    widget.x, widget.y, widget.width, widget.height = x, y, width, height
+    return widget
+
+
+@pytest.fixture
+def overflowing(write_txm):
+    """
+    A 100x100 root with a box at (10, 10, 50, 50) whose label overflows
+    it to (40, 40, 120, 60)
+    """
+    _, root = AST.generate_ast(write_txm(
+        "box() {\n"
+        "    label()\n"
+        "}\n"))
+    box = place(root.children[0], 10, 10, 50, 50)
+    place(root, 0, 0, 100, 100)
+    place(box.children[0], 40, 40, 80, 20)
+    return root
+
+
+def test_hit_test_finds_the_deepest_widget(overflowing):
+    box = overflowing.children[0]
+    layout.compute_bounds(overflowing)
+    assert main.hit_test(overflowing, 20, 20) == [overflowing, box]
+    assert main.hit_test(overflowing, 45, 45) == \
+        [overflowing, box, box.children[0]]
+    assert main.hit_test(overflowing, 200, 200) == []
+
+
+def test_hit_test_reaches_overflowing_children(overflowing):
+    box = overflowing.children[0]
+    layout.compute_bounds(overflowing)
+    assert main.hit_test(overflowing, 90, 50) == \
+        [overflowing, box, box.children[0]]
+
+
+def test_hit_test_respects_clip_containers(overflowing):
+    box = overflowing.children[0]
+    box.attributes["clip"] = True
+    schema.apply(box)
+    layout.compute_bounds(overflowing)
+    assert main.hit_test(overflowing, 90, 50) == [overflowing]
+    assert main.hit_test(overflowing, 45, 45) == \
+        [overflowing, box, box.children[0]]
+
+
+def test_hit_test_nested_clips_intersect(overflowing):
+    box = overflowing.children[0]
+    label = box.children[0]
+    place(label, 20, 20, 20, 20)
+    label.children.append(place(AST.parse_widget("label()"),
+                                50, 15, 30, 30))
+    label.children[0].parent = label
+    for widget in (box, label):
+        widget.attributes["clip"] = True
+        schema.apply(widget)
+    layout.compute_bounds(overflowing)
+    # Inside the box but outside the label
+    assert main.hit_test(overflowing, 55, 30) == [overflowing, box]
+    # Inside the label's child, outside both clips
+    assert main.hit_test(overflowing, 70, 30) == [overflowing]
+
+
+STACK = """\
+stack(id="pages", active="home") {
+    box(page="home") {
+        label(id="title", bind="song.title") { "-" }
+    }
+    box(page="queue") {
+        label(id="next", bind="song.title") { "-" }
+        label(class="queued") { "Later" }
+    }
+}
+"""
+
+
+def test_hidden_pages_are_parsed_when_shown(open_window):
+    window = open_window(STACK)
+    stack = window.widget_map["pages"]
+    queue = stack.children[1]
+    assert queue.source is not None and queue.children == []
+    assert "next" not in window.widget_map
+    assert window.query(".queued") == []
+
+    window.set_page("pages", "queue")
+    assert queue.source is None
+    assert window.widget_map["next"].parent is queue
+    assert len(window.query(".queued")) == 1
+
+
+def test_shown_pages_are_bound_once(open_window):
+    window = open_window(STACK)
+    window.set_page("pages", "queue")
+    window.set_page("pages", "home")
+    window.set_page("pages", 1)
+    assert ids(widget for widget, _ in window.data_bindings["song.title"]) \
+        == ["title", "next"]
+
+    main.model["song.title"] = "Intro"
+    window.app.apply_bindings()
+    assert window.widget_map["title"].data == "Intro"
+    assert window.widget_map["next"].data == "Intro"
+
+
+def test_shown_pages_get_current_model_values(open_window):
+    window = open_window(STACK)
+    main.model["song.title"] = "Intro"
+    window.app.apply_bindings()
+    window.set_page("pages", "queue")
+    assert window.widget_map["next"].data == "Intro"
+
+
+def test_model_changes_only_redraw_bound_windows(open_window):
+    bound = open_window(STACK)
+    other = open_window(DOCUMENT)
+    for window in (bound, other):
+        window.needs_redraw = False
+
+    main.model["volume"] = 10
+    assert not bound.needs_redraw and not other.needs_redraw
+    main.model["song.title"] = "Intro"
+    assert bound.needs_redraw and not other.needs_redraw
+
+
+def test_module_functions_act_on_every_window(open_window):
+    first = open_window(DOCUMENT)
+    second = open_window(DOCUMENT)
+    assert main.set_data("status", "Playing")
+    assert first.widget_map["status"].data == "Playing"
+    assert second.widget_map["status"].data == "Playing"
+    assert not main.set_data("missing", "-")
+
+
+def test_events_go_to_their_window(open_window):
+    first = open_window(DOCUMENT)
+    second = open_window(DOCUMENT)
+    event = sdl2.SDL_Event()
+    event.type = sdl2.SDL_WINDOWEVENT
+    event.window.windowID = second.id
+    assert first.app.window_for(event) is second
+    event.window.windowID = 0
+    assert first.app.window_for(event) is first
+
+
+def test_closing_a_window_keeps_the_others(open_window):
+    first = open_window(DOCUMENT)
+    second = open_window(DOCUMENT)
+    first.close()
+    assert main.windows() == [second]
+    assert main.set_data("status", "Playing")
+    assert second.widget_map["status"].data == "Playing"
+
+
+def test_app_shuts_down_when_a_callback_raises(open_window, monkeypatch):
+    window = open_window(DOCUMENT)
+    app = window.app
+    shutdown = []
+
+    def on_frame(seconds, relayout):
+        raise RuntimeError("broken frame hook")
+    monkeypatch.setattr(main, "on_frame", on_frame)
+    monkeypatch.setattr(main, "on_shutdown", lambda: shutdown.append(1))
+
+    with pytest.raises(RuntimeError, match="broken frame hook"):
+        app.run()
+    assert main.app is None
+    assert app.windows == [] and app.font is None
+    assert shutdown == [1]
+
+
+LAYERED = """\
+box(id="panel", cache=true) {
+    label(id="status") { "Idle" }
+}
+image(id="logo", src="missing.png")
+"""
+
+
+def pixels(window):
+    width, height = window.size
+    buffer = (ctypes.c_uint32 * (width * height))()
+    sdl2.SDL_RenderReadPixels(window.sdl_renderer, None,
+                              sdl2.SDL_PIXELFORMAT_ARGB8888, buffer,
+                              width * 4)
+    return bytes(buffer)
+
+
+def reset(window, event_type):
+    event = sdl2.SDL_Event()
+    event.type = event_type
+    window.handle_render_reset(event)
+
+
+def test_target_reset_redraws_layers(open_window):
+    window = open_window(LAYERED)
+    window.render()
+    panel = window.widget_map["panel"]
+    assert not panel.layer_dirty and not window.needs_redraw
+
+    reset(window, sdl2.SDL_RENDER_TARGETS_RESET)
+    assert panel.layer_dirty
+    assert window.needs_rebuild and window.needs_redraw
+    assert hasattr(window.widget_map["logo"], "texture_cache")
+
+
+def test_device_reset_replaces_every_texture(open_window):
+    window = open_window(LAYERED)
+    window.render()
+    before = pixels(window)
+    assert any(before)
+    panel, logo = window.widget_map["panel"], window.widget_map["logo"]
+    glyphs = fonts.atlas_for(window.sdl_renderer)
+    old = [glyphs.texture, panel.layer_texture, logo.texture_cache]
+
+    reset(window, sdl2.SDL_RENDER_DEVICE_RESET)
+    assert not any(resources.address(texture) in resources.live
+                   for texture in old)
+    assert not hasattr(panel, "layer_texture")
+    assert not hasattr(logo, "texture_cache")
+    assert panel.layer_list is None
+    assert window.needs_rebuild and window.needs_redraw
+
+    window.render()
+    assert fonts.atlas_for(window.sdl_renderer) is not glyphs
+    assert panel.layer_texture and logo.texture_cache
+    assert not panel.layer_dirty and not window.display_list.stale()
+    assert pixels(window) == before
+
+
+def test_lists_using_a_replaced_glyph_atlas_are_stale(open_window):
+    window = open_window(LAYERED)
+    window.render()
+    layer_list = window.widget_map["panel"].layer_list
+    assert not layer_list.stale()
+    fonts.release_renderer(window.sdl_renderer)
+    assert layer_list.stale()
+
+
+PROGRESS = """\
+box() {
+    progressbar(id="plain", progress=10, width=200)
+    progressbar(id="smooth", progress=0, width=200, interpolate=100)
+}
+"""
+
+
+def test_progress_takes_the_fast_path(open_window):
+    window = open_window(PROGRESS)
+    window.render()
+    display_list = window.display_list
+    bar = window.widget_map["plain"]
+
+    assert window.set_progress("plain", 50)
+    assert window.needs_redraw
+    assert not window.needs_layout and not window.needs_rebuild
+    assert bar.fill.width == 100
+    window.render()
+    assert window.display_list is display_list
+
+    main.set_attribute("plain", "progress", 75)
+    assert not window.needs_layout and not window.needs_rebuild
+    assert bar.fill.width == 150
+
+
+def test_progress_is_clamped(open_window):
+    window = open_window(PROGRESS)
+    window.render()
+    bar = window.widget_map["plain"]
+    window.set_progress("plain", 150)
+    assert bar.props["progress"] == 100 and bar.fill.width == 200
+    main.set_progress("plain", -20)
+    assert bar.props["progress"] == 0 and bar.fill.width == 0
+    assert not window.set_progress("missing", 10)
+
+
+def test_progress_interpolates(open_window, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(main.time, "monotonic", lambda: now[0])
+    window = open_window(PROGRESS)
+    window.render()
+    bar = window.widget_map["smooth"]
+
+    window.set_progress("smooth", 80)
+    assert window.animating == {bar}
+    now[0] += 0.05
+    assert window.step_animations()
+    assert bar.fill.progress == pytest.approx(40)
+    assert bar.fill.width == 80
+
+    now[0] += 0.05
+    window.render()
+    assert bar.fill.progress == 80 and bar.fill.width == 160
+    assert window.animating == set() and bar.animation is None
+    assert not window.needs_redraw and not window.needs_rebuild
+
+
+def test_other_threads_stay_out_of_transactions(open_window):
+    window = open_window(DOCUMENT)
+    window.render()
+    window.needs_redraw = False
+    toolbar = window.widget_map["toolbar"]
+    assert toolbar.measured is not None
+
+    with main.transaction():
+        window.set_data("play", "Pause")
+        thread = threading.Thread(
+            target=window.set_data, args=("status", "Playing"))
+        thread.start()
+        thread.join()
+        # Applied right away, without joining the UI thread's transaction
+        assert list(main.dirty_widgets) == [window.widget_map["play"]]
+        assert toolbar.measured is None
+        assert window.needs_redraw
+
+
+def event(event_type, window=None, x=0, y=0):
+    new = sdl2.SDL_Event()
+    new.type = event_type
+    if event_type == sdl2.SDL_MOUSEMOTION:
+        new.motion.windowID = window.id
+        new.motion.x, new.motion.y = x, y
+    elif event_type in (sdl2.SDL_MOUSEBUTTONDOWN, sdl2.SDL_MOUSEBUTTONUP):
+        new.button.windowID = window.id
+        new.button.x, new.button.y = x, y
+    elif event_type == sdl2.SDL_WINDOWEVENT:
+        new.window.windowID = window.id
+        new.window.event = sdl2.SDL_WINDOWEVENT_SIZE_CHANGED
+        new.window.data1, new.window.data2 = x, y
+    return new
+
+
+def pump(app, events):
+    """
+    Queue events and let the App handle them in one pass
+    """
+    sdl2.SDL_FlushEvents(sdl2.SDL_FIRSTEVENT, sdl2.SDL_LASTEVENT)
+    for queued in events[1:]:
+        sdl2.SDL_PushEvent(queued)
+    return app.pump_events(events[0], True)
+
+
+@pytest.fixture
+def hit_tests(monkeypatch):
+    """
+    Points the widget trees were hit tested at
+    """
+    points = []
+    hit_test = main.hit_test
+
+    def record(widget, x, y, clip=None):
+        # Only the outer call, hit_test() recurses into the children
+        if widget.parent is None:
+            points.append((x, y))
+        return hit_test(widget, x, y, clip)
+    monkeypatch.setattr(main, "hit_test", record)
+    return points
+
+
+def test_mouse_motion_is_coalesced(open_window, hit_tests):
+    window = open_window(DOCUMENT)
+    window.render()
+    motion = [event(sdl2.SDL_MOUSEMOTION, window, x % 300, 5)
+              for x in range(500)]
+    assert pump(window.app, motion)
+    assert hit_tests == [(499 % 300, 5)]
+
+
+def test_unhandled_events_skip_the_window_lookup(open_window, monkeypatch):
+    window = open_window(DOCUMENT)
+    lookups = []
+    monkeypatch.setattr(window.app, "window_for",
+                        lambda event: lookups.append(event.type))
+    assert pump(window.app, [event(sdl2.SDL_KEYDOWN) for _ in range(50)])
+    assert lookups == []
+    assert not pump(window.app, [event(sdl2.SDL_KEYUP),
+                                 event(sdl2.SDL_QUIT)])
+
+
+def test_clicks_hit_test_where_they_happen(open_window, hit_tests):
+    window = open_window(DOCUMENT)
+    window.render()
+    play = window.widget_map["play"]
+    x, y = play.x + 2, play.y + 2
+    clicks = []
+    window.bind_widget("play", lambda: clicks.append("play"))
+
+    assert pump(window.app, [
+        event(sdl2.SDL_MOUSEMOTION, window, 300, 200),
+        event(sdl2.SDL_MOUSEMOTION, window, 290, 190),
+        event(sdl2.SDL_MOUSEBUTTONDOWN, window, x, y),
+        event(sdl2.SDL_MOUSEBUTTONUP, window, x, y),
+    ])
+    # The pending motion is applied first, then each click at its position
+    assert hit_tests == [(290, 190), (x, y), (x, y)]
+    assert clicks == ["play"]
+    assert window.hovered_path[-1] is play
+
+
+@pytest.fixture
+def layouts(monkeypatch):
+    """
+    Records the size of every layout pass over a whole document
+    """
+    sizes = []
+    compute_layout = layout.compute_layout
+
+    def record(widget, *args, **kwargs):
+        if widget.parent is None:
+            sizes.append((kwargs.get("width"), kwargs.get("height")))
+        return compute_layout(widget, *args, **kwargs)
+    monkeypatch.setattr(layout, "compute_layout", record)
+    return sizes
+
+
+def test_resizes_lay_out_once_at_the_last_size(open_window, layouts):
+    window = open_window(DOCUMENT)
+    window.render()
+    layouts.clear()
+
+    drag = [event(sdl2.SDL_WINDOWEVENT, window, 300 + n, 200 + n)
+            for n in range(40)]
+    assert pump(window.app, drag)
+    assert window.size == (339, 239)
+    assert layouts == []
+
+    window.render()
+    assert layouts == [(339, 239)]
+    assert window.widgets.width == 339
+    window.render()
+    assert layouts == [(339, 239)]
+
+
+def test_resizes_keep_measurements(open_window):
+    window = open_window(DOCUMENT)
+    window.render()
+    measured = {widget_id: widget.measured
+                for widget_id, widget in window.widget_map.items()}
+    assert None not in measured.values()
+
+    assert pump(window.app, [event(sdl2.SDL_WINDOWEVENT, window, 420, 260)])
+    window.render()
+    for widget_id, widget in window.widget_map.items():
+        assert widget.measured is measured[widget_id]
@@ -0,0 +1,93 @@
+import io
+import pytest
+import sdl2
+from PIL import Image
+from tinyxui import main, recorder, scheduler
+
+DOCUMENT = """\
+box() {
+    button(id="play") { "Play" }
+    label(id="status") { "Idle" }
+    image(id="cover", src="missing.png")
+}
+"""
+
+
+@pytest.fixture
+def clicks():
+    """
+    What the status label and cover showed when play was clicked
+    """
+    seen = []
+
+    def play():
+        window = main.windows()[0]
+        seen.append((window.widget_map["status"].data,
+                     getattr(window.widget_map["cover"], "image_data", None)))
+    main.bind_widget("play", play)
+    yield seen
+    main.bindings.clear()
+
+
+def push(event_type, window, x=0, y=0):
+    event = sdl2.SDL_Event()
+    event.type = event_type
+    event.button.windowID = window.id
+    event.button.x, event.button.y = x, y
+    sdl2.SDL_PushEvent(event)
+
+
+def click(window, widget_id):
+    widget = window.widget_map[widget_id]
+    x, y = widget.x + 2, widget.y + 2
+    push(sdl2.SDL_MOUSEBUTTONDOWN, window, x, y)
+    push(sdl2.SDL_MOUSEBUTTONUP, window, x, y)
+
+
+def png():
+    data = io.BytesIO()
+    Image.new("RGBA", (8, 8), "blue").save(data, "PNG")
+    return data.getvalue()
+
+
+def test_session_round_trip(font, write_txm, tmp_path, clicks):
+    document = write_txm(DOCUMENT)
+    path = str(tmp_path / "session.jsonl")
+    cover = png()
+
+    recorder.start_recording(path)
+    app = main.App()
+    window = app.open(document, headless=True)
+    scheduler.after(10, lambda: main.set_data("status", "Playing"))
+    scheduler.after(15, lambda: main.set_image("cover", cover))
+    scheduler.after(30, lambda: click(window, "play"))
+    scheduler.after(60, lambda: push(sdl2.SDL_QUIT, window))
+    app.run()
+
+    assert recorder.session is None
+    kinds = [entry[0] for entry in recorder.load_session(path)]
+    assert kinds[0] == "txm"
+    assert kinds.index("set_data") < kinds.index("set_image") < \
+        kinds.index("down") < kinds.index("up")
+    assert clicks == [("Playing", cover)]
+
+    result = recorder.replay(path)
+    assert clicks == [("Playing", cover), ("Playing", cover)]
+    assert result["frames"] > 0
+    assert 1 <= result["layouts"] <= result["frames"]
+    assert result["p50"] <= result["p99"] <= result["max"]
+
+
+def test_replay_needs_a_document(tmp_path):
+    path = tmp_path / "session.jsonl"
+    path.write_text('["set_data",1.0,"status","Playing"]\n')
+    with pytest.raises(ValueError, match="does not name a TXM document"):
+        recorder.replay(str(path))
+
+
+def test_percentile():
+    assert recorder.percentile([], 50) == 0
+    values = list(range(1, 101))
+    assert recorder.percentile(values, 50) == 50
+    assert recorder.percentile(values, 99) == 99
+    assert recorder.percentile(values, 100) == 100
@@ -0,0 +1,131 @@
+import socket
+import threading
+import time
+from multiprocessing import shared_memory
+import pytest
+from tinyxui import remote, scheduler
+
+DOCUMENT = """\
+box() {
+    label(id="title") { "-" }
+    label(id="status") { "Idle" }
+}
+"""
+
+
+@pytest.fixture
+def pair():
+    ui, client = socket.socketpair()
+    yield ui, client
+    ui.close()
+    client.close()
+
+
+def test_messages_round_trip(pair):
+    ui, client = pair
+    remote.send_message(client, [["set_data", "title", "Intro"]])
+    assert remote.recv_message(ui) == [["set_data", "title", "Intro"]]
+    client.close()
+    assert remote.recv_message(ui) is None
+
+
+def test_failing_operations_are_reported(open_window, pair):
+    window = open_window(DOCUMENT)
+    ui, client = pair
+    remote.Server("unused").apply(ui, [
+        ["set_data", "title", "Intro"],
+        ["set_attribute", "status", "wrap", "sometimes"],
+        ["dance"],
+        ["set_data", "status", "Playing"],
+    ])
+
+    assert remote.recv_message(client)[:2] == ["error", "set_attribute"]
+    assert remote.recv_message(client) == \
+        ["error", "dance", "Unknown operation 'dance'!"]
+    assert window.widget_map["title"].data == "Intro"
+    assert window.widget_map["status"].data == "Playing"
+
+
+def test_read_batch_copies_images():
+    segment = shared_memory.SharedMemory(create=True, size=8)
+    try:
+        segment.buf[:4] = b"\x89PNG"
+        batch, released = remote.Server("unused").read_batch([
+            ["set_data", "title", "Intro"],
+            ["image", "cover", segment.name, 4],
+        ])
+    finally:
+        segment.close()
+        segment.unlink()
+    assert batch == [["set_data", "title", "Intro"],
+                     ("image", "cover", b"\x89PNG")]
+    assert released == [segment.name]
+
+
+def test_broken_batches_disconnect_the_client(pair):
+    ui, client = pair
+    reader = threading.Thread(target=remote.Server("unused").read_loop,
+                              args=(ui,))
+    reader.start()
+    remote.send_message(client, [["image", "cover", "tinyxui_gone", 4]])
+    reader.join(5)
+
+    kind, op, _ = remote.recv_message(client)
+    assert (kind, op) == ("error", None)
+    assert remote.recv_message(client) is None
+    assert scheduler.next_timeout() is None
+
+
+def test_batches_apply_on_the_ui_thread(open_window, pair):
+    window = open_window(DOCUMENT)
+    ui, client = pair
+    reader = threading.Thread(target=remote.Server("unused").read_loop,
+                              args=(ui,))
+    reader.start()
+    remote.send_message(client, [["set_data", "title", "Intro"]])
+    client.shutdown(socket.SHUT_WR)
+    reader.join(5)
+
+    assert window.widget_map["title"].data == "-"
+    scheduler.run_due()
+    assert window.widget_map["title"].data == "Intro"
+
+
+def test_client_reports_errors(tmp_path):
+    server = remote.Server(str(tmp_path / "ui.sock"))
+    server.listen()
+    errors = []
+    received = threading.Event()
+    client = remote.connect(
+        server.address,
+        on_error=lambda kind, error: (errors.append((kind, error)),
+                                      received.set()))
+    try:
+        # Wait for the server to accept the client
+        for _ in range(500):
+            if server.connections:
+                break
+            time.sleep(0.01)
+        server.broadcast(["error", "set_data", "broken"])
+        assert received.wait(5)
+        assert errors == [("set_data", "broken")]
+    finally:
+        client.close()
+        server.close()
+
+
+def test_close_stops_accepting(tmp_path):
+    server = remote.Server(str(tmp_path / "ui.sock"))
+    server.listen()
+    client = remote.connect(server.address)
+    try:
+        server.close()
+        server.accept_thread.join(5)
+        assert not server.accept_thread.is_alive()
+        assert server.listener is None
+        assert not (tmp_path / "ui.sock").exists()
+        # Connected clients are told the UI went away
+        client.reader.join(5)
+        assert not client.reader.is_alive()
+    finally:
+        client.close()
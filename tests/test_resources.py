@@ -0,0 +1,116 @@
+import gc
+import io
+import sdl2
+from PIL import Image
+from tinyxui import resources
+
+
+class Owner:
+    pass
+
+
+def surface(w, h):
+    return resources.track(
+        sdl2.SDL_CreateRGBSurfaceWithFormat(
+            0, w, h, 32, sdl2.SDL_PIXELFORMAT_ARGB8888),
+        "surface", w * h * 4)
+
+
+def tracked(*handles):
+    return [resources.address(handle) in resources.live
+            for handle in handles]
+
+
+def test_owned_objects_are_freed_with_their_owner(renderer):
+    owner = Owner()
+    image = surface(8, 8)
+    texture = resources.create_texture(renderer, image, owner=owner)
+    target = resources.create_target(renderer, 4, 4, owner=owner)
+    key = owner.resource_key
+    assert resources.owners[key] == {resources.address(texture),
+                                     resources.address(target)}
+
+    del owner
+    gc.collect()
+    # Only queued, SDL objects are freed on the UI thread
+    assert key in resources.dead_owners
+    assert tracked(texture, target) == [True, True]
+
+    resources.collect()
+    assert tracked(image, texture, target) == [True, False, False]
+    assert key not in resources.owners and resources.dead_owners == []
+
+
+def test_owner_keys_are_never_reused(renderer):
+    first, second = Owner(), Owner()
+    assert resources.own(first) == resources.own(first)
+    assert resources.own(first) != resources.own(second)
+
+
+def test_release_hooks_get_the_owner_key(renderer, monkeypatch):
+    released = []
+    monkeypatch.setattr(resources, "release_hooks", [released.append])
+    owner = Owner()
+    resources.create_target(renderer, 4, 4, owner=owner)
+    resources.release_owner(owner)
+    assert released == [owner.resource_key]
+
+
+def test_release_is_idempotent(renderer):
+    image = surface(4, 4)
+    resources.release(image)
+    resources.release(image)
+    resources.release(None)
+    assert tracked(image) == [False]
+
+
+LAYERED = """\
+box(id="panel", cache=true) {
+    label(id="status") { "Idle" }
+}
+image(id="logo", src="missing.png")
+"""
+
+
+def test_reloading_frees_the_old_documents_textures(open_window, write_txm):
+    window = open_window(LAYERED)
+    cover = io.BytesIO()
+    Image.new("RGBA", (8, 8), "blue").save(cover, "PNG")
+    # Set images get a texture of their own instead of atlas space
+    window.set_image("logo", cover.getvalue())
+    window.render()
+    panel, logo = window.widget_map["panel"], window.widget_map["logo"]
+    old = [panel.layer_texture, logo.texture_cache]
+    textures = resources.stats()["categories"]["texture"]["count"]
+
+    for _ in range(3):
+        window.load_txm(write_txm(LAYERED))
+        window.set_image("logo", cover.getvalue())
+        window.render()
+    resources.collect()
+
+    assert tracked(*old) == [False, False]
+    assert resources.stats()["categories"]["texture"]["count"] == textures
+
+
+def test_stats_count_and_size_each_category(renderer):
+    resources.release_all()
+    assert resources.stats() == {"count": 0, "bytes": 0, "categories": {}}
+
+    surface(4, 4)
+    image = surface(8, 2)
+    resources.create_texture(renderer, image)
+    resources.create_target(renderer, 10, 10)
+    assert resources.stats() == {
+        "count": 4,
+        "bytes": 64 + 64 + 64 + 400,
+        "categories": {
+            "surface": {"count": 2, "bytes": 128},
+            "texture": {"count": 2, "bytes": 464},
+        },
+    }
+
+    resources.release(image)
+    stats = resources.stats()
+    assert (stats["count"], stats["bytes"]) == (3, 528)
+    assert stats["categories"]["surface"] == {"count": 1, "bytes": 64}
@@ -0,0 +1,115 @@
+import pytest
+from tinyxui import scheduler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A fake monotonic clock in seconds that the tests move forward
+    """
+    now = [100.0]
+    monkeypatch.setattr(scheduler.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_after_runs_once_when_due(clock):
+    calls = []
+    scheduler.after(50, lambda: calls.append(clock[0]))
+
+    assert not scheduler.run_due()
+    clock[0] += 0.049
+    scheduler.run_due()
+    assert calls == []
+
+    clock[0] += 0.001
+    assert scheduler.run_due()
+    assert len(calls) == 1
+    clock[0] += 1
+    scheduler.run_due()
+    assert len(calls) == 1
+    assert scheduler.next_timeout() is None
+
+
+def test_timers_run_in_deadline_order(clock):
+    calls = []
+    scheduler.after(20, lambda: calls.append("late"))
+    scheduler.after(10, lambda: calls.append("early"))
+    scheduler.after(10, lambda: calls.append("early, added later"))
+
+    clock[0] += 1
+    scheduler.run_due()
+    assert calls == ["early", "early, added later", "late"]
+
+
+def test_every_stays_on_its_grid(clock):
+    ticks = []
+    scheduler.every(100, lambda: ticks.append(round(clock[0], 3)))
+
+    # A late tick doesn't shift the following ones
+    clock[0] += 0.13
+    scheduler.run_due()
+    clock[0] += 0.08
+    scheduler.run_due()
+    assert ticks == [100.13, 100.21]
+
+
+def test_every_skips_missed_ticks(clock):
+    ticks = []
+    scheduler.every(100, lambda: ticks.append(clock[0]))
+
+    clock[0] += 1.05
+    scheduler.run_due()
+    scheduler.run_due()
+    assert len(ticks) == 1
+    assert scheduler.next_timeout() == 100
+
+
+def test_cancel(clock):
+    calls = []
+    timer = scheduler.every(10, lambda: calls.append(1))
+    clock[0] += 0.01
+    scheduler.run_due()
+    timer.cancel()
+
+    clock[0] += 1
+    scheduler.run_due()
+    assert calls == [1]
+    assert scheduler.next_timeout() is None
+
+
+def test_cancel_from_own_callback(clock):
+    calls = []
+    timer = scheduler.every(10, lambda: (calls.append(1), timer.cancel()))
+    for _ in range(3):
+        clock[0] += 0.01
+        scheduler.run_due()
+    assert calls == [1]
+
+
+def test_next_timeout_rounds_up(clock):
+    scheduler.after(10, lambda: None)
+    clock[0] += 0.0095
+    assert scheduler.next_timeout() == 1
+    clock[0] += 1
+    assert scheduler.next_timeout() == 0
+
+
+def test_failing_callback_does_not_stop_other_timers(clock, capsys):
+    calls = []
+
+    def fail():
+        calls.append("fail")
+        raise RuntimeError("broken timer")
+
+    scheduler.every(10, fail)
+    scheduler.after(10, lambda: calls.append("after"))
+
+    clock[0] += 0.01
+    assert scheduler.run_due()
+    assert calls == ["fail", "after"]
+    assert "broken timer" in capsys.readouterr().err
+
+    # The failing timer keeps repeating
+    clock[0] += 0.01
+    scheduler.run_due()
+    assert calls == ["fail", "after", "fail"]
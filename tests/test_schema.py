@@ -0,0 +1,102 @@
+import pytest
+from tinyxui import schema
+from tinyxui.txm import AST
+
+
+@pytest.mark.parametrize("value, expected", [
+    (3, 3),
+    (2.5, 2.5),
+    ("12", 12),
+    (" 1.5 ", 1.5),
+    ("-4", -4),
+    ("4.0", 4),
+])
+def test_numbers(value, expected):
+    converted = schema.convert("progressbar", "interpolate", value)
+    assert converted == expected
+    assert type(converted) is type(expected)
+
+
+@pytest.mark.parametrize("value", [True, "fast", None, [1]])
+def test_invalid_numbers(value):
+    with pytest.raises(ValueError, match="expected a number"):
+        schema.convert("progressbar", "interpolate", value)
+
+
+def test_sizes_are_whole_and_not_negative():
+    assert schema.convert("button", "width", 10.7) == 10
+    with pytest.raises(ValueError, match="size of 0 or more"):
+        schema.convert("button", "width", -1)
+
+
+def test_progress_is_clamped():
+    assert schema.convert("progressbar", "progress", 150) == 100
+    assert schema.convert("progressbar", "progress", -5) == 0
+    assert schema.convert("progressbar", "progress", "42") == 42
+
+
+def test_bools_are_strict():
+    assert schema.convert("label", "wrap", True) is True
+    with pytest.raises(ValueError, match="expected true or false"):
+        schema.convert("label", "wrap", "yes")
+    with pytest.raises(ValueError):
+        schema.convert("label", "wrap", 1)
+
+
+def test_choices_ignore_case():
+    assert schema.convert("box", "direction", "Horizontal") == "horizontal"
+    with pytest.raises(ValueError, match="expected one of"):
+        schema.convert("box", "direction", "diagonal")
+
+
+def test_pages_by_index_or_name():
+    assert schema.convert("stack", "active", 2) == 2
+    assert schema.convert("stack", "active", "home") == "home"
+    with pytest.raises(ValueError):
+        schema.convert("stack", "active", -1)
+
+
+def test_error_names_the_widget_and_attribute():
+    with pytest.raises(ValueError) as error:
+        schema.convert("image", "width", "big")
+    assert str(error.value) == \
+        "image attribute width='big' is invalid, expected a number!"
+
+
+def test_unknown_attributes_pass_through():
+    assert schema.spec("label", "tooltip") is None
+    assert schema.convert("label", "tooltip", [1, 2]) == [1, 2]
+    assert schema.spec("label", "bind_visible") == ("string", None)
+
+
+def test_widget_specific_defaults():
+    assert schema.spec("separator", "direction")[1] == "horizontal"
+    assert schema.spec("box", "direction")[1] == "vertical"
+
+
+def test_apply_fills_props():
+    widget = AST.parse_widget(
+        'button(width="90", align="hcenter", expand=true, class="flat")')
+    assert widget.attributes["width"] == 90
+    assert widget.props["width"] == 90
+    assert widget.props["height"] == 32
+    assert widget.props["visible"] is True
+    assert (widget.halign, widget.valign) == ("center", "start")
+    assert widget.hexpand and widget.vexpand
+    assert widget.classes == ("flat",)
+
+
+def test_apply_can_skip_attributes():
+    widget = AST.parse_widget("image()")
+    widget.attributes["width"] = "$size"
+    schema.apply(widget, skip=("width",))
+    assert widget.attributes["width"] == "$size"
+    assert widget.props["width"] == 16
+
+
+def test_invalid_documents_point_at_the_line(write_txm):
+    path = write_txm('box() {\n    label(wrap="sometimes")\n}\n')
+    with pytest.raises(SyntaxError) as error:
+        AST.generate_ast(path)
+    assert error.value.lineno == 2
+    assert "label attribute wrap='sometimes' is invalid" in error.value.msg
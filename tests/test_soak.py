@@ -0,0 +1,66 @@
+import sdl2
+from tinyxui import resources, scheduler, soak
+
+DOCUMENT = """\
+box() {
+    label(id="title") { "-" }
+    label(id="status", wrap=true) { "Idle" }
+    progressbar(id="elapsed", progress=10)
+}
+"""
+
+
+def samples(**growing):
+    """
+    Returns 20 flat samples, with the given metrics growing by an amount
+    every sample
+    """
+    return [{"frame": frame,
+             **{metric: 1000 + growing.get(metric, 0) * frame
+                for metric in soak.TOLERANCE}}
+            for frame in range(20)]
+
+
+def test_flat_memory_does_not_grow():
+    assert set(soak.growth(samples()).values()) == {0}
+
+
+def test_growth_compares_the_halves():
+    grown = soak.growth(samples(sdl_objects=1, rss=4096))
+    # 18 samples after the warmup, the peaks are 9 samples apart
+    assert grown["sdl_objects"] == 9
+    assert grown["rss"] == 9 * 4096
+    assert grown["python_objects"] == 0
+
+
+def test_warmup_is_skipped():
+    warming = samples()
+    warming[0]["sdl_objects"] = 5000
+    assert soak.growth(warming)["sdl_objects"] == 0
+    assert soak.growth(warming, warmup=0)["sdl_objects"] < 0
+
+
+def test_too_few_samples():
+    assert set(soak.growth(samples()[:1]).values()) == {0}
+
+
+def test_short_run_passes(font, write_txm):
+    result = soak.run(write_txm(DOCUMENT), frames=200, sample_every=10,
+                      reload_every=50)
+    assert result["frames"] >= 200
+    assert len(result["samples"]) == 20
+    assert result["unreleased"] == {}
+    assert result["passed"], result["growth"]
+
+
+def test_objects_left_after_shutdown_are_reported(font, write_txm):
+    def leak():
+        surface = sdl2.SDL_CreateRGBSurfaceWithFormat(
+            0, 4, 4, 32, sdl2.SDL_PIXELFORMAT_ARGB8888)
+        resources.track(surface, "surface", 64)
+    scheduler.after(0, leak)
+
+    result = soak.run(write_txm(DOCUMENT), frames=20, sample_every=10,
+                      reload_every=0)
+    assert result["unreleased"] == {"surface": 1}
+    assert not result["passed"]
@@ -0,0 +1,90 @@
+import pytest
+from tinyxui import style_provider
+from tinyxui.txm import AST
+
+
+@pytest.fixture
+def stylesheet(tmp_path):
+    path = tmp_path / "style.css"
+    path.write_text("""
+* { color: #000; }
+label { color: #111; padding: 4px; }
+.status { color: #222; }
+label.status { color: #333; }
+#title { color: #444; }
+button:hover { color: #555; }
+button:active { color: #666; }
+.flat, .borderless { background-color: #fff; }
+box > label { color: #f00; }
+label { font-size: 20pt; }
+""")
+    return style_provider.generate_ast(path)
+
+
+def color(stylesheet, *args, **kwargs):
+    return stylesheet.compute(*args, **kwargs).get("color")
+
+
+def test_node_compiles_compound_selectors():
+    node = style_provider.Node("button.flat.wide#ok:hover")
+    assert node.type == "button"
+    assert node.classes == ("flat", "wide")
+    assert node.id == "ok"
+    assert node.states == ("hover",)
+    assert node.specificity == (1, 3, 1)
+
+
+def test_unsupported_selectors_never_match():
+    node = style_provider.Node("box > label")
+    assert not node.supported
+    assert not node.matches("label", None, set(), None)
+
+
+def test_cascade_follows_specificity(stylesheet):
+    assert color(stylesheet, "box") == "#000"
+    assert color(stylesheet, "label") == "#111"
+    assert color(stylesheet, "box", classes=("status",)) == "#222"
+    assert color(stylesheet, "label", classes=("status",)) == "#333"
+    assert color(stylesheet, "label", "title", ("status",)) == "#444"
+
+
+def test_later_rules_win_at_equal_specificity(stylesheet):
+    style = stylesheet.compute("label")
+    assert style["font-size"] == "20pt"
+    assert style["padding"] == 4
+
+
+def test_states(stylesheet):
+    assert color(stylesheet, "button") == "#000"
+    assert color(stylesheet, "button", state="hover") == "#555"
+    assert color(stylesheet, "button", state="active") == "#666"
+
+
+def test_selector_lists(stylesheet):
+    for cls in ("flat", "borderless"):
+        style = stylesheet.compute("button", classes=(cls,))
+        assert style["background-color"] == "#fff"
+
+
+def test_computed_styles_are_cached(stylesheet):
+    first = stylesheet.compute("label", classes=("status",))
+    assert stylesheet.compute("label", classes=("status",)) is first
+
+
+def test_style_classes(write_txm):
+    _, root = AST.generate_ast(write_txm(
+        'box(direction="horizontal", class="toolbar flat") {\n'
+        '    label(class="status")\n'
+        '}\n'))
+    box = root.children[0]
+    assert box.classes == ("toolbar", "flat", "horizontal")
+    assert box.children[0].classes == ("status",)
+
+
+def test_widget_state():
+    widget = AST.parse_widget("button()")
+    assert style_provider.widget_state(widget) is None
+    widget.hovered = True
+    assert style_provider.widget_state(widget) == "hover"
+    widget.active = True
+    assert style_provider.widget_state(widget) == "active"
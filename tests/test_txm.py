@@ -0,0 +1,121 @@
+import pytest
+from tinyxui.txm import AST
+
+
+def parse(write_txm, text):
+    return AST.generate_ast(write_txm(text))[1]
+
+
+def texts(widget):
+    return [child.data for child in widget.children]
+
+
+def test_values():
+    assert AST.parse_value('"text"') == "text"
+    assert AST.parse_value("-3") == -3
+    assert AST.parse_value(".5") == 0.5
+    assert AST.parse_value("true") is True
+    with pytest.raises(TypeError):
+        AST.parse_value("maybe")
+
+
+def test_template(write_txm):
+    root = parse(write_txm,
+        'template(name="row") {\n'
+        '    label(class="$kind") { "${title}!" }\n'
+        '}\n'
+        'row(title="One", kind="first")\n'
+        'row(title="Two", kind="second")\n')
+    assert texts(root) == ["One!", "Two!"]
+    assert [child.classes for child in root.children] == \
+        [("first",), ("second",)]
+
+
+def test_repeat_counts_from_zero(write_txm):
+    root = parse(write_txm,
+        'repeat(count=3, var="i") {\n'
+        '    label() { "Row $i" }\n'
+        '}\n')
+    assert texts(root) == ["Row 0", "Row 1", "Row 2"]
+
+
+def test_for_is_inclusive(write_txm):
+    root = parse(write_txm,
+        'for(from=2, to=4) {\n'
+        '    label() { "$index" }\n'
+        '}\n')
+    assert texts(root) == [2, 3, 4]
+
+
+def test_whole_variables_keep_their_type(write_txm):
+    root = parse(write_txm,
+        'for(var="n", from=1, to=2) {\n'
+        '    progressbar(progress="$n", width="${n}0")\n'
+        '}\n')
+    assert [child.props["progress"] for child in root.children] == [1, 2]
+    assert [child.props["width"] for child in root.children] == [10, 20]
+
+
+def test_copies_share_unchanged_attributes(write_txm):
+    root = parse(write_txm,
+        'repeat(count=2) {\n'
+        '    box(class="row") {\n'
+        '        label() { "$index" }\n'
+        '    }\n'
+        '}\n')
+    first, second = root.children
+    assert first.shared and second.shared
+    assert first.attributes is second.attributes
+    assert first.children[0].attributes is not second.children[0].attributes
+
+    first.own_attributes()
+    first.attributes["class"] = "selected"
+    assert second.attributes["class"] == "row"
+
+
+def test_nested_templates(write_txm):
+    root = parse(write_txm,
+        'template(name="cell") {\n'
+        '    label() { "$text" }\n'
+        '}\n'
+        'repeat(count=2, var="row") {\n'
+        '    cell(text="${row}a")\n'
+        '}\n')
+    assert texts(root) == ["0a", "1a"]
+
+
+def test_missing_variable_names_the_template(write_txm):
+    path = write_txm(
+        'template(name="row") {\n'
+        '    label() { "$title by $artist" }\n'
+        '}\n'
+        'row(title="One")\n')
+    with pytest.raises(SyntaxError) as error:
+        AST.generate_ast(path)
+    assert error.value.lineno == 4
+    assert "template row variable $artist is not set" in error.value.msg
+
+
+def test_missing_variable_in_repeat(write_txm):
+    path = write_txm(
+        'repeat(count=1) {\n'
+        '    label() { "$i" }\n'
+        '}\n')
+    with pytest.raises(SyntaxError, match=r"repeat variable \$i is not set"):
+        AST.generate_ast(path)
+
+
+def test_dollar_without_a_name_is_text(write_txm):
+    root = parse(write_txm,
+        'repeat(count=1) {\n'
+        '    label() { "$5 each" }\n'
+        '}\n')
+    assert texts(root) == ["$5 each"]
+
+
+def test_invalid_blocks(write_txm):
+    with pytest.raises(SyntaxError, match="expected a whole number"):
+        AST.generate_ast(write_txm('repeat(count="x") {\n}\n'))
+    with pytest.raises(SyntaxError, match="can't have children"):
+        AST.generate_ast(write_txm(
+            'template(name="row") {\n    label()\n}\nrow() {\n}\n'))
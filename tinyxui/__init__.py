@@ -1 +1,2 @@
-from .main import bind_widget, set_attribute, set_data, refresh_image, start, load_txm
+from .main import App, Window, bind_widget, set_attribute, set_data, set_many, set_attribute_where, query, transaction, set_progress, set_page, set_image, refresh_image, start, load_txm, model
+from .scheduler import after, every
@@ -0,0 +1,358 @@
+import ctypes
+import sdl2
+from . import resources
+
+
+# Images up to this size in both directions are packed into shared pages,
+# bigger ones get a texture of their own
+MAX_SIZE = 128
+PAGE_SIZE = 1024
+# Empty pixels around every image so scaled copies don't bleed
+PADDING = 1
+
+# Textures can't be shared between renderers, so every window has its
+# own pages. Renderer address -> list of Page objects.
+pages = {}
+# (renderer address, key) -> Entry for every packed image
+entries = {}
+# Entries whose image changed, their space is reused if the new one fits
+stale = {}
+# key -> decoded surface of every image loaded from a file, so other
+# windows pack it or create their texture without decoding it again.
+# Images too big to pack are kept here too, see keep().
+images = {}
+# (renderer address, key) -> resource keys of the widgets showing an
+# image, and resource key -> (renderer address, key) pairs a widget shows.
+# Images no widget shows anymore give their space back.
+users = {}
+held = {}
+
+
+class Entry:
+    """
+    Where a packed image lives
+    """
+    def __init__(self, page, x, y, w, h):
+        self.page = page
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        # Size of the reserved space, images can shrink inside it
+        self.slot = (w, h)
+
+    @property
+    def texture(self):
+        return self.page.texture
+
+    @property
+    def rect(self):
+        return (self.x, self.y, self.w, self.h)
+
+    def __repr__(self):
+        renderer_pages = pages[resources.address(self.page.sdl_renderer)]
+        return f"Entry({self.rect}, page={renderer_pages.index(self.page)})"
+
+
+class Page:
+    """
+    One shared texture, filled with rows of images. Each image goes into
+    the lowest row it fits in, a new row is opened below when none fits.
+    """
+    def __init__(self, sdl_renderer, size=PAGE_SIZE):
+        self.sdl_renderer = sdl_renderer
+        self.size = size
+        self.texture = sdl2.SDL_CreateTexture(
+            sdl_renderer,
+            sdl2.SDL_PIXELFORMAT_ARGB8888,
+            sdl2.SDL_TEXTUREACCESS_STATIC,
+            size, size
+        )
+        resources.track(self.texture, "texture", size * size * 4)
+        sdl2.SDL_SetTextureBlendMode(self.texture, sdl2.SDL_BLENDMODE_BLEND)
+        blank = (ctypes.c_uint32 * (size * size))()
+        sdl2.SDL_UpdateTexture(self.texture, None, blank, size * 4)
+        # [y, height, used width] of every row
+        self.rows = []
+        self.bottom = 0
+        # (x, y, w, h) space of images that moved out, reused before rows
+        self.free = []
+
+    def allocate(self, w, h):
+        """
+        Reserve space for an image, returns its position and the size of
+        the reserved space as (x, y, w, h), or None if the page is full
+
+        :param w: Image width
+        :param h: Image height
+        """
+        # The smallest freed space it fits in comes first
+        slots = [slot for slot in self.free if slot[2] >= w and slot[3] >= h]
+        if slots:
+            slot = min(slots, key=lambda slot: slot[2] * slot[3])
+            self.free.remove(slot)
+            return slot
+
+        w += PADDING * 2
+        h += PADDING * 2
+
+        best = None
+        for row in self.rows:
+            if row[1] >= h and self.size - row[2] >= w:
+                # Least wasted height wins
+                if best is None or row[1] < best[1]:
+                    best = row
+        if best is None:
+            if self.bottom + h > self.size or w > self.size:
+                return None
+            best = [self.bottom, h, 0]
+            self.rows.append(best)
+            self.bottom += h
+
+        x = best[2]
+        best[2] += w
+        return (x + PADDING, best[0] + PADDING,
+                w - PADDING * 2, h - PADDING * 2)
+
+    def release(self, x, y, w, h):
+        """
+        Give the space of an image back and make it transparent
+
+        :param x: Left edge in the page
+        :param y: Top edge in the page
+        :param w: Width of the space
+        :param h: Height of the space
+        """
+        self.blank(x, y, w, h)
+        self.free.append((x, y, w, h))
+
+    def blank(self, x, y, w, h):
+        """
+        Make part of the page transparent
+
+        :param x: Left edge in the page
+        :param y: Top edge in the page
+        :param w: Width
+        :param h: Height
+        """
+        if w > 0 and h > 0:
+            blank = (ctypes.c_uint32 * (w * h))()
+            sdl2.SDL_UpdateTexture(self.texture, sdl2.SDL_Rect(x, y, w, h),
+                                   blank, w * 4)
+
+    def upload(self, surface, x, y):
+        """
+        Copy a surface into the page
+
+        :param surface: SDL surface pointer
+        :param x: Left edge in the page
+        :param y: Top edge in the page
+        """
+        converted = sdl2.SDL_ConvertSurfaceFormat(
+            surface, sdl2.SDL_PIXELFORMAT_ARGB8888, 0)
+        if not converted:
+            return False
+        rect = sdl2.SDL_Rect(x, y, converted.contents.w, converted.contents.h)
+        sdl2.SDL_UpdateTexture(self.texture, rect, converted.contents.pixels,
+                               converted.contents.pitch)
+        sdl2.SDL_FreeSurface(converted)
+        return True
+
+
+def fits(surface):
+    """
+    Check if a surface is small enough to be packed
+
+    :param surface: SDL surface pointer
+    """
+    return surface.contents.w <= MAX_SIZE and surface.contents.h <= MAX_SIZE
+
+
+def get(sdl_renderer, key):
+    """
+    Returns the Entry of a packed image, or None if it isn't packed or
+    changed since. Images another window already decoded are packed for
+    this renderer on the spot.
+
+    :param sdl_renderer: SDL renderer
+    :param key: Image key, such as its file path
+    """
+    entry = entries.get((resources.address(sdl_renderer), key))
+    if entry is None and key in images and fits(images[key]):
+        entry = add(sdl_renderer, key, images[key])
+    return entry
+
+
+def add(sdl_renderer, key, surface):
+    """
+    Pack an image, returns its Entry or None if it couldn't be packed.
+    The atlas keeps packed surfaces, the caller still owns the surface
+    if it couldn't be packed.
+
+    :param sdl_renderer: SDL renderer
+    :param key: Image key, such as its file path
+    :param surface: SDL surface pointer
+    """
+    w, h = surface.contents.w, surface.contents.h
+    renderer = resources.address(sdl_renderer)
+    renderer_pages = pages.setdefault(renderer, [])
+
+    # A changed image goes back into its old space when it still fits,
+    # otherwise the space is freed for other images
+    entry = stale.pop((renderer, key), None)
+    if entry is not None and (entry.slot[0] < w or entry.slot[1] < h):
+        entry.page.release(entry.x, entry.y, *entry.slot)
+        entry = None
+    if entry is None:
+        for page in renderer_pages:
+            position = page.allocate(w, h)
+            if position is not None:
+                break
+        else:
+            page = Page(sdl_renderer)
+            renderer_pages.append(page)
+            position = page.allocate(w, h)
+            if position is None:
+                return None
+        x, y, slot_w, slot_h = position
+        entry = Entry(page, x, y, w, h)
+        entry.slot = (slot_w, slot_h)
+    elif (w, h) != (entry.w, entry.h):
+        # Leftovers of a bigger image would show through
+        entry.page.blank(entry.x, entry.y, *entry.slot)
+        entry.w, entry.h = w, h
+
+    if not entry.page.upload(surface, entry.x, entry.y):
+        return None
+    entries[(renderer, key)] = entry
+    keep(key, surface)
+    return entry
+
+
+def keep(key, surface):
+    """
+    Keep the decoded surface of an image for other windows, replacing the
+    one kept before. Images too big to pack are kept like packed ones and
+    freed once no widget shows them, see use().
+
+    :param key: Image key, such as its file path
+    :param surface: SDL surface pointer, owned by the atlas from now on
+    """
+    if images.get(key) is not surface:
+        resources.release(images.get(key))
+        images[key] = surface
+
+
+def use(sdl_renderer, key, widget):
+    """
+    Record which image a widget shows, packed or kept, the image it showed
+    before in the same window is let go
+
+    :param sdl_renderer: SDL renderer
+    :param key: Image key, None if the widget shows neither
+    :param widget: Image or icon widget
+    """
+    renderer = resources.address(sdl_renderer)
+    owner = resources.own(widget)
+    shown = held.setdefault(owner, set())
+    for pair in [pair for pair in shown
+                 if pair[0] == renderer and pair[1] != key]:
+        shown.discard(pair)
+        let_go(pair, owner)
+    if key is not None:
+        shown.add((renderer, key))
+        users.setdefault((renderer, key), set()).add(owner)
+
+
+def release_user(owner):
+    """
+    Let go of the images a widget showed, called by the resource manager
+    when the widget is released or garbage collected
+
+    :param owner: Resource key of the widget
+    """
+    for pair in held.pop(owner, ()):
+        let_go(pair, owner)
+
+
+def let_go(pair, owner):
+    """
+    Remove a widget from the users of an image. Once no widget in a
+    window shows it its space in that window is freed, and once no window
+    shows it the decoded surface is freed too.
+
+    :param pair: (renderer address, key) of the image
+    :param owner: Resource key of the widget
+    """
+    pair_users = users.get(pair)
+    if pair_users is None:
+        return
+    pair_users.discard(owner)
+    if pair_users:
+        return
+    del users[pair]
+
+    entry = entries.pop(pair, None) or stale.pop(pair, None)
+    if entry is not None:
+        entry.page.release(entry.x, entry.y, *entry.slot)
+    key = pair[1]
+    if not any(other == key for _, other in users):
+        resources.release(images.pop(key, None))
+
+
+resources.release_hooks.append(release_user)
+
+
+def forget(key):
+    """
+    Mark a packed image as changed in every window, the next add() for
+    the key replaces it
+
+    :param key: Image key, such as its file path
+    """
+    for renderer in pages:
+        entry = entries.pop((renderer, key), None)
+        if entry is not None:
+            stale[(renderer, key)] = entry
+    resources.release(images.pop(key, None))
+
+
+def clear(sdl_renderer=None):
+    """
+    Free the pages of one renderer, such as a window that closed, or
+    every page and decoded image
+
+    :param sdl_renderer: SDL renderer, None for everything
+    """
+    if sdl_renderer is None:
+        for renderer in list(pages):
+            release_pages(renderer)
+        for surface in images.values():
+            resources.release(surface)
+        images.clear()
+        users.clear()
+        held.clear()
+        return
+    release_pages(resources.address(sdl_renderer))
+
+
+def release_pages(renderer):
+    """
+    Free the pages and forget the entries of one renderer
+
+    :param renderer: Renderer address
+    """
+    for page in pages.pop(renderer, ()):
+        resources.release(page.texture)
+    for table in (entries, stale, users):
+        for key in [key for key in table if key[0] == renderer]:
+            del table[key]
+    for shown in held.values():
+        for pair in [pair for pair in shown if pair[0] == renderer]:
+            shown.discard(pair)
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's texture atlas on its own!")
+    print("Import it into another codebase to use it.")
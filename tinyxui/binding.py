@@ -0,0 +1,101 @@
+import threading
+from . import recorder
+
+
+class Model:
+    """
+    Named values that TXM widgets bind to with bind="key" for their data
+    or bind_<attribute>="key" for an attribute. Setting a value that
+    didn't change does nothing, and real changes are applied to the bound
+    widgets once per frame.
+
+    :param on_change: Function called with a key the first time it
+        changes after the last take_pending()
+    """
+    def __init__(self, on_change=None):
+        self.values = {}
+        self.pending = {}
+        self.on_change = on_change
+        self._lock = threading.Lock()
+
+    def set(self, key, value):
+        """
+        Set a value, returns False if it didn't change
+
+        :param key: Model key, such as "song.title"
+        :param value: New value
+        """
+        with self._lock:
+            if key in self.values and self.values[key] == value:
+                return False
+            self.values[key] = value
+            first = key not in self.pending
+            self.pending[key] = value
+
+        recorder.record("model", key, value)
+        # One notification per key and frame is enough, later changes are
+        # coalesced
+        if first and self.on_change is not None:
+            self.on_change(key)
+        return True
+
+    def update(self, values):
+        """
+        Set several values at once
+
+        :param values: Dictionary of keys and values
+        """
+        for key, value in values.items():
+            self.set(key, value)
+
+    def get(self, key, default=None):
+        """
+        Get a value
+
+        :param key: Model key
+        :param default: Value to return if the key was never set
+        """
+        return self.values.get(key, default)
+
+    def take_pending(self):
+        """
+        Returns the changes since the last call and forgets them
+        """
+        with self._lock:
+            pending = self.pending
+            self.pending = {}
+        return pending
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def __repr__(self):
+        return f"Model({self.values})"
+
+
+def bound_keys(widget):
+    """
+    Returns (key, attribute) pairs a widget is bound to, attribute is None
+    for the widget's data
+
+    :param widget: Widget object
+    """
+    pairs = []
+    for name, value in widget.attributes.items():
+        if name == "bind":
+            pairs.append((value, None))
+        elif name.startswith("bind_"):
+            pairs.append((value, name[5:]))
+    return pairs
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's binding engine on its own!")
+    print("Import it into another codebase to use it.")
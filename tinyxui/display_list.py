@@ -0,0 +1,365 @@
+import array
+import ctypes
+import math
+import struct
+import sdl2
+from . import fonts
+from . import resources
+
+
+# Matches the memory layout of SDL_Vertex: position, color, tex_coord
+VERTEX = struct.Struct("=ff4Bff")
+
+
+class DisplayList:
+    """
+    Flat list of draw commands for a widget tree. It is built once after
+    layout or style changes and replayed every frame. Neighbouring rects
+    of the same color become one SDL_RenderFillRects call, neighbouring
+    shapes become one SDL_RenderGeometry call, and so does text drawn
+    from the same glyph atlas.
+
+    :param sdl_renderer: SDL renderer the list is replayed on
+    """
+    def __init__(self, sdl_renderer):
+        self.sdl_renderer = sdl_renderer
+        self.commands = []
+        # Glyph atlas the text was laid out in and its generation at the
+        # time, see stale()
+        self.glyph_atlas = None
+        self.generation = None
+        # Layer widgets, their own lists are checked by stale() too
+        self.layers = []
+
+    def fill_rect(self, x, y, w, h, color):
+        """
+        Add a filled rectangle
+
+        :param x: Left edge
+        :param y: Top edge
+        :param w: Width
+        :param h: Height
+        :param color: (r, g, b, a) tuple
+        """
+        if w <= 0 or h <= 0:
+            return
+        self.add_rect("fill", x, y, w, h, color)
+
+    def outline_rect(self, x, y, w, h, color):
+        """
+        Add a one pixel rectangle outline
+
+        :param x: Left edge
+        :param y: Top edge
+        :param w: Width
+        :param h: Height
+        :param color: (r, g, b, a) tuple
+        """
+        self.add_rect("outline", x, y, w, h, color)
+
+    def add_rect(self, kind, x, y, w, h, color):
+        if self.commands:
+            last = self.commands[-1]
+            if last[0] == kind and last[1] == color:
+                last[2].extend((x, y, w, h))
+                return
+        self.commands.append([kind, color, array.array("i", (x, y, w, h))])
+
+    def shape(self, vertices, indices):
+        """
+        Add untextured triangles
+
+        :param vertices: List of (x, y, (r, g, b, a)) points
+        :param indices: Triangle indices into vertices
+        """
+        if self.commands and self.commands[-1][0] == "shapes":
+            last = self.commands[-1]
+        else:
+            last = ["shapes", [], []]
+            self.commands.append(last)
+        base = len(last[1])
+        last[1].extend(vertices)
+        last[2].extend(base + i for i in indices)
+
+    def rounded_rect(self, x1, y1, x2, y2, radius, color):
+        """
+        Add a filled rectangle with round corners. The corners get a half
+        pixel fade so they stay smooth without an anti-aliasing pass.
+
+        :param x1: Left edge
+        :param y1: Top edge
+        :param x2: Right edge, exclusive
+        :param y2: Bottom edge, exclusive
+        :param radius: Corner radius
+        :param color: (r, g, b, a) tuple
+        """
+        radius = max(0, min(radius, (x2 - x1) / 2, (y2 - y1) / 2))
+        if radius < 1:
+            self.fill_rect(x1, y1, x2 - x1, y2 - y1, color)
+            return
+
+        r, g, b, a = color
+        clear = (r, g, b, 0)
+        fade = radius + 0.5
+        steps = max(2, min(16, int(radius)))
+        corners = (
+            (x1 + radius, y1 + radius, math.pi),
+            (x2 - radius, y1 + radius, math.pi * 1.5),
+            (x2 - radius, y2 - radius, 0),
+            (x1 + radius, y2 - radius, math.pi * 0.5),
+        )
+
+        vertices = [((x1 + x2) / 2, (y1 + y2) / 2, color)]
+        indices = []
+        edge = []
+        for cx, cy, start in corners:
+            for step in range(steps + 1):
+                angle = start + math.pi / 2 * step / steps
+                dx, dy = math.cos(angle), math.sin(angle)
+                edge.append(len(vertices))
+                vertices.append((cx + dx * radius, cy + dy * radius, color))
+                vertices.append((cx + dx * fade, cy + dy * fade, clear))
+                # Fade strip along the arc
+                if step:
+                    inner, outer = len(vertices) - 2, len(vertices) - 1
+                    indices += (inner - 2, inner, outer,
+                                inner - 2, outer, outer - 2)
+
+        # Fan from the center over the inner outline
+        for i in range(len(edge)):
+            indices += (0, edge[i], edge[(i + 1) % len(edge)])
+
+        self.shape(vertices, indices)
+
+    def sprite(self, texture, size, source, dest, color=(255, 255, 255, 255)):
+        """
+        Add part of a texture stretched over a rectangle. Neighbouring
+        sprites from the same texture, such as icons packed into one
+        atlas page, are drawn together.
+
+        :param texture: SDL texture
+        :param size: (width, height) of the whole texture
+        :param source: (x, y, w, h) part of the texture to copy
+        :param dest: (x, y, w, h) rectangle to copy it to
+        :param color: (r, g, b, a) tint, white keeps the original colors
+        """
+        if self.commands and self.commands[-1][0] == "sprites" and \
+                self.commands[-1][1] == texture:
+            last = self.commands[-1]
+        else:
+            last = ["sprites", texture, [], []]
+            self.commands.append(last)
+
+        sx, sy, sw, sh = source
+        dx, dy, dw, dh = dest
+        tw, th = size
+        base = len(last[2])
+        for cx, cy in ((0, 0), (1, 0), (1, 1), (0, 1)):
+            last[2].append((dx + dw * cx, dy + dh * cy, color,
+                            (sx + sw * cx) / tw, (sy + sh * cy) / th))
+        last[3].extend((base, base + 1, base + 2, base, base + 2, base + 3))
+
+    def text(self, font, text, x, y, color):
+        """
+        Add a string as sprites from the renderer's glyph atlas. Glyphs are
+        looked up and rasterized here, replaying only submits vertices.
+
+        :param font: fonts.Font object
+        :param text: String to draw
+        :param x: Left edge
+        :param y: Top edge
+        :param color: SDL color
+        """
+        atlas = fonts.atlas_for(self.sdl_renderer)
+        if self.glyph_atlas is None:
+            self.glyph_atlas = atlas
+            self.generation = atlas.generation
+        tint = (color.r, color.g, color.b, color.a)
+        size = (atlas.size, atlas.size)
+        for source, dest in atlas.layout(font, text, x, y):
+            self.sprite(atlas.texture, size, source, dest, tint)
+
+    def resizable(self, widget, draw):
+        """
+        Add a widget whose size changes without anything else changing,
+        such as a progressbar fill. Its commands are drawn again at replay
+        only when its width or height differs from the last replay, the
+        position is the one it had when the list was built.
+
+        :param widget: Widget object
+        :param draw: Function called with the widget and a DisplayList to
+            add its commands to
+        """
+        self.commands.append(["resizable", widget, draw, widget.x, widget.y,
+                              None, None])
+
+    def layer(self, widget):
+        """
+        Add a cached layer, rendered from widget.layer_list into
+        widget.layer_texture when it is dirty
+
+        :param widget: Widget object
+        """
+        self.commands.append(["layer", widget, sdl2.SDL_Rect(
+            widget.x, widget.y, widget.width, widget.height)])
+        self.layers.append(widget)
+
+    def clip(self, rect):
+        """
+        Restrict the following commands to a rectangle until unclip()
+
+        :param rect: (x1, y1, x2, y2) rectangle
+        """
+        x1, y1, x2, y2 = rect
+        self.commands.append(
+            ["clip", sdl2.SDL_Rect(x1, y1, x2 - x1, y2 - y1)])
+
+    def unclip(self):
+        """
+        Go back to the clip rectangle from before the last clip()
+        """
+        self.commands.append(["unclip"])
+
+    def finish(self):
+        """
+        Pack every command into ctypes arrays, so replaying doesn't create
+        any structs
+        """
+        for command in self.commands:
+            match command[0]:
+                case "fill" | "outline":
+                    rects = command[2]
+                    count = len(rects) // 4
+                    command[2] = (sdl2.SDL_Rect * count).from_buffer_copy(
+                        rects)
+                    command.append(count)
+                case "shapes":
+                    vertices, indices = command[1], command[2]
+                    packed = b"".join(
+                        VERTEX.pack(x, y, *color, 0, 0)
+                        for x, y, color in vertices)
+                    command[1] = (sdl2.SDL_Vertex * len(vertices)) \
+                        .from_buffer_copy(packed)
+                    command[2] = (ctypes.c_int * len(indices))(*indices)
+                case "sprites":
+                    vertices, indices = command[2], command[3]
+                    packed = b"".join(
+                        VERTEX.pack(x, y, *color, u, v)
+                        for x, y, color, u, v in vertices)
+                    command[2] = (sdl2.SDL_Vertex * len(vertices)) \
+                        .from_buffer_copy(packed)
+                    command[3] = (ctypes.c_int * len(indices))(*indices)
+        return self
+
+    def stale(self):
+        """
+        Check if the glyph atlas was cleared or replaced since text was
+        added, which leaves the text pointing at glyphs that are gone.
+        Lists of layers that are about to be rendered again are checked
+        too.
+        """
+        if self.glyph_atlas is not None and (
+                self.glyph_atlas.generation != self.generation or
+                fonts.atlases.get(resources.address(self.sdl_renderer))
+                is not self.glyph_atlas):
+            return True
+        # Layers lose their texture after a device reset
+        return any(not hasattr(widget, "layer_texture") or
+                   widget.layer_dirty and widget.layer_list.stale()
+                   for widget in self.layers)
+
+    def replay(self, sdl_renderer):
+        """
+        Submit every command to the renderer
+
+        :param sdl_renderer: SDL renderer
+        """
+        clips = [None]
+        sdl2.SDL_SetRenderDrawBlendMode(sdl_renderer,
+                                        sdl2.SDL_BLENDMODE_BLEND)
+        for command in self.commands:
+            match command[0]:
+                case "fill":
+                    _, (r, g, b, a), rects, count = command
+                    sdl2.SDL_SetRenderDrawColor(sdl_renderer, r, g, b, a)
+                    sdl2.SDL_RenderFillRects(sdl_renderer, rects, count)
+                case "outline":
+                    _, (r, g, b, a), rects, count = command
+                    sdl2.SDL_SetRenderDrawColor(sdl_renderer, r, g, b, a)
+                    sdl2.SDL_RenderDrawRects(sdl_renderer, rects, count)
+                case "shapes":
+                    _, vertices, indices = command
+                    sdl2.SDL_RenderGeometry(sdl_renderer, None, vertices,
+                                            len(vertices), indices,
+                                            len(indices))
+                case "sprites":
+                    _, texture, vertices, indices = command
+                    sdl2.SDL_RenderGeometry(sdl_renderer, texture, vertices,
+                                            len(vertices), indices,
+                                            len(indices))
+                case "resizable":
+                    self.replay_resizable(sdl_renderer, command)
+                case "layer":
+                    self.render_layer(sdl_renderer, command[1], clips[-1])
+                    sdl2.SDL_RenderCopy(sdl_renderer,
+                                        command[1].layer_texture, None,
+                                        command[2])
+                case "clip":
+                    clips.append(command[1])
+                    sdl2.SDL_RenderSetClipRect(sdl_renderer, command[1])
+                case "unclip":
+                    clips.pop()
+                    sdl2.SDL_RenderSetClipRect(sdl_renderer, clips[-1])
+
+    def replay_resizable(self, sdl_renderer, command):
+        """
+        Submit a resizable widget, drawing its commands again first if
+        its size changed
+
+        :param sdl_renderer: SDL renderer
+        :param command: ["resizable", widget, draw, x, y, size, list]
+        """
+        _, widget, draw, x, y, size, commands = command
+        if size != (widget.width, widget.height):
+            # Draw code works in widget coordinates, which are only
+            # correct inside layers while their list is built
+            widget_x, widget_y = widget.x, widget.y
+            widget.x, widget.y = x, y
+            commands = DisplayList(self.sdl_renderer)
+            draw(widget, commands)
+            commands.finish()
+            widget.x, widget.y = widget_x, widget_y
+            command[5] = (widget.width, widget.height)
+            command[6] = commands
+        # Only rects and shapes, so the clip rectangle is left alone
+        commands.replay(sdl_renderer)
+
+    def render_layer(self, sdl_renderer, widget, clip):
+        """
+        Render a dirty layer's own display list into its texture
+
+        :param sdl_renderer: SDL renderer
+        :param widget: Widget object
+        :param clip: Clip rectangle to restore afterwards
+        """
+        if not widget.layer_dirty:
+            return
+        widget.layer_dirty = False
+        previous_target = sdl2.SDL_GetRenderTarget(sdl_renderer)
+        sdl2.SDL_SetRenderTarget(sdl_renderer, widget.layer_texture)
+        sdl2.SDL_SetRenderDrawColor(sdl_renderer, 0, 0, 0, 0)
+        sdl2.SDL_RenderClear(sdl_renderer)
+        widget.layer_list.replay(sdl_renderer)
+
+        # Switching targets resets the renderer's clip rectangle
+        sdl2.SDL_SetRenderTarget(sdl_renderer, previous_target)
+        sdl2.SDL_RenderSetClipRect(sdl_renderer, clip)
+
+    def __len__(self):
+        return len(self.commands)
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's display list on its own!")
+    print("Import it into another codebase to use it.")
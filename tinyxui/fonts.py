@@ -0,0 +1,405 @@
+import collections
+import ctypes
+import os
+import sdl2
+import sdl2.sdlttf
+from importlib.resources import files
+from . import resources
+
+
+DEFAULT_FAMILY = "NotoSans"
+DEFAULT_SIZE = 13
+# Where font-family names are looked up, after TinyXUI's own data
+FONT_DIRS = (
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    os.path.expanduser("~/.local/share/fonts"),
+    os.path.expanduser("~/.fonts"),
+)
+ATLAS_SIZE = 1024
+# Number of measured, wrapped and ellipsized strings to remember
+TEXT_CACHE_SIZE = 4096
+ELLIPSIS = "\u2026"
+
+# (family, size) -> Font for every font-family value asked for
+faces = {}
+# (path, size) -> Font, every face and size is only opened once
+opened = {}
+# Lowercase file name without extension -> path, filled on first lookup
+font_files = None
+# Renderer address -> glyph Atlas, textures can't be shared between
+# windows but everything else is
+atlases = {}
+# Least recently used text layout results, see cached()
+text_cache = collections.OrderedDict()
+
+
+class Font:
+    """
+    An opened font face at one size
+    """
+    def __init__(self, handle, path, size):
+        self.handle = handle
+        self.path = path
+        self.size = size
+        self.height = sdl2.sdlttf.TTF_FontHeight(handle)
+        self.line_skip = sdl2.sdlttf.TTF_FontLineSkip(handle)
+
+    def __repr__(self):
+        return f"Font({os.path.basename(str(self.path))}, size={self.size})"
+
+
+class Atlas:
+    """
+    A single texture that glyphs of every font are rasterized into once,
+    packed in rows. When it fills up it is cleared and refilled with the
+    glyphs that are still in use.
+    """
+    def __init__(self, sdl_renderer, size=ATLAS_SIZE):
+        self.sdl_renderer = sdl_renderer
+        self.size = size
+        self.texture = sdl2.SDL_CreateTexture(
+            sdl_renderer,
+            sdl2.SDL_PIXELFORMAT_ARGB8888,
+            sdl2.SDL_TEXTUREACCESS_STATIC,
+            size, size
+        )
+        resources.track(self.texture, "texture", size * size * 4)
+        sdl2.SDL_SetTextureBlendMode(self.texture, sdl2.SDL_BLENDMODE_BLEND)
+        # Display lists remember the generation their glyphs are from, so
+        # they are rebuilt after the atlas was cleared
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        """
+        Forget every glyph and make the texture transparent
+        """
+        # (font, codepoint) -> (x, y, w, h, advance)
+        self.glyphs = {}
+        self.generation += 1
+        self.x = self.y = self.row_height = 0
+        blank = (ctypes.c_uint32 * (self.size * self.size))()
+        sdl2.SDL_UpdateTexture(self.texture, None, blank, self.size * 4)
+
+    def glyph(self, font, codepoint):
+        """
+        Returns where a glyph is in the atlas, rasterizing it the first
+        time it is used
+
+        :param font: Font object
+        :param codepoint: Unicode codepoint
+        """
+        key = (font, codepoint)
+        glyph = self.glyphs.get(key)
+        if glyph is not None:
+            return glyph
+
+        advance = ctypes.c_int(0)
+        ignored = [ctypes.c_int(0) for _ in range(4)]
+        sdl2.sdlttf.TTF_GlyphMetrics32(font.handle, codepoint, *ignored,
+                                       advance)
+
+        # Glyphs are white so draws can tint them to any color
+        surface = sdl2.sdlttf.TTF_RenderGlyph32_Blended(
+            font.handle, codepoint, sdl2.SDL_Color(255, 255, 255, 255))
+        if not surface:
+            glyph = self.glyphs[key] = (0, 0, 0, 0, advance.value)
+            return glyph
+        w, h = surface.contents.w, surface.contents.h
+
+        if self.x + w > self.size:
+            self.x = 0
+            self.y += self.row_height + 1
+            self.row_height = 0
+        if self.y + h > self.size:
+            self.clear()
+
+        sdl2.SDL_UpdateTexture(
+            self.texture, sdl2.SDL_Rect(self.x, self.y, w, h),
+            surface.contents.pixels, surface.contents.pitch)
+        sdl2.SDL_FreeSurface(surface)
+
+        glyph = self.glyphs[key] = (self.x, self.y, w, h, advance.value)
+        self.x += w + 1
+        self.row_height = max(self.row_height, h)
+        return glyph
+
+    def layout(self, font, text, x, y, retry=True):
+        """
+        Returns the glyph quads of a string as (source, dest) rectangles,
+        source is the part of the atlas texture to copy
+
+        :param font: Font object
+        :param text: String to lay out
+        :param x: Left edge
+        :param y: Top edge
+        :param retry: Start over once if the atlas fills up mid-string
+        """
+        generation = self.generation
+        quads = []
+        glyphs = {}
+        pen = x
+        previous = None
+
+        for codepoint in map(ord, str(text)):
+            glyph = glyphs.get(codepoint)
+            if glyph is None:
+                glyph = glyphs[codepoint] = self.glyph(font, codepoint)
+            if previous is not None:
+                pen += sdl2.sdlttf.TTF_GetFontKerningSizeGlyphs32(
+                    font.handle, previous, codepoint)
+            gx, gy, w, h, advance = glyph
+            if w:
+                quads.append(((gx, gy, w, h), (pen, y, w, h)))
+            pen += advance
+            previous = codepoint
+
+        # Rasterizing a glyph can clear a full atlas, which would leave
+        # earlier glyphs of this string pointing at stale space
+        if retry and self.generation != generation:
+            self.clear()
+            return self.layout(font, text, x, y, retry=False)
+        return quads
+
+
+def installed_fonts():
+    """
+    Returns the installed font files by lowercase name, scanning the
+    font directories the first time
+    """
+    global font_files
+    if font_files is None:
+        font_files = {}
+        for directory in FONT_DIRS:
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    stem, ext = os.path.splitext(name)
+                    if ext.lower() in (".ttf", ".otf"):
+                        font_files.setdefault(
+                            stem.lower(), os.path.join(root, name))
+    return font_files
+
+
+def find_font(family):
+    """
+    Returns the path of a font file for a font-family value, or None if
+    no font matches
+
+    :param family: CSS font-family, such as "Noto Sans", serif
+    """
+    for name in family.split(","):
+        name = name.strip().strip("\"'")
+        if os.path.isfile(name):
+            return name
+        packaged = files('tinyxui.data').joinpath(f"{name}.ttf")
+        if packaged.is_file():
+            return packaged
+        for key in (name.lower(), name.lower().replace(" ", ""),
+                    name.lower().replace(" ", "-") + "-regular",
+                    name.lower().replace(" ", "") + "-regular"):
+            if key in installed_fonts():
+                return installed_fonts()[key]
+    return None
+
+
+def get(family=None, size=None):
+    """
+    Returns a font, opening it the first time it is asked for
+
+    :param family: CSS font-family, the default font if None or not found
+    :param size: Point size
+    """
+    family = family or DEFAULT_FAMILY
+    size = int(size or DEFAULT_SIZE)
+    key = (family, size)
+    font = faces.get(key)
+    if font is not None:
+        return font
+
+    path = find_font(family)
+    if path is None:
+        path = files('tinyxui.data').joinpath(f"{DEFAULT_FAMILY}.ttf")
+    font = opened.get((str(path), size))
+    if font is None:
+        handle = resources.open_font(path, size)
+        if not handle:
+            raise RuntimeError(f"Could not open font {path}!")
+        font = opened[(str(path), size)] = Font(handle, path, size)
+    faces[key] = font
+    return font
+
+
+def for_style(style, default=None):
+    """
+    Returns the font a computed style asks for
+
+    :param style: Computed style dictionary
+    :param default: Font to use if the style doesn't set one
+    """
+    family = style.get("font-family")
+    size = style.get("font-size")
+    if isinstance(size, str):
+        try:
+            size = float(size.removesuffix("pt"))
+        except ValueError:
+            size = None
+    if family is None and size is None and default is not None:
+        return default
+    return get(family, size)
+
+
+def cached(key, compute):
+    """
+    Returns a remembered text layout result, computing it the first time
+
+    :param key: Tuple identifying the result
+    :param compute: Function that computes the result
+    """
+    try:
+        text_cache.move_to_end(key)
+        return text_cache[key]
+    except KeyError:
+        pass
+    value = text_cache[key] = compute()
+    if len(text_cache) > TEXT_CACHE_SIZE:
+        text_cache.popitem(last=False)
+    return value
+
+
+def text_width(font, text):
+    """
+    Returns the width of a single line of text in pixels
+
+    :param font: Font object
+    :param text: String to measure
+    """
+    def compute():
+        w, h = ctypes.c_int(0), ctypes.c_int(0)
+        sdl2.sdlttf.TTF_SizeUTF8(font.handle, text.encode("utf-8"), w, h)
+        return w.value
+    return cached(("width", font, text), compute)
+
+
+def fit(font, text, width):
+    """
+    Returns how many characters of a string fit in a width
+
+    :param font: Font object
+    :param text: String to measure
+    :param width: Width in pixels
+    """
+    extent, count = ctypes.c_int(0), ctypes.c_int(0)
+    sdl2.sdlttf.TTF_MeasureUTF8(font.handle, text.encode("utf-8"),
+                                max(0, int(width)), extent, count)
+    return count.value
+
+
+def words(font, text):
+    """
+    Split text into paragraphs of (word, width) pairs. Widths are kept so
+    wrapping the same text at another width doesn't measure anything.
+
+    :param font: Font object
+    :param text: String to split
+    """
+    return cached(("words", font, text), lambda: [
+        [(word, text_width(font, word)) for word in paragraph.split()]
+        for paragraph in text.split("\n")
+    ])
+
+
+def wrap(font, text, width):
+    """
+    Break text into lines no wider than a width. Words that are too long
+    on their own are broken between characters, unless the width is 0
+    and no character would fit anyway.
+
+    :param font: Font object
+    :param text: String to wrap
+    :param width: Width in pixels
+    """
+    text = str(text)
+    if width <= 0:
+        return tuple(text.split("\n"))
+
+    def compute():
+        space = text_width(font, " ")
+        lines = []
+        for paragraph in words(font, text):
+            line, line_width = [], 0
+            for word, word_width in paragraph:
+                if line and line_width + space + word_width <= width:
+                    line.append(word)
+                    line_width += space + word_width
+                    continue
+                if line:
+                    lines.append(" ".join(line))
+                while word_width > width and len(word) > 1:
+                    count = max(1, fit(font, word, width))
+                    lines.append(word[:count])
+                    word = word[count:]
+                    word_width = text_width(font, word)
+                line, line_width = [word], word_width
+            lines.append(" ".join(line))
+        return tuple(lines)
+    return cached(("wrap", font, text, width), compute)
+
+
+def ellipsize(font, text, width):
+    """
+    Shorten a line of text with an ellipsis so it fits in a width
+
+    :param font: Font object
+    :param text: String to shorten
+    :param width: Width in pixels
+    """
+    text = str(text)
+
+    def compute():
+        if text_width(font, text) <= width:
+            return text
+        count = fit(font, text, width - text_width(font, ELLIPSIS))
+        return text[:count].rstrip() + ELLIPSIS
+    return cached(("ellipsize", font, text, width), compute)
+
+
+def atlas_for(sdl_renderer):
+    """
+    Returns the glyph atlas of a renderer, creating it the first time
+
+    :param sdl_renderer: SDL renderer
+    """
+    atlas = atlases.get(resources.address(sdl_renderer))
+    if atlas is None:
+        atlas = atlases[resources.address(sdl_renderer)] = \
+            Atlas(sdl_renderer)
+    return atlas
+
+
+def release_renderer(sdl_renderer):
+    """
+    Free the glyph atlas of a renderer that is about to be destroyed
+
+    :param sdl_renderer: SDL renderer
+    """
+    atlas = atlases.pop(resources.address(sdl_renderer), None)
+    if atlas is not None:
+        resources.release(atlas.texture)
+
+
+def clear():
+    """
+    Forget the cached fonts and atlases, their SDL objects are freed by
+    the resource manager
+    """
+    faces.clear()
+    opened.clear()
+    text_cache.clear()
+    atlases.clear()
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's font manager on its own!")
+    print("Import it into another codebase to use it.")
@@ -1,56 +1,39 @@
+import ctypes
 import sdl2
+import sdl2.sdlttf
+from . import fonts
 from . import style_provider
 from importlib.resources import files
 
-def normalize_layout_attrs(widget):
+
+def measure(widget, font, settings):
     """
-    Converts attribute aliases to direct attributes
+    Returns the minimum width and height for a widget, including padding.
+    The result only depends on the widget's contents, so it is cached
+    until the widget changes and reused for every window size.
     
     :param widget: Widget object
+    :param font: Font used when the stylesheet doesn't set one
+    :param settings: Document settings
     """
-    align = widget.attributes.get("align", "start").lower()
-
-    # Default to start
-    widget.halign = "start"
-    widget.valign = "start"
-
-    # Parse align attribute
-    if align in ("start", "left"):
-        widget.halign = "start"
-    elif align in ("center", "hcenter"):
-        widget.halign = "center"
-    elif align in ("end", "right"):
-        widget.halign = "end"
-
-    if align in ("start", "top"):
-        widget.valign = "start"
-    elif align in ("center", "vcenter"):
-        widget.valign = "center"
-    elif align in ("end", "bottom"):
-        widget.valign = "end"
-
-    # expand flags
-    widget.hexpand = widget.attributes.get("hexpand", False)
-    widget.vexpand = widget.attributes.get("vexpand", False)
+    if widget.measured is None:
+        widget.measured = measure_widget(widget, font, settings)
+    return widget.measured
 
-    # "expand" shortcut for both directions
-    if widget.attributes.get("expand", False):
-        widget.hexpand = True
-        widget.vexpand = True
 
-
-def measure(widget, font, settings):
+def get_padding(widget, settings):
     """
-    Measures and returns minimum width and height for a widget, including padding.
+    Returns a widget's stateless style and its padding as
+    (left, right, top, bottom)
     
     :param widget: Widget object
-    :param font: SDL font object
     :param settings: Document settings
     """
     # Load padding from stylesheet
     stylesheet = files('tinyxui.data').joinpath(settings["stylesheet"])
-    ast = style_provider.generate_ast(stylesheet)
-    padding = style_provider.Provider.get_property(ast, widget.name, "padding") or 0
+    ast = style_provider.get_stylesheet(stylesheet)
+    style = style_provider.Provider.get_style(ast, widget, with_state=False)
+    padding = style.get("padding") or 0
     pad_left = pad_right = pad_top = pad_bottom = int(padding)
 
     # If padding is a tuple/list, unpack
@@ -60,16 +43,69 @@ def measure(widget, font, settings):
         elif len(padding) == 4:
             pad_top, pad_right, pad_bottom, pad_left = padding
 
+    return style, (pad_left, pad_right, pad_top, pad_bottom)
+
+
+def measure_label(widget, face):
+    """
+    Returns the text size of a label. Wrapped and ellipsized labels ask
+    for their width attribute at most, or nothing if they expand, and
+    wrapped labels are as tall as their lines at the width they got.
+    
+    :param widget: Label widget object
+    :param face: fonts.Font object
+    """
+    text = str(widget.data)
+    if not (widget.props["wrap"] or widget.props["ellipsize"]):
+        # Ask for the text size without rendering it to a surface
+        w, h = ctypes.c_int(0), ctypes.c_int(0)
+        if sdl2.sdlttf.TTF_SizeUTF8(
+                face.handle, text.encode("utf-8"), w, h) != 0:
+            return (0, 0)
+        return (w.value, h.value)
+
+    natural = max(fonts.text_width(face, line) for line in text.split("\n"))
+    if widget.props["width"] is not None:
+        width = min(natural, widget.props["width"])
+    elif widget.hexpand:
+        width = 0
+    else:
+        width = natural
+
+    if not widget.props["wrap"]:
+        return (width, face.height)
+    # Until reflow() hands out a width, expanding labels are measured as
+    # one line per paragraph
+    wrap_width = widget.wrap_width
+    if wrap_width is None:
+        wrap_width = width or natural
+    lines = fonts.wrap(face, text, wrap_width)
+    return (width, face.height + (len(lines) - 1) * face.line_skip)
+
+
+def measure_widget(widget, font, settings):
+    """
+    Measures and returns minimum width and height for a widget, including padding.
+    
+    :param widget: Widget object
+    :param font: Font used when the stylesheet doesn't set one
+    :param settings: Document settings
+    """
+    style, (pad_left, pad_right, pad_top, pad_bottom) = \
+        get_padding(widget, settings)
+
     # Function to add padding
     def add_padding(w, h):
         return w + pad_left + pad_right, h + pad_top + pad_bottom
 
-    # Children override everything
-    if widget.children:
-        direction = widget.attributes.get("direction", "vertical")
+    # Children override everything, except the fill of a progressbar
+    # which follows the size of the bar instead
+    children = widget.visible_children()
+    if children and widget.name != "progressbar":
+        direction = widget.props["direction"]
         total_w, total_h = 0, 0
 
-        for child in widget.children:
+        for child in children:
             cw, ch = measure(child, font, settings=settings)
 
             if direction == "horizontal":
@@ -84,65 +120,105 @@ def measure(widget, font, settings):
     # Leaf widgets: use match-case
     match widget.name:
         case "label":
-            sdl_color = sdl2.SDL_Color(0, 0, 0, 255)
-            surface = sdl2.sdlttf.TTF_RenderUTF8_Blended(
-                font, str(widget.data).encode("utf-8"), sdl_color
-            )
-            if not surface:
-                return add_padding(0, 0)
-            w, h = surface.contents.w, surface.contents.h
-            sdl2.SDL_FreeSurface(surface)
-            return add_padding(w, h)
-
-        case "button":
-            w = int(widget.attributes.get("width", 72))
-            h = int(widget.attributes.get("height", 32))
-            return add_padding(w, h)
+            return add_padding(
+                *measure_label(widget, fonts.for_style(style, font)))
+
+        case "button" | "spacer":
+            return add_padding(widget.props["width"], widget.props["height"])
 
         case "icon":
-            size = int(widget.attributes.get("size", 16))
+            size = widget.props["size"]
             return add_padding(size, size)
 
         case "image":
-            try:
-                size = int(widget.attributes["size"])
+            size = widget.props["size"]
+            if size is not None:
                 return add_padding(size, size)
-            except KeyError:
-                w = int(widget.attributes.get("width", 16))
-                h = int(widget.attributes.get("height", 16))
-                return add_padding(w, h)
+            return add_padding(widget.props["width"], widget.props["height"])
 
         case "separator":
-            direction = widget.attributes.get("direction", "horizontal")
-            if direction == "vertical":
-                w = 1
-                h = int(widget.attributes.get("height", 128))
-            else:
-                w = int(widget.attributes.get("width", 128))
-                h = 1
-            return add_padding(w, h)
-
-        case "spacer":
-            w = int(widget.attributes.get("width", 0))
-            h = int(widget.attributes.get("height", 0))
-            return add_padding(w, h)
+            if widget.props["direction"] == "vertical":
+                return add_padding(1, widget.props["height"])
+            return add_padding(widget.props["width"], 1)
 
         case "progressbar":
-            w = int(widget.attributes.get("width", 128))
-            return (w, 0)
+            return (widget.props["width"], widget.props["height"])
 
         case "progressfill":
-            total_width = int(widget.attributes.get("width", getattr(widget.parent, "width", 128)))
+            total_width = widget.props["width"]
+            if total_width is None:
+                total_width = getattr(widget.parent, "width", 128)
             progress = getattr(widget, "progress", 0)
-            w = int(total_width * (progress / 100))
-            h = int(widget.attributes.get("height", 8))
-            return (w, h)
-
+            return (int(total_width * (progress / 100)),
+                    widget.props["height"])
 
         case _:  # default fallback
             return (0, 0)
 
 
+def place_progressfill(widget):
+    """
+    Positions the fill of a progressbar from its current progress, without
+    touching the rest of the layout
+    
+    :param widget: Progressbar widget object
+    """
+    fill = widget.fill
+    fill.x, fill.y = widget.x, widget.y
+    fill.width = int(widget.width * (fill.progress / 100))
+    fill.height = fill.props["height"]
+    # The fill animates without a relayout, so its bounds follow the bar
+    fill.bounds = (widget.x, widget.y,
+                   widget.x + widget.width, widget.y + fill.height)
+
+
+def reflow(widget, settings):
+    """
+    Give wrapped and ellipsized labels the width layout assigned them.
+    Returns True if a wrapped label changed width, its height depends on
+    it so the layout has to run again.
+    
+    :param widget: Widget object
+    :param settings: Document settings
+    """
+    changed = False
+    if widget.name == "label" and \
+            (widget.props["wrap"] or widget.props["ellipsize"]):
+        _, (pad_left, pad_right, _, _) = get_padding(widget, settings)
+        width = max(0, widget.width - pad_left - pad_right)
+        if width != widget.wrap_width:
+            widget.wrap_width = width
+            if widget.props["wrap"]:
+                parent = widget
+                while parent is not None:
+                    parent.measured = None
+                    parent = parent.parent
+                changed = True
+
+    for child in widget.visible_children():
+        changed = reflow(child, settings) or changed
+    return changed
+
+
+def compute_bounds(widget):
+    """
+    Stores the area covered by a widget and its visible children as
+    (x1, y1, x2, y2), children can overflow their parent
+    
+    :param widget: Widget object
+    """
+    x1, y1 = widget.x, widget.y
+    x2, y2 = widget.x + widget.width, widget.y + widget.height
+
+    for child in widget.visible_children():
+        cx1, cy1, cx2, cy2 = compute_bounds(child)
+        x1, y1 = min(x1, cx1), min(y1, cy1)
+        x2, y2 = max(x2, cx2), max(y2, cy2)
+
+    widget.bounds = (x1, y1, x2, y2)
+    return widget.bounds
+
+
 def compute_layout(widget, x=0, y=0, width=None, height=None,
                    settings=None, font=None):
     """
@@ -154,10 +230,8 @@ def compute_layout(widget, x=0, y=0, width=None, height=None,
     :param width: Widget width
     :param height: Widget height
     :param settings: Document settings from AST
-    :param font: SDL font object
+    :param font: Font used when the stylesheet doesn't set one
     """
-    normalize_layout_attrs(widget)
-
     if width is None:
         width = settings["width"]
     if height is None:
@@ -181,14 +255,22 @@ def compute_layout(widget, x=0, y=0, width=None, height=None,
         widget.width = mw if width is None else width
         widget.height = mh if height is None else height
 
-    if not widget.children:
+    children = widget.visible_children()
+    if not children:
+        return
+
+    if widget.name == "progressbar" and hasattr(widget, "fill"):
+        place_progressfill(widget)
+        return
+
+    # The active page of a stack fills the whole stack
+    if widget.name == "stack":
+        for child in children:
+            compute_layout(child, widget.x, widget.y, widget.width,
+                           widget.height, settings=settings, font=font)
         return
 
-    # Normalize all children
-    for child in widget.children:
-        normalize_layout_attrs(child)
-        
-    direction = widget.attributes.get("direction", "vertical")
+    direction = widget.props["direction"]
 
     # Horizontal
     if direction == "horizontal":
@@ -196,7 +278,7 @@ def compute_layout(widget, x=0, y=0, width=None, height=None,
         expanders = []
         sizes = []
 
-        for child in widget.children:
+        for child in children:
             cw, ch = measure(child, font, settings=settings)
             sizes.append([cw, ch])
             total_base += cw
@@ -209,7 +291,7 @@ def compute_layout(widget, x=0, y=0, width=None, height=None,
 
         cx = widget.x
 
-        for i, child in enumerate(widget.children):
+        for i, child in enumerate(children):
             cw, ch = sizes[i]
 
             if child.hexpand:
@@ -235,7 +317,7 @@ def compute_layout(widget, x=0, y=0, width=None, height=None,
         expanders = []
         sizes = []
 
-        for child in widget.children:
+        for child in children:
             cw, ch = measure(child, font, settings=settings)
             sizes.append([cw, ch])
             total_base += ch
@@ -247,7 +329,7 @@ def compute_layout(widget, x=0, y=0, width=None, height=None,
         extra = remaining // len(expanders) if expanders else 0
 
         total_height = sum(
-            ch + (extra if widget.children[i].vexpand else 0)
+            ch + (extra if children[i].vexpand else 0)
             for i, (_, ch) in enumerate(sizes)
         )
 
@@ -259,7 +341,7 @@ def compute_layout(widget, x=0, y=0, width=None, height=None,
         else:
             cy = widget.y
 
-        for i, child in enumerate(widget.children):
+        for i, child in enumerate(children):
             cw, ch = sizes[i]
 
             if child.vexpand:
@@ -4,20 +4,47 @@ import sdl2
 import sdl2.ext
 import sdl2.sdlttf
 from . import style_provider
+from . import scheduler
+from . import resources
+from . import recorder
+from . import binding
+from . import fonts
+from . import atlas
+from .display_list import DisplayList
+from . import schema
 import PIL
+import base64
+import contextlib
 from importlib.resources import files
+import os
 import sys
+import threading
+import time
 
 
 DEBUG_VIEW = False
+# Functions bound with the module level bind_widget(), by widget ID. They
+# apply to every window, Window.bind_widget() binds in a single window.
 bindings = {}
-widget_map = {}
+# The running App, module level functions act on all of its windows
+app = None
+# Called with (seconds, relayout) after every render pass when set
+on_frame = None
+# Called when the App quits, after its windows closed and before the
+# fonts and other shared SDL objects are freed
+on_shutdown = None
+# While a transaction runs: widget -> remeasure for every widget marked
+# dirty, and window -> relayout for the invalidations to request once it
+# ends
+dirty_widgets = None
+pending_invalidate = None
+transaction_thread = None
 
 
 def hex_to_argb(hex_code, alpha=255):
     """
     Converts hex codes to SDL ARGB (r, g, b, alpha)
-    
+
     :param hex_code: Hex code for color, Ex: #FFF or #432fca
     :param alpha: Transparancy level, 255 is opaque, 0 is invisible
     """
@@ -30,92 +57,137 @@ def hex_to_argb(hex_code, alpha=255):
     return sdl2.SDL_Color(r, g, b, alpha)
 
 
-def draw_widget(widget, settings):
+def mark_dirty(widget, remeasure=False):
+    """
+    Mark the cached layers containing a widget for re-rendering
+
+    :param widget: Widget object that changed
+    :param remeasure: The change can affect the size of the widget, so
+        drop the cached sizes of it and its parents
+    """
+    # Only the thread running a transaction adds to it, updates from other
+    # threads apply right away like Window.invalidate()
+    if dirty_widgets is not None and \
+            threading.get_ident() == transaction_thread:
+        dirty_widgets[widget] = dirty_widgets.get(widget, False) or remeasure
+        return
+    mark_ancestors({widget: remeasure})
+
+
+def mark_ancestors(changed):
+    """
+    Mark widgets and their parents dirty, walking each shared parent once
+
+    :param changed: Dictionary of widget -> remeasure
+    """
+    seen = {}
+    for widget, remeasure in changed.items():
+        while widget is not None:
+            done = seen.get(widget)
+            if done is not None and (done or not remeasure):
+                break
+            seen[widget] = remeasure
+            if hasattr(widget, "layer_texture"):
+                widget.layer_dirty = True
+            if remeasure:
+                widget.measured = None
+            widget = widget.parent
+
+
+@contextlib.contextmanager
+def transaction():
     """
-    Draws a provided widget on the screen
-    
+    Apply every update made inside the with block together. Widgets are
+    marked dirty once each when it ends, and each window is invalidated
+    once. Transactions can be nested, the outermost one applies. Updates
+    other threads make meanwhile aren't part of it and apply right away.
+    """
+    global dirty_widgets
+    global pending_invalidate
+    global transaction_thread
+    if dirty_widgets is not None:
+        yield
+        return
+
+    dirty_widgets = {}
+    pending_invalidate = {}
+    transaction_thread = threading.get_ident()
+    try:
+        yield
+    finally:
+        changed = dirty_widgets
+        invalidated = pending_invalidate
+        dirty_widgets = None
+        pending_invalidate = None
+        transaction_thread = None
+        mark_ancestors(changed)
+        for window, relayout in invalidated.items():
+            window.invalidate(relayout=relayout)
+
+
+def is_layer(widget):
+    """
+    Check if a widget asked for its subtree to be cached in a texture
+
     :param widget: Widget object
     """
-    stylesheet = files('tinyxui.data').joinpath(settings["stylesheet"])
-    ast = style_provider.generate_ast(stylesheet)
-    match widget.name:
-        case "label":
-            text_color = style_provider.Provider.get_property(
-                ast,
-                "label",
-                "color"
-            )
-            color = style_provider.hex_to_argb(text_color)
-            surface = sdl2.sdlttf.TTF_RenderUTF8_Blended(
-                font, str(widget.data).encode("utf-8"), color
-            )
-            if not surface:
-                print("Failed to render text")
-                return
+    return widget.props["cache"] or widget.props["layer"]
 
-            texture = sdl2.SDL_CreateTextureFromSurface(sdl_renderer, surface)
-            if not texture:
-                print("Failed to create texture")
-                sdl2.SDL_FreeSurface(surface)
-                return
 
-            rect = sdl2.SDL_Rect(widget.x, (widget.y - 1), surface.contents.w,
-                                surface.contents.h)
-            sdl2.SDL_RenderCopy(sdl_renderer, texture, None, rect)
-            sdl2.SDL_FreeSurface(surface)
-            sdl2.SDL_DestroyTexture(texture)
-
-        case "image":
-            if not hasattr(widget, "texture_cache"):
-                try:
-                    file_path = widget.attributes.get("src", "missing.png")
-                    surface = sdl2.ext.load_image(file_path)
-                except PIL.UnidentifiedImageError:
-                    return
-                widget.texture_cache = sdl2.SDL_CreateTextureFromSurface(
-                    sdl_renderer, surface)
-                widget.texture_w, widget.texture_h = surface.w, surface.h
-
-                sdl2.SDL_FreeSurface(surface)
-                
-
-            rect = sdl2.SDL_Rect(widget.x, widget.y, widget.width, widget.height)
-            sdl2.SDL_RenderCopy(sdl_renderer, widget.texture_cache, None, rect)
-
-        case "box":
-            if DEBUG_VIEW is True:
-                sdl2.SDL_SetRenderDrawColor(
-                    sdl_renderer, 255, 0, 0, 255
-                )
-                sdl2.SDL_RenderDrawRect(
-                    sdl_renderer, sdl2.SDL_Rect(widget.x, widget.y,
-                                                widget.width, widget.height)
-                )
-
-        case "spacer":
-            if DEBUG_VIEW is True:
-                sdl2.SDL_SetRenderDrawColor(
-                    sdl_renderer, 0, 0, 255, 255
-                )
-                sdl2.SDL_RenderDrawRect(
-                    sdl_renderer, sdl2.SDL_Rect(widget.x, widget.y,
-                                                widget.width, widget.height)
-                )  
-
-        case _:
-            style_provider.Provider.draw(ast, widget, sdl_renderer=sdl_renderer)
-
-
-    # Draw children
+def offset_tree(widget, dx, dy):
+    """
+    Move a widget and its children by an offset
+
+    :param widget: Widget object
+    :param dx: X offset
+    :param dy: Y offset
+    """
+    widget.x += dx
+    widget.y += dy
+    if widget.bounds is not None:
+        x1, y1, x2, y2 = widget.bounds
+        widget.bounds = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
     for child in widget.children:
-        draw_widget(child, settings)
+        offset_tree(child, dx, dy)
+
+
+def intersect(a, b):
+    """
+    Returns the overlap of two (x1, y1, x2, y2) rectangles, or None if
+    they don't overlap
+
+    :param a: First rectangle
+    :param b: Second rectangle
+    """
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return (x1, y1, x2, y2)
+
+
+def use_atlas_entry(sdl_renderer, widget, key, entry):
+    """
+    Point an image or icon widget at its packed image. The atlas keeps
+    the image until the widget is released.
+
+    :param sdl_renderer: SDL renderer of the widget's window
+    :param widget: Widget object
+    :param key: Atlas key of the image
+    :param entry: atlas.Entry object
+    """
+    atlas.use(sdl_renderer, key, widget)
+    widget.image_key = widget.atlas_key = key
+    widget.texture_cache = entry.texture
+    widget.texture_size = (entry.page.size, entry.page.size)
+    widget.texture_rect = entry.rect
 
 
 def ensure_progressbar_fill(widget):
     """
-    Injects a child box for progressbar fill if needed,
-    and updates its progress if it already exists.
-    
+    Injects a child box for progressbar fill if needed. Only has to run
+    when a document is loaded, progress updates go through set_progress.
+
     :param widget: Widget to modify
     """
     if widget.name == "progressbar":
@@ -128,37 +200,1170 @@ def ensure_progressbar_fill(widget):
 
         if progressfill is None:
             # Create new progressfill if it doesn't exist
-            fill = type(widget)(name="progressfill")  # reuse your Widget class
-            fill.parent = widget
-            fill.height = widget.height
-            fill.progress = widget.attributes.get("progress", 0)
-            widget.children.append(fill)
-        else:
-            # Update progress if it already exists
-            progressfill.progress = widget.attributes.get("progress", 0)
+            progressfill = type(widget)(name="progressfill", parent=widget)
+            progressfill.height = widget.height
+            widget.children.append(progressfill)
+
+        widget.fill = progressfill
+        widget.progress = widget.props["progress"]
+        widget.animation = None
+        progressfill.progress = widget.progress
 
     # Recurse into children
     for child in widget.children:
         ensure_progressbar_fill(child)
 
 
-def build_widget_map(widget):
+def hit_test(widget, x, y, clip=None):
     """
-    Recursively build a mapping of widget IDs to widget objects.
-    
-    :param widget: Widget object
+    Returns the list of widgets under a point, from the outermost
+    widget down to the deepest child. Like drawing, children can overflow
+    their parent unless it is a clip container.
+
+    :param widget: Widget object to start from
+    :param x: X position
+    :param y: Y position
+    :param clip: (x1, y1, x2, y2) area of the nearest clip container,
+        nothing outside it can be hit
     """
-    wid = widget.attributes.get("id")
-    if wid:
-        widget_map[wid] = widget
-    for child in widget.children:
-        build_widget_map(child)
+    if clip is not None and \
+            not (clip[0] <= x < clip[2] and clip[1] <= y < clip[3]):
+        return []
+    x1, y1, x2, y2 = widget.bounds or (
+        widget.x, widget.y, widget.x + widget.width,
+        widget.y + widget.height)
+    if not (x1 <= x <= x2 and y1 <= y <= y2):
+        return []
+
+    if widget.props["clip"]:
+        rect = (widget.x, widget.y,
+                widget.x + widget.width, widget.y + widget.height)
+        clip = intersect(clip, rect) if clip is not None else rect
+        if clip is None:
+            return []
+
+    for child in reversed(widget.visible_children()):
+        path = hit_test(child, x, y, clip)
+        if path:
+            return [widget] + path
+    if widget.x <= x <= widget.x + widget.width and \
+            widget.y <= y <= widget.y + widget.height:
+        return [widget]
+    return []
+
+
+class Window:
+    """
+    A window showing a TXM document. Each window has its own widget tree,
+    IDs, bindings and render state. Fonts, stylesheets, decoded images,
+    text layout caches and the model are shared with the other windows
+    of its App, only textures are per window.
+    """
+    def __init__(self, app, file, headless=False):
+        self.app = app
+        self.bindings = {}
+        self.widget_map = {}
+        # Widget type -> widgets and style class -> widgets, dicts keep
+        # them in document order
+        self.type_index = {}
+        self.class_index = {}
+        # model key -> (widget, attribute) pairs, attribute None for data.
+        # Dicts keep them in document order without duplicates when a
+        # subtree is indexed again.
+        self.data_bindings = {}
+        self.animating = set()
+        self.hovered_path = []
+        self.pressed_path = []
+        # Area being drawn to as (x1, y1, x2, y2), widgets outside it are
+        # skipped
+        self.clip = None
+        # Draw commands of the whole tree, replayed until something changes
+        self.display_list = None
+        self.needs_redraw = True
+        self.needs_layout = True
+        self.needs_rebuild = True
+        # Set by a close event, the App closes the window after the events
+        # of the pass are handled
+        self.closing = False
+
+        self.load_document(file)
+        recorder.record("txm", file)
+
+        # Initialize window and renderer
+        if headless:
+            window_flags = sdl2.SDL_WINDOW_HIDDEN
+            renderer_flags = sdl2.SDL_RENDERER_SOFTWARE
+        else:
+            window_flags = sdl2.SDL_WINDOW_SHOWN
+            renderer_flags = sdl2.SDL_RENDERER_ACCELERATED | \
+                sdl2.SDL_RENDERER_PRESENTVSYNC
+        if self.settings.get("resizable"):
+            window_flags |= sdl2.SDL_WINDOW_RESIZABLE
+        self.size = (self.settings["width"], self.settings["height"])
+        self.window = sdl2.ext.Window(
+            self.settings["window_title"],
+            size=self.size,
+            flags=window_flags,
+        )
+        self.sdl_renderer = sdl2.SDL_CreateRenderer(
+            self.window.window,
+            -1,
+            renderer_flags,
+        )
+        self.id = sdl2.SDL_GetWindowID(self.window.window)
+
+    def load_document(self, file):
+        """
+        Parse a TXM document and index its widgets
+
+        :param file: TXM markup file to read from
+        """
+        self.settings, self.widgets = txm.generate_ast(file)
+        self.index_document()
+
+    def index_document(self):
+        """
+        Prepare a freshly parsed widget tree and index its widgets
+        """
+        ensure_progressbar_fill(self.widgets)
+        self.build_widget_map(self.widgets)
+
+    def mark_dirty(self, widget, remeasure=False):
+        """
+        Mark the cached layers containing a widget for re-rendering, and
+        the display list for rebuilding
+
+        :param widget: Widget object that changed
+        :param remeasure: The change can affect the size of the widget
+        """
+        self.needs_rebuild = True
+        mark_dirty(widget, remeasure)
+
+    def invalidate(self, relayout=False):
+        """
+        Request a redraw on the next pass of the main loop
+
+        :param relayout: Also recompute the layout before drawing
+        """
+        if dirty_widgets is not None and \
+                threading.get_ident() == transaction_thread:
+            pending_invalidate[self] = \
+                pending_invalidate.get(self, False) or relayout
+            return
+        if relayout:
+            self.needs_layout = True
+        if self.needs_redraw:
+            return
+        self.needs_redraw = True
+
+        # Updates from other threads have to wake up a sleeping main loop
+        if scheduler.ui_thread is not None and \
+                threading.get_ident() != scheduler.ui_thread:
+            scheduler.wake()
+
+    def draw_layer(self, widget, display_list):
+        """
+        Adds a cached subtree as a single texture copy. The subtree gets
+        its own display list, rebuilt and rendered into the texture only
+        if anything inside changed. Returns False if the layer texture
+        couldn't be created.
+
+        :param widget: Widget object
+        :param display_list: DisplayList to add to
+        """
+        w, h = widget.width, widget.height
+        if w <= 0 or h <= 0:
+            return True
+
+        texture = getattr(widget, "layer_texture", None)
+        if texture is None or widget.layer_size != (w, h):
+            resources.release(texture)
+            texture = resources.create_target(self.sdl_renderer, w, h,
+                                              owner=widget)
+            if not texture:
+                return False
+            widget.layer_texture = texture
+            widget.layer_size = (w, h)
+            widget.layer_dirty = True
+
+        if widget.layer_dirty or getattr(widget, "layer_list", None) is None:
+            widget.layer_dirty = True
+            previous_clip = self.clip
+
+            # Draw code works in window coordinates, so move the subtree
+            # to the texture origin while its commands are built
+            x, y = widget.x, widget.y
+            offset_tree(widget, -x, -y)
+            self.clip = (0, 0, w, h)
+            widget.layer_list = DisplayList(self.sdl_renderer)
+            self.draw_widget(widget, widget.layer_list, use_layer=False)
+            widget.layer_list.finish()
+            offset_tree(widget, x, y)
+            self.clip = previous_clip
+
+        display_list.layer(widget)
+        return True
+
+    def draw_widget(self, widget, display_list, use_layer=True):
+        """
+        Adds the draw commands of a widget and its children to a display
+        list
+
+        :param widget: Widget object
+        :param display_list: DisplayList to add to
+        :param use_layer: Draw cached widgets from their layer texture
+        """
+        # Skip subtrees that are completely outside the area being drawn
+        if self.clip is not None and widget.bounds is not None and \
+                intersect(widget.bounds, self.clip) is None:
+            return
+
+        if use_layer and is_layer(widget) and \
+                self.draw_layer(widget, display_list):
+            return
+
+        stylesheet = files('tinyxui.data').joinpath(
+            self.settings["stylesheet"])
+        ast = style_provider.get_stylesheet(stylesheet)
+        match widget.name:
+            case "label":
+                style = style_provider.Provider.get_style(ast, widget)
+                color = style_provider.hex_to_argb(style.get("color"))
+                face = fonts.for_style(style, self.app.font)
+                # Glyphs come from the shared atlas, so changing text
+                # doesn't rasterize or allocate anything new
+                if widget.props["wrap"] and widget.wrap_width is not None:
+                    lines = fonts.wrap(face, widget.data, widget.wrap_width)
+                    for i, line in enumerate(lines):
+                        display_list.text(face, line, widget.x,
+                                          widget.y - 1 + i * face.line_skip,
+                                          color)
+                elif widget.props["ellipsize"] and \
+                        widget.wrap_width is not None:
+                    display_list.text(
+                        face, fonts.ellipsize(face, widget.data,
+                                              widget.wrap_width),
+                        widget.x, widget.y - 1, color)
+                else:
+                    display_list.text(face, widget.data, widget.x,
+                                      widget.y - 1, color)
+
+            case "image":
+                if not hasattr(widget, "texture_cache") and \
+                        not self.load_image_texture(widget):
+                    return
+                display_list.sprite(widget.texture_cache,
+                                    widget.texture_size, widget.texture_rect,
+                                    (widget.x, widget.y,
+                                     widget.width, widget.height))
+
+            case "icon":
+                if widget.props["src"] is None:
+                    return
+                if not hasattr(widget, "texture_cache") and \
+                        not self.load_image_texture(widget):
+                    return
+                # Symbolic icons are single color shapes tinted like text
+                tint = (255, 255, 255, 255)
+                if widget.props["symbolic"]:
+                    c = style_provider.hex_to_argb(
+                        style_provider.Provider.get_style(ast, widget).get(
+                            "color", "#000"))
+                    tint = (c.r, c.g, c.b, 255)
+                size = widget.props["size"]
+                x = widget.x + (widget.width - size) // 2
+                y = widget.y + (widget.height - size) // 2
+                display_list.sprite(widget.texture_cache,
+                                    widget.texture_size, widget.texture_rect,
+                                    (x, y, size, size), tint)
+
+            case "box":
+                if DEBUG_VIEW is True:
+                    display_list.outline_rect(widget.x, widget.y,
+                                              widget.width, widget.height,
+                                              (255, 0, 0, 255))
+
+            case "spacer":
+                if DEBUG_VIEW is True:
+                    display_list.outline_rect(widget.x, widget.y,
+                                              widget.width, widget.height,
+                                              (0, 0, 255, 255))
+
+            case "progressfill":
+                # Progress only changes the fill's width, the replay draws
+                # it at the new size without rebuilding the list
+                display_list.resizable(
+                    widget, lambda widget, commands:
+                        style_provider.Provider.draw(ast, widget, commands))
+
+            case _:
+                style_provider.Provider.draw(ast, widget, display_list)
+
+
+        # Draw children, clip containers keep them inside their own area
+        if not widget.props["clip"]:
+            for child in widget.visible_children():
+                self.draw_widget(child, display_list)
+            return
+
+        previous_clip = self.clip
+        rect = (widget.x, widget.y,
+                widget.x + widget.width, widget.y + widget.height)
+        self.clip = intersect(self.clip, rect) \
+            if self.clip is not None else rect
+        if self.clip is not None:
+            display_list.clip(self.clip)
+            for child in widget.visible_children():
+                self.draw_widget(child, display_list)
+            display_list.unclip()
+        self.clip = previous_clip
+
+    def load_image_texture(self, widget):
+        """
+        Load the texture of an image or icon widget. Small files are
+        packed into an atlas page, so icons that share a page are drawn
+        together. Decoded pixels of files of any size are shared with
+        other windows. Returns False if the image couldn't be loaded.
+
+        :param widget: Widget object
+        """
+        image_data = getattr(widget, "image_data", None)
+        key = None
+        surface = None
+        if image_data is None:
+            key = resources.find_image(widget.props["src"])
+            entry = atlas.get(self.sdl_renderer, key)
+            if entry is not None:
+                use_atlas_entry(self.sdl_renderer, widget, key, entry)
+                return True
+            # Big images another window decoded only need a texture here
+            surface = atlas.images.get(key)
+
+        try:
+            if image_data is not None:
+                surface = resources.load_image_bytes(image_data)
+            elif surface is None:
+                surface = resources.load_image(key)
+        except PIL.UnidentifiedImageError:
+            return False
+
+        entry = None
+        if key is not None and atlas.fits(surface):
+            entry = atlas.add(self.sdl_renderer, key, surface)
+        if entry is not None:
+            use_atlas_entry(self.sdl_renderer, widget, key, entry)
+            return True
+
+        # Set and big images get a texture of their own. Big images keep
+        # their decoded pixels for other windows while any widget shows
+        # them, set ones belong to this widget alone.
+        widget.image_key = key
+        widget.atlas_key = None
+        widget.texture_cache = resources.create_texture(
+            self.sdl_renderer, surface, owner=widget)
+        widget.texture_size = (surface.contents.w, surface.contents.h)
+        widget.texture_rect = (0, 0, surface.contents.w, surface.contents.h)
+        if key is not None:
+            atlas.keep(key, surface)
+        else:
+            resources.release(surface)
+        atlas.use(self.sdl_renderer, key, widget)
+        return True
+
+    def set_progress(self, widget_id, progress):
+        """
+        Set the progress of a progressbar via its ID. Only the fill is
+        resized, the rest of the layout is left alone.
+
+        If the progressbar has an interpolate attribute, the fill animates
+        to the new value over that many milliseconds.
+
+        :param widget_id: ID of specified widget
+        :param progress: Progress from 0 to 100
+        """
+        widget = self.widget_map.get(widget_id)
+        if not widget or not hasattr(widget, "fill"):
+            return False
+        self.update_progress(widget, progress)
+        return True
+
+    def update_progress(self, widget, progress):
+        """
+        Move a progressbar to a new value
+
+        :param widget: Progressbar widget object
+        :param progress: Progress from 0 to 100
+        """
+        progress = schema.convert(widget.name, "progress", progress)
+        widget.own_attributes()
+        widget.attributes["progress"] = widget.props["progress"] = progress
+        if progress == widget.progress and widget.animation is None:
+            return
+
+        duration = widget.props["interpolate"]
+        if duration:
+            widget.animation = (widget.fill.progress, progress,
+                                time.monotonic(), duration / 1000)
+            self.animating.add(widget)
+        else:
+            widget.animation = None
+            self.animating.discard(widget)
+            widget.fill.progress = progress
+            layout.place_progressfill(widget)
+
+        widget.progress = progress
+        # The display list draws the fill at its current width, so only
+        # layers around the bar have to be rendered again
+        mark_dirty(widget)
+        self.invalidate()
+
+    def step_animations(self):
+        """
+        Advance progressbar fills that are animating towards a new value.
+        Returns True while any animation is still running.
+        """
+        now = time.monotonic()
+        for widget in list(self.animating):
+            start_value, end_value, start_time, duration = widget.animation
+            t = min(1, (now - start_time) / duration)
+            widget.fill.progress = start_value + (end_value - start_value) * t
+            layout.place_progressfill(widget)
+            mark_dirty(widget)
+            if t >= 1:
+                widget.animation = None
+                self.animating.discard(widget)
+        return bool(self.animating)
+
+    def build_widget_map(self, widget):
+        """
+        Recursively build a mapping of widget IDs to widget objects, and
+        of model keys to the widgets bound to them.
+
+        :param widget: Widget object
+        """
+        wid = widget.attributes.get("id")
+        if wid:
+            self.widget_map[wid] = widget
+        self.index_widget(widget)
+        for key, attribute in binding.bound_keys(widget):
+            self.data_bindings.setdefault(key, {})[(widget, attribute)] = None
+            if key in model:
+                self.apply_binding(widget, attribute, model.get(key))
+        for child in widget.children:
+            self.build_widget_map(child)
+
+    def index_widget(self, widget):
+        """
+        Add a widget to the type and class indexes, or move it to the
+        right class entries after its classes changed
+
+        :param widget: Widget object
+        """
+        for cls in getattr(widget, "indexed_classes", ()):
+            self.class_index[cls].pop(widget, None)
+        widget.indexed_classes = widget.classes
+        self.type_index.setdefault(widget.name, {})[widget] = None
+        for cls in widget.indexed_classes:
+            self.class_index.setdefault(cls, {})[widget] = None
+
+    def query(self, selector):
+        """
+        Returns the widgets matching a selector, such as "label",
+        ".status", "#ok", "button.flat:hover" or a comma separated list
+        of them. Widgets on stack pages that were never shown aren't
+        included. Raises ValueError for selectors the stylesheet couldn't
+        use either.
+
+        :param selector: Selector in stylesheet syntax
+        """
+        found = {}
+        for part in selector.split(","):
+            node = style_provider.Node(part.strip())
+            if not node.supported:
+                raise ValueError(f"Unsupported selector {part.strip()!r}!")
+
+            # Only look at the smallest index the selector can use
+            if node.id is not None:
+                candidates = [self.widget_map[node.id]] \
+                    if node.id in self.widget_map else []
+            elif node.classes:
+                candidates = self.class_index.get(node.classes[0], ())
+            elif node.type is not None:
+                candidates = self.type_index.get(node.type, ())
+            else:
+                candidates = [widget for widgets in self.type_index.values()
+                              for widget in widgets]
+
+            for widget in candidates:
+                if node.matches(widget.name, widget.props["id"],
+                                widget.indexed_classes,
+                                style_provider.widget_state(widget)):
+                    found[widget] = None
+        return list(found)
+
+    def bind_widget(self, widget_id, callback):
+        """
+        Bind a function to a widget of this window by its ID
+
+        :param widget_id: ID of specified widget
+        :param callback: Function to run
+        """
+        self.bindings[widget_id] = callback
+
+    def set_attribute(self, widget_id, attribute, data):
+        """
+        Set an attribute via a widget's ID
+
+        :param widget_id: ID of specified widget
+        :param attribute: Attribute to set
+        :param data: Value to set
+        """
+        widget = self.widget_map.get(widget_id)
+        if widget:
+            self.update_attribute(widget, attribute, data)
+            return True
+        return False
+
+    def update_attribute(self, widget, attribute, data):
+        """
+        Change an attribute of a widget, nothing happens if the value is
+        the same. Raises ValueError if the value doesn't fit the attribute.
+
+        :param widget: Widget object
+        :param attribute: Attribute to set
+        :param data: Value to set
+        """
+        # Progress doesn't affect layout, keep it on the fast path
+        if hasattr(widget, "fill") and attribute == "progress":
+            self.update_progress(widget, data)
+            return
+        data = schema.convert(widget.name, attribute, data)
+        if attribute in widget.attributes and \
+                widget.attributes[attribute] == data:
+            return
+        widget.own_attributes()
+        widget.attributes[attribute] = data
+        schema.apply(widget)
+        if attribute in ("class", "direction"):
+            self.index_widget(widget)
+        if widget.name == "stack" and attribute == "active":
+            self.show_page(widget)
+        self.mark_dirty(widget, remeasure=True)
+        self.invalidate(relayout=True)
+
+    def show_page(self, widget):
+        """
+        Parse the active page of a stack if it is shown for the first time
+
+        :param widget: Stack widget object
+        """
+        for page in widget.visible_children():
+            if txm.materialize(page):
+                ensure_progressbar_fill(page)
+                self.build_widget_map(page)
+
+    def set_page(self, widget_id, page):
+        """
+        Switch the page a stack shows via its ID
+
+        :param widget_id: ID of specified stack
+        :param page: Page name or index
+        """
+        return self.set_attribute(widget_id, "active", page)
+
+    def set_data(self, widget_id, data):
+        """
+        Set inner data via a widget's ID
+
+        :param widget_id: ID of specified widget
+        :param data: Data to replace with
+        """
+        widget = self.widget_map.get(widget_id)
+        if widget:
+            self.update_data(widget, data)
+            return True
+        return False
+
+    def set_many(self, values):
+        """
+        Set the inner data of many widgets via their IDs as one
+        transaction. Returns the number of widgets found.
+
+        :param values: Dictionary of widget ID -> data
+        """
+        found = 0
+        with transaction():
+            for widget_id, data in values.items():
+                widget = self.widget_map.get(widget_id)
+                if widget:
+                    self.update_data(widget, data)
+                    found += 1
+        return found
+
+    def set_attribute_where(self, selector, attribute, data):
+        """
+        Set an attribute of every widget matching a selector as one
+        transaction. The value is checked against every matched widget
+        type first, so an invalid value raises ValueError before anything
+        changes. Returns the number of widgets matched.
+
+        :param selector: Selector in stylesheet syntax, see query()
+        :param attribute: Attribute to set
+        :param data: Value to set
+        """
+        matched = self.query(selector)
+        for name in {widget.name for widget in matched}:
+            schema.convert(name, attribute, data)
+        with transaction():
+            for widget in matched:
+                self.update_attribute(widget, attribute, data)
+        return len(matched)
+
+    def update_data(self, widget, data):
+        """
+        Change the inner data of a widget, nothing happens if the value is
+        the same
+
+        :param widget: Widget object
+        :param data: Data to replace with
+        """
+        if widget.data == data:
+            return
+        widget.data = data
+        self.mark_dirty(widget, remeasure=True)
+        self.invalidate(relayout=True)
+
+    def apply_binding(self, widget, attribute, value):
+        """
+        Push a model value into a bound widget
+
+        :param widget: Widget object
+        :param attribute: Bound attribute, None for the widget's data
+        :param value: Model value
+        """
+        if attribute is None:
+            self.update_data(widget, value)
+        else:
+            self.update_attribute(widget, attribute, value)
+
+    def refresh_image(self, widget_id):
+        """
+        Force an image widget to reload from disk
+
+        :param widget_id: ID of specified widget
+        """
+        widget = self.widget_map.get(widget_id)
+        if not widget:
+            return False
+
+        # Remove the cached texture so draw_widget recreates it. Decoded
+        # images and atlas pages are shared, so every widget showing the
+        # image has to load it again.
+        if hasattr(widget, "texture_cache"):
+            if widget.image_key is not None:
+                key = widget.image_key
+                atlas.forget(key)
+                for window in self.app.windows:
+                    window.forget_image(key)
+            else:
+                resources.release(widget.texture_cache)
+                del widget.texture_cache
+
+        self.mark_dirty(widget)
+        self.invalidate()
+        return True
+
+    def forget_image(self, key):
+        """
+        Make the image and icon widgets showing an image load it again,
+        after it changed
+
+        :param key: Image key, such as its file path
+        """
+        for name in ("image", "icon"):
+            for widget in self.type_index.get(name, ()):
+                if hasattr(widget, "texture_cache") and \
+                        widget.image_key == key:
+                    if widget.atlas_key is None:
+                        resources.release(widget.texture_cache)
+                    del widget.texture_cache
+                    self.mark_dirty(widget)
+        self.invalidate()
+
+    def set_image(self, widget_id, data):
+        """
+        Replace the contents of an image widget with encoded image bytes,
+        such as a PNG file read into memory
+
+        :param widget_id: ID of specified widget
+        :param data: Encoded image bytes
+        """
+        widget = self.widget_map.get(widget_id)
+        if not widget:
+            return False
+
+        widget.image_data = bytes(data)
+        return self.refresh_image(widget_id)
+
+    def update_hover(self, x, y):
+        """
+        Move hover state to the widgets under a point
+
+        :param x: Mouse X position, None if the mouse left the window
+        :param y: Mouse Y position, None if the mouse left the window
+        """
+        path = [] if x is None else hit_test(self.widgets, x, y)
+        if path == self.hovered_path:
+            return
+
+        for widget in self.hovered_path:
+            if widget not in path:
+                widget.hovered = False
+                self.mark_dirty(widget)
+        for widget in path:
+            if not widget.active and not widget.hovered:
+                widget.hovered = True
+                self.mark_dirty(widget)
+        self.hovered_path = path
+        self.invalidate()
+
+    def handle_mouse_down(self, event):
+        """
+        Mark the widgets under the mouse as active
+
+        :param event: SDL event object
+        """
+        self.update_hover(event.button.x, event.button.y)
+        self.pressed_path = self.hovered_path
+        for widget in self.pressed_path:
+            widget.active = True
+            self.mark_dirty(widget)
+        self.invalidate()
+
+    def handle_mouse_up(self, event):
+        """
+        Release active widgets and call bound functions under the mouse
+
+        :param event: SDL event object
+        """
+        for widget in self.pressed_path:
+            widget.active = False
+            self.mark_dirty(widget)
+        self.pressed_path = []
+
+        path = hit_test(self.widgets, event.button.x, event.button.y)
+        for widget in path:
+            widget.active = False
+            widget_id = widget.attributes.get("id")
+            if not widget_id:
+                continue
+            callback = self.bindings.get(widget_id, bindings.get(widget_id))
+            if callback is not None:
+                callback()
+        self.invalidate()
+
+    def handle_window_event(self, event):
+        """
+        Handle window events, anything that may have damaged the window
+        contents causes a redraw
+
+        :param event: SDL event object
+        """
+        match event.window.event:
+            case sdl2.SDL_WINDOWEVENT_LEAVE:
+                self.update_hover(None, None)
+            case sdl2.SDL_WINDOWEVENT_SIZE_CHANGED:
+                # A drag sends many of these, the layout only runs once per
+                # frame with the latest size
+                self.size = (event.window.data1, event.window.data2)
+                self.invalidate(relayout=True)
+                return
+            case sdl2.SDL_WINDOWEVENT_CLOSE:
+                self.closing = True
+                return
+        self.invalidate()
+
+    def handle_render_reset(self, event):
+        """
+        Handle render target and device resets, after which some drivers
+        have lost the contents of textures. The events don't say which
+        renderer they are about, so every window of the App redraws its
+        layers, and after a device reset reloads its textures as well.
+
+        :param event: SDL event object
+        """
+        for window in self.app.windows:
+            if event.type == sdl2.SDL_RENDER_DEVICE_RESET:
+                window.reload_textures()
+            for widgets in window.type_index.values():
+                for widget in widgets:
+                    if hasattr(widget, "layer_texture"):
+                        widget.layer_dirty = True
+            window.needs_rebuild = True
+            window.invalidate()
+
+    def reload_textures(self):
+        """
+        Free every texture of the window, after a device reset they are
+        unusable. Glyphs, images and layers get new textures on the next
+        frame.
+        """
+        # Display lists laid out in the old glyph atlas count as stale
+        fonts.release_renderer(self.sdl_renderer)
+        atlas.clear(self.sdl_renderer)
+        for name in ("image", "icon"):
+            for widget in self.type_index.get(name, ()):
+                if not hasattr(widget, "texture_cache"):
+                    continue
+                if widget.atlas_key is None:
+                    resources.release(widget.texture_cache)
+                del widget.texture_cache
+        for widgets in self.type_index.values():
+            for widget in widgets:
+                if hasattr(widget, "layer_texture"):
+                    resources.release(widget.layer_texture)
+                    del widget.layer_texture
+                    widget.layer_list = None
+
+    def render(self):
+        """
+        Lay out, rebuild and draw whatever changed since the last frame
+        """
+        # Keep drawing while a progressbar animates, the loop is paced
+        # by vsync
+        frame_start = time.perf_counter()
+        self.needs_redraw = self.step_animations()
+        width, height = self.size
+
+        relayout = self.needs_layout
+        if self.needs_layout:
+            self.needs_layout = False
+            self.needs_rebuild = True
+            layout.compute_layout(self.widgets, width=width, height=height,
+                                  settings=self.settings,
+                                  font=self.app.font)
+            # Wrapped labels only know their height once they have a width
+            for _ in range(2):
+                if not layout.reflow(self.widgets, self.settings):
+                    break
+                layout.compute_layout(self.widgets, width=width,
+                                      height=height, settings=self.settings,
+                                      font=self.app.font)
+            layout.compute_bounds(self.widgets)
+
+        # Redraws that didn't change anything, like after the window was
+        # uncovered, replay the previous display list. Text is laid out
+        # while building, so a list is built again if the glyph atlas
+        # filled up and was cleared meanwhile.
+        for _ in range(2):
+            if not self.needs_rebuild and self.display_list is not None \
+                    and not self.display_list.stale():
+                break
+            self.needs_rebuild = False
+            self.clip = (0, 0, width, height)
+            self.display_list = DisplayList(self.sdl_renderer)
+            self.draw_widget(self.widgets, self.display_list)
+            self.display_list.finish()
+
+        sdl2.SDL_SetRenderDrawColor(self.sdl_renderer, 0, 0, 0, 255)
+        sdl2.SDL_RenderClear(self.sdl_renderer)
+        self.display_list.replay(self.sdl_renderer)
+
+        sdl2.SDL_RenderPresent(self.sdl_renderer)
+        if on_frame is not None:
+            on_frame(time.perf_counter() - frame_start, relayout)
+
+    def load_txm(self, file):
+        """
+        Load a new TXM file into the window and resize it to match the
+        new settings.
+
+        :param file: TXM markup file to read from
+        """
+        # Parse first, so a file that fails to load leaves the window as
+        # it was
+        settings, widgets = txm.generate_ast(file)
+        resources.release_tree(self.widgets)
+        self.widget_map.clear()
+        self.type_index.clear()
+        self.class_index.clear()
+        self.data_bindings.clear()
+        self.animating.clear()
+        self.hovered_path = []
+        self.pressed_path = []
+        self.settings, self.widgets = settings, widgets
+        self.index_document()
+
+        # Resize window to match new TXM settings
+        width = self.settings.get("width")
+        height = self.settings.get("height")
+
+        if width and height:
+            sdl2.SDL_SetWindowSize(self.window.window, width, height)
+            self.size = (width, height)
+
+        resizable = sdl2.SDL_TRUE if self.settings.get("resizable") \
+            else sdl2.SDL_FALSE
+        sdl2.SDL_SetWindowResizable(self.window.window, resizable)
+
+        self.invalidate(relayout=True)
+        return True
+
+    def close(self):
+        """
+        Free the window's textures and destroy it. Shared fonts and
+        decoded images stay for the other windows.
+        """
+        self.closing = False
+        resources.release_tree(self.widgets)
+        resources.collect()
+        atlas.clear(self.sdl_renderer)
+        fonts.release_renderer(self.sdl_renderer)
+        self.display_list = None
+        sdl2.SDL_DestroyRenderer(self.sdl_renderer)
+        self.window.close()
+        if self in self.app.windows:
+            self.app.windows.remove(self)
+
+
+def event_window_id(event):
+    """
+    Returns the ID of the window an event belongs to
+
+    :param event: SDL event object
+    """
+    match event.type:
+        case sdl2.SDL_MOUSEMOTION:
+            return event.motion.windowID
+        case sdl2.SDL_MOUSEBUTTONDOWN | sdl2.SDL_MOUSEBUTTONUP:
+            return event.button.windowID
+        case sdl2.SDL_WINDOWEVENT:
+            return event.window.windowID
+    return 0
+
+
+# Event types without an entry here are dropped without any work. Mouse
+# motion is coalesced by App.pump_events() instead.
+event_handlers = {
+    sdl2.SDL_MOUSEBUTTONDOWN: Window.handle_mouse_down,
+    sdl2.SDL_MOUSEBUTTONUP: Window.handle_mouse_up,
+    sdl2.SDL_WINDOWEVENT: Window.handle_window_event,
+    sdl2.SDL_RENDER_TARGETS_RESET: Window.handle_render_reset,
+    sdl2.SDL_RENDER_DEVICE_RESET: Window.handle_render_reset,
+}
+
+
+class App:
+    """
+    Runs any number of windows in one event loop. SDL, fonts, stylesheets,
+    decoded images, text layout caches and the model are set up once and
+    shared by every window.
+
+        app = App()
+        app.open("status.txm")
+        app.open("controls.txm")
+        app.run()
+    """
+    def __init__(self):
+        self.windows = []
+        self.font = None
+
+    def open(self, file, headless=False):
+        """
+        Open a window showing a TXM document, returns the Window. Windows
+        can be opened before or while the App runs.
+
+        :param file: TXM markup file to read from
+        :param headless: Render offscreen without showing a window, for
+            tests
+        """
+        global app
+        app = self
+        if self.font is None:
+            # Initialize SDL
+            if headless:
+                os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            sdl2.ext.init()
+            sdl2.sdlttf.TTF_Init()
+            self.font = fonts.get()
+
+        window = Window(self, file, headless=headless)
+        self.windows.append(window)
+        return window
+
+    def window_for(self, event):
+        """
+        Returns the window an event belongs to. Events without a window,
+        such as replayed ones, go to the first window.
+
+        :param event: SDL event object
+        """
+        window_id = event_window_id(event)
+        if not window_id:
+            return self.windows[0] if self.windows else None
+        for window in self.windows:
+            if window.id == window_id:
+                return window
+        return None
+
+    def pump_events(self, event, got_event):
+        """
+        Drain the SDL event queue and dispatch by event type and window.
+        Mouse motion is coalesced so only the latest position per window
+        is hit tested. Returns False once the App should quit.
+
+        :param event: SDL event object, holding the first event if any
+        :param got_event: Whether event already holds an event
+        """
+        running = True
+        motion = {}
+
+        while got_event:
+            event_type = event.type
+            if recorder.session is not None:
+                recorder.record_event(event)
+            if event_type == sdl2.SDL_MOUSEMOTION:
+                window = self.window_for(event)
+                if window is not None:
+                    motion[window] = (event.motion.x, event.motion.y)
+            elif event_type == sdl2.SDL_QUIT:
+                running = False
+            else:
+                handler = event_handlers.get(event_type)
+                window = self.window_for(event) if handler else None
+                if window is not None:
+                    # Keep ordering, the pointer has to be where it was
+                    # when a click happened
+                    if window in motion:
+                        window.update_hover(*motion.pop(window))
+                    handler(window, event)
+
+            got_event = sdl2.SDL_PollEvent(event)
+
+        for window, position in motion.items():
+            window.update_hover(*position)
+
+        return running
+
+    def apply_bindings(self):
+        """
+        Apply model changes since the last frame to the bound widgets of
+        every window, only the latest value of each key is applied
+        """
+        pending = model.take_pending()
+        if not pending:
+            return
+        with transaction():
+            for window in self.windows:
+                for key, value in pending.items():
+                    for widget, attribute in \
+                            window.data_bindings.get(key, ()):
+                        window.apply_binding(widget, attribute, value)
+
+    def run(self):
+        """
+        Run the event loop until every window is closed or the App quits
+        """
+        global app
+        app = self
+        event = sdl2.SDL_Event()
+        scheduler.ui_thread = threading.get_ident()
+        running = True
+        try:
+            while running and self.windows:
+                # Sleep until the next event or timer instead of spinning,
+                # a pending redraw only polls
+                if any(window.needs_redraw for window in self.windows):
+                    timeout = 0
+                else:
+                    timeout = scheduler.next_timeout()
+
+                if timeout is None:
+                    got_event = sdl2.SDL_WaitEvent(event)
+                else:
+                    got_event = sdl2.SDL_WaitEventTimeout(event, timeout)
+
+                running = self.pump_events(event, got_event)
+                for window in [w for w in self.windows if w.closing]:
+                    window.close()
+                scheduler.run_due()
+                resources.collect()
+
+                if not any(window.needs_redraw for window in self.windows):
+                    continue
+
+                self.apply_bindings()
+                for window in list(self.windows):
+                    if window.needs_redraw:
+                        window.render()
+        finally:
+            # Also runs if a handler or callback raised, so SDL is never
+            # left running behind a dead App
+            scheduler.clear()
+            scheduler.ui_thread = None
+            recorder.stop_recording()
+            for window in list(self.windows):
+                window.close()
+            fonts.clear()
+            atlas.clear()
+            if on_shutdown is not None:
+                on_shutdown()
+            resources.release_all()
+            sdl2.ext.quit()
+            self.font = None
+            app = None
+
+
+def invalidate(relayout=False):
+    """
+    Request a redraw of every window on the next pass of the main loop
+
+    :param relayout: Also recompute the layout before drawing
+    """
+    for window in windows():
+        window.invalidate(relayout=relayout)
+
+
+def model_changed(key):
+    """
+    Request a redraw of the windows with widgets bound to a model key,
+    changes nothing is bound to don't cause a redraw
+
+    :param key: Model key that changed
+    """
+    for window in windows():
+        if key in window.data_bindings:
+            window.invalidate()
+
+
+model = binding.Model(on_change=model_changed)
+
+
+def windows():
+    """
+    Returns the open windows of the running App
+    """
+    return list(app.windows) if app is not None else []
+
+
+def each_window(method, *args):
+    """
+    Call a Window method on every open window, returns True if any of
+    them found the widget
+
+    :param method: Window method name
+    :param args: Method arguments
+    """
+    found = False
+    for window in windows():
+        found = getattr(window, method)(*args) or found
+    return found
 
 
 def bind_widget(widget_id, callback):
     """
-    Bind a function to a widget by its ID
-    
+    Bind a function to a widget by its ID, in every window
+
     :param widget_id: ID of specified widget
     :param callback: Function to run
     """
@@ -166,163 +1371,134 @@ def bind_widget(widget_id, callback):
 
 
 def set_attribute(widget_id, attribute, data):
-    widget = widget_map.get(widget_id)
-    if widget:
-        widget.attributes[attribute] = data  # <-- correct
-        # Sync progress for progressfill widgets if needed
-        if widget.name == "progressfill" and attribute == "progress":
-            widget.progress = data
-        return True
-    return False
+    """
+    Set an attribute via a widget's ID, in every window
+
+    :param widget_id: ID of specified widget
+    :param attribute: Attribute to set
+    :param data: Value to set
+    """
+    recorder.record("set_attribute", widget_id, attribute, data)
+    return each_window("set_attribute", widget_id, attribute, data)
+
+
+def set_page(widget_id, page):
+    """
+    Switch the page a stack shows via its ID, in every window
+
+    :param widget_id: ID of specified stack
+    :param page: Page name or index
+    """
+    return set_attribute(widget_id, "active", page)
 
 
 def set_data(widget_id, data):
     """
-    Set inner data via a widget's ID
-    
+    Set inner data via a widget's ID, in every window
+
     :param widget_id: ID of specified widget
     :param data: Data to replace with
     """
-    widget = widget_map.get(widget_id)
-    if widget:
-        widget.data = data
-        return True
-    return False
+    recorder.record("set_data", widget_id, data)
+    return each_window("set_data", widget_id, data)
 
 
-def refresh_image(widget_id):
+def set_progress(widget_id, progress):
     """
-    Force an image widget to reload from disk
-    
+    Set the progress of a progressbar via its ID, in every window
+
     :param widget_id: ID of specified widget
+    :param progress: Progress from 0 to 100
     """
-    widget = widget_map.get(widget_id)
-    if not widget:
-        return False
+    recorder.record("set_progress", widget_id, progress)
+    return each_window("set_progress", widget_id, progress)
 
-    # Remove the cached texture so draw_widget recreates it
-    if hasattr(widget, "texture_cache"):
-        import sdl2
-        sdl2.SDL_DestroyTexture(widget.texture_cache)
-        del widget.texture_cache
 
-    return True
+def query(selector):
+    """
+    Returns the widgets of every window matching a selector, see
+    Window.query()
+
+    :param selector: Selector in stylesheet syntax
+    """
+    return [widget for window in windows()
+            for widget in window.query(selector)]
 
 
-def handle_event(event, widget):
+def set_many(values):
     """
-    Recursively check widgets for a click event and call bound function
+    Set the inner data of many widgets via their IDs, in every window, as
+    one transaction. Returns the number of widgets found.
 
-    :param event: SDL event object
-    :param widget: Widget object
+    :param values: Dictionary of widget ID -> data
     """
-    mouse_x = event.button.x
-    mouse_y = event.button.y
+    recorder.record("set_many", values)
+    with transaction():
+        return sum(window.set_many(values) for window in windows())
 
-    # Check if mouse is inside this widget
-    mouse_inside = widget.x <= mouse_x <= widget.x + widget.width and \
-        widget.y <= mouse_y <= widget.y + widget.height
 
-    if mouse_inside:
-        if event.type == sdl2.SDL_MOUSEBUTTONDOWN:
-            widget.active = True
-        elif event.type == sdl2.SDL_MOUSEBUTTONUP:
-            widget.active = False
-            widget_id = widget.attributes.get("id")
-            if widget_id and widget_id in bindings:
-                bindings[widget_id]()
-        else:
-            if not widget.active:
-                widget.hovered = True
-    else:
-        widget.hovered = False
-        widget.active = False
+def set_attribute_where(selector, attribute, data):
+    """
+    Set an attribute of every widget matching a selector, in every
+    window, as one transaction. An invalid value raises ValueError before
+    anything changes. Returns the number of widgets matched.
 
-    # Recurse into children
-    for child in widget.children:
-        handle_event(event, child)
+    :param selector: Selector in stylesheet syntax, see query()
+    :param attribute: Attribute to set
+    :param data: Value to set
+    """
+    recorder.record("set_attribute_where", selector, attribute, data)
+    for name in {widget.name for widget in query(selector)}:
+        schema.convert(name, attribute, data)
+    with transaction():
+        return sum(window.set_attribute_where(selector, attribute, data)
+                   for window in windows())
 
 
-def start(file):
+def refresh_image(widget_id):
     """
-    Public function to start a XUI instance
-    
-    :param file: TXM markup file to read from
+    Force an image widget to reload from disk, in every window
+
+    :param widget_id: ID of specified widget
     """
-    global settings
-    global widgets
-    global font
-    global sdl_renderer
-    global window
-    ast = txm.generate_ast(file)
-    settings = ast[0]
-    widgets = ast[1]
-    build_widget_map(widgets)
-    running = True
-
-    # Initialize SDL
-    sdl2.ext.init()
-    sdl2.sdlttf.TTF_Init()
-    ttf = files('tinyxui.data').joinpath("NotoSans.ttf")
-    font = sdl2.sdlttf.TTF_OpenFont(bytes(str(ttf), 'utf-8'), 13)
-
-    # Initialize window and renderer
-    window = sdl2.ext.Window(
-        settings["window_title"],
-        size=(settings["width"], settings["height"]),
-        flags=sdl2.SDL_WINDOW_SHOWN,
-    )
-    sdl_renderer = sdl2.SDL_CreateRenderer(
-        window.window,
-        -1,
-        sdl2.SDL_RENDERER_ACCELERATED | sdl2.SDL_RENDERER_PRESENTVSYNC,
-    )
-    event = sdl2.SDL_Event()
-
-    while running:
-        while sdl2.SDL_PollEvent(event):
-            if event.type == sdl2.SDL_QUIT:
-                running = False
+    recorder.record("refresh_image", widget_id)
+    return each_window("refresh_image", widget_id)
 
-            handle_event(event, widgets)
 
+def set_image(widget_id, data):
+    """
+    Replace the contents of an image widget with encoded image bytes,
+    such as a PNG file read into memory, in every window
 
-        sdl2.SDL_SetRenderDrawColor(sdl_renderer, 0, 0, 0, 255)
-        sdl2.SDL_RenderClear(sdl_renderer)
-        ensure_progressbar_fill(widgets)
-        layout.compute_layout(widgets, settings=settings, font=font)
-        draw_widget(widgets, settings)
+    :param widget_id: ID of specified widget
+    :param data: Encoded image bytes
+    """
+    if recorder.session is not None:
+        # Sessions are JSON, so the bytes are stored as base64
+        recorder.record("set_image", widget_id,
+                        base64.b64encode(bytes(data)).decode("ascii"))
+    return each_window("set_image", widget_id, data)
 
-        sdl2.SDL_RenderPresent(sdl_renderer)
 
-    sdl2.SDL_DestroyRenderer(sdl_renderer)
-    window.close()
-    sdl2.ext.quit()
+def start(file, headless=False):
+    """
+    Public function to start a XUI instance with a single window
+
+    :param file: TXM markup file to read from
+    :param headless: Render offscreen without showing a window, for tests
+    """
+    instance = App()
+    instance.open(file, headless=headless)
+    instance.run()
 
 
 def load_txm(file):
     """
-    Load a new TXM file into the current running instance
-    and resize the window to match new settings.
+    Load a new TXM file into every window of the running instance
+    and resize them to match new settings.
     """
-    global settings
-    global widgets
-    global window
-
-    ast = txm.generate_ast(file)
-    settings = ast[0]
-    widgets = ast[1]
-
-    # Clear and rebuild widget map
-    widget_map.clear()
-    build_widget_map(widgets)
-
-    # Resize window to match new TXM settings
-    width = settings.get("width")
-    height = settings.get("height")
-
-    if width and height:
-        sdl2.SDL_SetWindowSize(window.window, width, height)
+    recorder.record("load_txm", file)
+    return each_window("load_txm", file)
 
 
 if __name__ == "__main__":
@@ -330,4 +1506,4 @@ if __name__ == "__main__":
     Errors if you try to run TinyXUI on its own
     """
     print("Do not run TinyXUI on its own!")
-    print("Import it into another codebase to use it.")
\ No newline at end of file
+    print("Import it into another codebase to use it.")
@@ -0,0 +1,231 @@
+import base64
+import json
+import time
+import sdl2
+from . import main
+from . import scheduler
+
+
+session = None
+session_path = None
+start_time = 0
+
+
+def start_recording(path):
+    """
+    Start recording input events and data updates. Call before start() so
+    the session knows which document it belongs to. The session is written
+    to disk when the window closes or stop_recording() is called.
+
+    :param path: File to write the session to
+    """
+    global session
+    global session_path
+    global start_time
+    session = []
+    session_path = path
+    start_time = time.monotonic()
+
+
+def stop_recording():
+    """
+    Stop recording and write the session to disk, one JSON record per line
+    """
+    global session
+    if session is None:
+        return
+
+    with open(session_path, "w") as f:
+        for entry in session:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    session = None
+
+
+def record(kind, *args):
+    """
+    Add a record to the current session, if recording
+
+    :param kind: Record type, such as "set_data"
+    :param args: Record arguments
+    """
+    if session is None:
+        return
+    elapsed = round((time.monotonic() - start_time) * 1000, 1)
+    session.append([kind, elapsed, *args])
+
+
+def record_event(event):
+    """
+    Add an SDL event to the current session, if recording
+
+    :param event: SDL event object
+    """
+    if session is None:
+        return
+
+    match event.type:
+        case sdl2.SDL_MOUSEMOTION:
+            record("motion", event.motion.x, event.motion.y)
+        case sdl2.SDL_MOUSEBUTTONDOWN:
+            record("down", event.button.x, event.button.y,
+                   event.button.button)
+        case sdl2.SDL_MOUSEBUTTONUP:
+            record("up", event.button.x, event.button.y,
+                   event.button.button)
+        case sdl2.SDL_KEYDOWN:
+            record("keydown", event.key.keysym.sym)
+        case sdl2.SDL_KEYUP:
+            record("keyup", event.key.keysym.sym)
+        case sdl2.SDL_WINDOWEVENT:
+            record("window", event.window.event, event.window.data1,
+                   event.window.data2)
+        case sdl2.SDL_QUIT:
+            record("quit")
+
+
+def load_session(path):
+    """
+    Read a recorded session
+
+    :param path: Session file
+    """
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def push_event(entry):
+    """
+    Push a recorded event back into the SDL event queue
+
+    :param entry: Recorded event
+    """
+    kind, _, *args = entry
+    event = sdl2.SDL_Event()
+
+    match kind:
+        case "motion":
+            event.type = sdl2.SDL_MOUSEMOTION
+            event.motion.x, event.motion.y = args
+        case "down" | "up":
+            if kind == "down":
+                event.type = sdl2.SDL_MOUSEBUTTONDOWN
+            else:
+                event.type = sdl2.SDL_MOUSEBUTTONUP
+            event.button.x, event.button.y, event.button.button = args
+        case "keydown" | "keyup":
+            if kind == "keydown":
+                event.type = sdl2.SDL_KEYDOWN
+            else:
+                event.type = sdl2.SDL_KEYUP
+            event.key.keysym.sym = args[0]
+        case "window":
+            event.type = sdl2.SDL_WINDOWEVENT
+            event.window.event, event.window.data1, event.window.data2 = args
+        case "quit":
+            event.type = sdl2.SDL_QUIT
+
+    sdl2.SDL_PushEvent(event)
+
+
+def apply(entry):
+    """
+    Replay a single recorded entry
+
+    :param entry: Recorded entry
+    """
+    kind, _, *args = entry
+    match kind:
+        case "set_data":
+            main.set_data(*args)
+        case "set_attribute":
+            main.set_attribute(*args)
+        case "set_many":
+            main.set_many(*args)
+        case "set_attribute_where":
+            main.set_attribute_where(*args)
+        case "set_progress":
+            main.set_progress(*args)
+        case "refresh_image":
+            main.refresh_image(*args)
+        case "set_image":
+            widget_id, data = args
+            main.set_image(widget_id, base64.b64decode(data))
+        case "load_txm":
+            main.load_txm(*args)
+        case "model":
+            main.model.set(*args)
+        case "txm":
+            pass
+        case _:
+            push_event(entry)
+
+
+def percentile(values, percent):
+    """
+    Returns a nearest-rank percentile of a list of values
+
+    :param values: List of numbers
+    :param percent: Percentile from 0 to 100
+    """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = max(0, int(len(ordered) * percent / 100 + 0.5) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def replay(path, file=None, speed=1.0):
+    """
+    Replay a recorded session against a headless window and report frame
+    times in milliseconds and the number of render and layout passes.
+    Bindings have to be registered before replaying, like for start().
+
+    :param path: Session file
+    :param file: TXM document, defaults to the one in the session
+    :param speed: Playback speed, 2.0 replays twice as fast
+    """
+    entries = load_session(path)
+    if file is None and entries and entries[0][0] == "txm":
+        file = entries[0][2]
+    if file is None:
+        raise ValueError(f"{path} does not name a TXM document!")
+
+    frame_times = []
+    layouts = [0]
+
+    def on_frame(duration, relayout):
+        frame_times.append(duration * 1000)
+        if relayout:
+            layouts[0] += 1
+
+    for entry in entries:
+        if entry[0] in ("txm", "quit"):
+            continue
+        scheduler.after(entry[1] / speed, lambda entry=entry: apply(entry))
+
+    # Quit once the last record played and its frame was drawn
+    end = entries[-1][1] / speed if entries else 0
+    scheduler.after(end + 50, lambda: push_event(["quit", 0]))
+
+    previous = main.on_frame
+    main.on_frame = on_frame
+    try:
+        main.start(file, headless=True)
+    finally:
+        main.on_frame = previous
+
+    return {
+        "frames": len(frame_times),
+        "layouts": layouts[0],
+        "p50": percentile(frame_times, 50),
+        "p90": percentile(frame_times, 90),
+        "p95": percentile(frame_times, 95),
+        "p99": percentile(frame_times, 99),
+        "max": max(frame_times, default=0),
+    }
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's recorder on its own!")
+    print("Import it into another codebase to use it.")
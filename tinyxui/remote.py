@@ -0,0 +1,476 @@
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from . import main
+from . import scheduler
+
+
+HEADER = struct.Struct("!I")
+
+
+def send_message(sock, message):
+    """
+    Send a length-prefixed JSON message
+
+    :param sock: Connected socket
+    :param message: JSON serializable message
+    """
+    payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_exact(sock, size):
+    """
+    Read exactly size bytes, returns None if the connection closed
+
+    :param sock: Connected socket
+    :param size: Number of bytes to read
+    """
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock):
+    """
+    Read a length-prefixed JSON message, returns None if the connection
+    closed
+
+    :param sock: Connected socket
+    """
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    payload = recv_exact(sock, HEADER.unpack(header)[0])
+    if payload is None:
+        return None
+    return json.loads(payload)
+
+
+def attach_segment(name):
+    """
+    Open a shared memory segment created by another process without
+    taking ownership of it
+
+    :param name: Segment name
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the segment with this
+        # process's resource tracker, which would unlink it on exit
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+class Server:
+    """
+    Serves a running TXM document to client processes over a Unix socket.
+    Batches from clients are applied on the UI thread, one frame each.
+    """
+    def __init__(self, address):
+        self.address = address
+        self.connections = []
+        self.lock = threading.Lock()
+        self.listener = None
+        self.accept_thread = None
+
+    def listen(self):
+        """
+        Start accepting clients in a background thread
+        """
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.address)
+        self.listener.listen()
+        self.accept_thread = threading.Thread(target=self.accept_loop,
+                                              daemon=True)
+        self.accept_thread.start()
+
+    def accept_loop(self):
+        listener = self.listener
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            if self.listener is None:
+                # Closed while a client was connecting
+                conn.close()
+                return
+            with self.lock:
+                self.connections.append(conn)
+            threading.Thread(
+                target=self.read_loop, args=(conn,), daemon=True).start()
+
+    def read_loop(self, conn):
+        """
+        Read batches from a client. Image bytes are copied out of shared
+        memory here so the client can reuse the segment right away.
+
+        :param conn: Client socket
+        """
+        while True:
+            try:
+                message = recv_message(conn)
+            except (OSError, ValueError):
+                message = None
+            if message is None:
+                break
+
+            # A malformed batch or a segment that is gone means the client
+            # is broken, so it is told why and disconnected
+            try:
+                batch, released = self.read_batch(message)
+            except Exception as e:
+                self.send(conn, ["error", None, str(e)])
+                break
+
+            if released:
+                self.send(conn, ["release", released])
+            scheduler.after(0, lambda batch=batch: self.apply(conn, batch))
+
+        with self.lock:
+            if conn in self.connections:
+                self.connections.remove(conn)
+        conn.close()
+
+    def read_batch(self, message):
+        """
+        Returns the operations of a message and the names of the shared
+        memory segments that were read, image bytes are copied out of the
+        segments
+
+        :param message: Decoded message, a list of operations
+        """
+        batch = []
+        released = []
+        for op in message:
+            if op[0] == "image":
+                _, widget_id, name, size = op
+                segment = attach_segment(name)
+                try:
+                    data = bytes(segment.buf[:size])
+                finally:
+                    segment.close()
+                batch.append(("image", widget_id, data))
+                released.append(name)
+            else:
+                batch.append(op)
+        return batch, released
+
+    def apply(self, conn, batch):
+        """
+        Apply a batch of updates on the UI thread. An operation that fails,
+        such as a value the attribute doesn't accept, is skipped and
+        reported back to the client, the rest of the batch still applies.
+
+        :param conn: Client socket the batch came from
+        :param batch: List of operations
+        """
+        with main.transaction():
+            for op in batch:
+                try:
+                    self.apply_op(op)
+                except Exception as e:
+                    self.send(conn, ["error", op[0], str(e)])
+
+    def apply_op(self, op):
+        """
+        Apply a single operation of a batch
+
+        :param op: Operation as [kind, *args]
+        """
+        kind, *args = op
+        match kind:
+            case "set_data":
+                main.set_data(*args)
+            case "set_attribute":
+                main.set_attribute(*args)
+            case "set_many":
+                main.set_many(*args)
+            case "set_attribute_where":
+                main.set_attribute_where(*args)
+            case "set_progress":
+                main.set_progress(*args)
+            case "model":
+                main.model.set(*args)
+            case "refresh_image":
+                main.refresh_image(*args)
+            case "image":
+                main.set_image(*args)
+            case "load_txm":
+                main.load_txm(*args)
+            case "bind":
+                widget_id = args[0]
+                main.bind_widget(
+                    widget_id,
+                    lambda widget_id=widget_id:
+                        self.broadcast(["click", widget_id]))
+            case _:
+                raise ValueError(f"Unknown operation {kind!r}!")
+
+    def send(self, conn, message):
+        try:
+            send_message(conn, message)
+        except OSError:
+            pass
+
+    def broadcast(self, message):
+        """
+        Send a message to every connected client
+
+        :param message: JSON serializable message
+        """
+        with self.lock:
+            connections = list(self.connections)
+        for conn in connections:
+            self.send(conn, message)
+
+    def close(self):
+        """
+        Stop accepting clients and disconnect the connected ones
+        """
+        listener = self.listener
+        if listener is not None:
+            self.listener = None
+            # Closing alone doesn't wake up accept() on Linux
+            try:
+                listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            listener.close()
+        with self.lock:
+            for conn in self.connections:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self.connections.clear()
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+def serve(file, address, headless=False):
+    """
+    Run a TXM document in this process and let other processes drive it
+    with a Client. Blocks until the window is closed.
+
+    :param file: TXM markup file to read from
+    :param address: Path of the Unix socket to listen on
+    :param headless: Render offscreen without showing a window
+    """
+    server = Server(address)
+    server.listen()
+    try:
+        main.start(file, headless=headless)
+    finally:
+        server.close()
+
+
+class Client:
+    """
+    Drives a TinyXUI process started with serve(). Updates are queued and
+    sent as one batch by flush(), which the UI applies in a single frame.
+    Click callbacks run on the client's reader thread.
+
+    :param address: Path of the Unix socket
+    :param on_error: Function called on the reader thread with the
+        operation name and message when the UI rejects an update, errors
+        are printed if it is None
+    """
+    def __init__(self, address, on_error=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.pending = []
+        self.callbacks = {}
+        self.on_error = on_error
+        # Shared memory segments by name, and which of them the server
+        # is done reading
+        self.segments = {}
+        self.free_segments = set()
+        self.lock = threading.Lock()
+        self.reader = threading.Thread(target=self.read_loop, daemon=True)
+        self.reader.start()
+
+    def read_loop(self):
+        while True:
+            try:
+                message = recv_message(self.sock)
+            except (OSError, ValueError):
+                message = None
+            if message is None:
+                return
+
+            match message[0]:
+                case "click":
+                    callback = self.callbacks.get(message[1])
+                    if callback is not None:
+                        callback()
+                case "release":
+                    with self.lock:
+                        self.free_segments.update(message[1])
+                case "error":
+                    _, kind, error = message
+                    if self.on_error is not None:
+                        self.on_error(kind, error)
+                    else:
+                        print(f"TinyXUI rejected {kind or 'a batch'}: "
+                              f"{error}", file=sys.stderr)
+
+    def bind_widget(self, widget_id, callback):
+        """
+        Bind a function to a widget by its ID
+
+        :param widget_id: ID of specified widget
+        :param callback: Function to run
+        """
+        self.callbacks[widget_id] = callback
+        self.pending.append(["bind", widget_id])
+
+    def set_data(self, widget_id, data):
+        """
+        Set inner data via a widget's ID
+
+        :param widget_id: ID of specified widget
+        :param data: Data to replace with
+        """
+        self.pending.append(["set_data", widget_id, data])
+
+    def set_attribute(self, widget_id, attribute, data):
+        """
+        Set an attribute via a widget's ID
+
+        :param widget_id: ID of specified widget
+        :param attribute: Attribute to set
+        :param data: Value to set
+        """
+        self.pending.append(["set_attribute", widget_id, attribute, data])
+
+    def set_many(self, values):
+        """
+        Set the inner data of many widgets via their IDs
+
+        :param values: Dictionary of widget ID -> data
+        """
+        self.pending.append(["set_many", values])
+
+    def set_attribute_where(self, selector, attribute, data):
+        """
+        Set an attribute of every widget matching a selector
+
+        :param selector: Selector in stylesheet syntax, such as ".status"
+        :param attribute: Attribute to set
+        :param data: Value to set
+        """
+        self.pending.append(
+            ["set_attribute_where", selector, attribute, data])
+
+    def set_progress(self, widget_id, progress):
+        """
+        Set the progress of a progressbar via its ID
+
+        :param widget_id: ID of specified widget
+        :param progress: Progress from 0 to 100
+        """
+        self.pending.append(["set_progress", widget_id, progress])
+
+    def set_model(self, key, value):
+        """
+        Set a model value for bound widgets
+
+        :param key: Model key
+        :param value: New value
+        """
+        self.pending.append(["model", key, value])
+
+    def refresh_image(self, widget_id):
+        """
+        Force an image widget to reload from disk
+
+        :param widget_id: ID of specified widget
+        """
+        self.pending.append(["refresh_image", widget_id])
+
+    def load_txm(self, file):
+        """
+        Load a new TXM file into the UI process
+
+        :param file: TXM markup file to read from
+        """
+        self.pending.append(["load_txm", file])
+
+    def set_image(self, widget_id, data):
+        """
+        Replace an image widget's contents with encoded image bytes. The
+        bytes travel through shared memory instead of the socket.
+
+        :param widget_id: ID of specified widget
+        :param data: Encoded image bytes, such as a PNG file
+        """
+        segment = None
+        with self.lock:
+            for name in self.free_segments:
+                if self.segments[name].size >= len(data):
+                    segment = self.segments[name]
+                    self.free_segments.discard(name)
+                    break
+
+        if segment is None:
+            segment = shared_memory.SharedMemory(
+                create=True, size=max(1, len(data)))
+            self.segments[segment.name] = segment
+
+        segment.buf[:len(data)] = data
+        self.pending.append(["image", widget_id, segment.name, len(data)])
+
+    def flush(self):
+        """
+        Send every queued update as one batch
+        """
+        if not self.pending:
+            return
+        batch = self.pending
+        self.pending = []
+        send_message(self.sock, batch)
+
+    def close(self):
+        """
+        Flush, disconnect and free shared memory
+        """
+        try:
+            self.flush()
+        finally:
+            self.sock.close()
+            for segment in self.segments.values():
+                segment.close()
+                segment.unlink()
+            self.segments.clear()
+
+
+def connect(address, on_error=None):
+    """
+    Connect to a TinyXUI process started with serve()
+
+    :param address: Path of the Unix socket
+    :param on_error: Function called with the operation name and message
+        when the UI rejects an update
+    """
+    return Client(address, on_error=on_error)
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's remote driver on its own!")
+    print("Import it into another codebase to use it.")
@@ -0,0 +1,298 @@
+import ctypes
+import io
+import itertools
+import os
+import PIL.Image
+import weakref
+from importlib.resources import files
+import sdl2
+import sdl2.ext
+import sdl2.sdlttf
+
+
+# address -> Resource for every live SDL object TinyXUI created
+live = {}
+# owner key -> set of addresses owned by that widget
+owners = {}
+# Owners that were garbage collected, released on the UI thread by collect()
+dead_owners = []
+# Functions called with an owner key when it is released, for caches that
+# hand out shared objects to widgets, such as atlas pages
+release_hooks = []
+_keys = itertools.count(1)
+
+
+class Resource:
+    """
+    Bookkeeping record for a single SDL object
+    """
+    def __init__(self, handle, category, size, owner=None):
+        self.handle = handle
+        self.category = category
+        self.size = size
+        self.owner = owner
+
+    def __repr__(self):
+        return (
+            f"Resource({self.category}, size={self.size}, "
+            f"owner={self.owner})"
+        )
+
+
+def address(handle):
+    """
+    Returns the memory address of an SDL handle, used as its key
+
+    :param handle: ctypes pointer to an SDL object
+    """
+    return ctypes.cast(handle, ctypes.c_void_p).value
+
+
+def track(handle, category, size, owner=None):
+    """
+    Start tracking an SDL object. Objects with an owner are released
+    when the owner is released or garbage collected.
+
+    :param handle: ctypes pointer to an SDL object
+    :param category: "texture", "surface" or "font"
+    :param size: Size in bytes
+    :param owner: Widget that owns the object
+    """
+    if not handle:
+        return handle
+
+    key = None
+    if owner is not None:
+        key = own(owner)
+        owners[key].add(address(handle))
+
+    live[address(handle)] = Resource(handle, category, size, key)
+    return handle
+
+
+def own(owner):
+    """
+    Returns the resource key of a widget, starting to watch it for
+    garbage collection the first time
+
+    :param owner: Widget object
+    """
+    # id() can be reused once an owner dies, so owners get their own key
+    # that is never handed out twice
+    key = getattr(owner, "resource_key", None)
+    if key is None:
+        key = owner.resource_key = next(_keys)
+    if key not in owners:
+        owners[key] = set()
+        weakref.finalize(owner, dead_owners.append, key)
+    return key
+
+
+def release(handle):
+    """
+    Free a tracked SDL object
+
+    :param handle: ctypes pointer to an SDL object
+    """
+    if not handle:
+        return
+
+    resource = live.pop(address(handle), None)
+    if resource is None:
+        return
+    if resource.owner is not None and resource.owner in owners:
+        owners[resource.owner].discard(address(handle))
+
+    match resource.category:
+        case "texture":
+            sdl2.SDL_DestroyTexture(resource.handle)
+        case "surface":
+            sdl2.SDL_FreeSurface(resource.handle)
+        case "font":
+            sdl2.sdlttf.TTF_CloseFont(resource.handle)
+
+
+def release_owner(owner):
+    """
+    Free every SDL object owned by a widget
+
+    :param owner: Widget object or its resource key
+    """
+    if isinstance(owner, int):
+        key = owner
+    else:
+        key = getattr(owner, "resource_key", None)
+    for addr in owners.pop(key, ()):
+        resource = live.get(addr)
+        if resource is not None:
+            resource.owner = None
+            release(resource.handle)
+    for hook in release_hooks:
+        hook(key)
+
+
+def release_tree(widget):
+    """
+    Queue every SDL object owned by a widget and its children to be freed
+    by the next collect(), so it is safe to call from any thread
+
+    :param widget: Widget object
+    """
+    key = getattr(widget, "resource_key", None)
+    if key is not None:
+        dead_owners.append(key)
+    for child in widget.children:
+        release_tree(child)
+
+
+def collect():
+    """
+    Release resources of widgets that were garbage collected. Called from
+    the main loop so SDL objects are only freed on the UI thread.
+    """
+    while dead_owners:
+        release_owner(dead_owners.pop())
+
+
+def release_all():
+    """
+    Free every tracked SDL object, used when shutting down
+    """
+    for resource in list(live.values()):
+        release(resource.handle)
+    owners.clear()
+    dead_owners.clear()
+
+
+def surface_size(surface):
+    """
+    Returns the pixel memory size of a surface in bytes
+
+    :param surface: SDL surface pointer
+    """
+    return surface.contents.pitch * surface.contents.h
+
+
+def create_texture(sdl_renderer, surface, owner=None):
+    """
+    Create a tracked texture from a surface
+
+    :param sdl_renderer: SDL renderer
+    :param surface: SDL surface pointer
+    :param owner: Widget that owns the texture
+    """
+    texture = sdl2.SDL_CreateTextureFromSurface(sdl_renderer, surface)
+    size = surface.contents.w * surface.contents.h * 4
+    return track(texture, "texture", size, owner)
+
+
+def create_target(sdl_renderer, width, height, owner=None):
+    """
+    Create a tracked, transparent texture that can be rendered into
+
+    :param sdl_renderer: SDL renderer
+    :param width: Texture width
+    :param height: Texture height
+    :param owner: Widget that owns the texture
+    """
+    texture = sdl2.SDL_CreateTexture(
+        sdl_renderer,
+        sdl2.SDL_PIXELFORMAT_ARGB8888,
+        sdl2.SDL_TEXTUREACCESS_TARGET,
+        width, height
+    )
+    if texture:
+        # Anything blended onto the cleared texture ends up premultiplied,
+        # so it has to be composited as such or soft edges turn dark.
+        # Renderers without custom blend modes fall back to plain blending.
+        premultiplied = sdl2.SDL_ComposeCustomBlendMode(
+            sdl2.SDL_BLENDFACTOR_ONE,
+            sdl2.SDL_BLENDFACTOR_ONE_MINUS_SRC_ALPHA,
+            sdl2.SDL_BLENDOPERATION_ADD,
+            sdl2.SDL_BLENDFACTOR_ONE,
+            sdl2.SDL_BLENDFACTOR_ONE_MINUS_SRC_ALPHA,
+            sdl2.SDL_BLENDOPERATION_ADD,
+        )
+        if sdl2.SDL_SetTextureBlendMode(texture, premultiplied) != 0:
+            sdl2.SDL_SetTextureBlendMode(texture, sdl2.SDL_BLENDMODE_BLEND)
+    return track(texture, "texture", width * height * 4, owner)
+
+
+def find_image(file_path):
+    """
+    Returns the path of an image, falling back to the images bundled with
+    TinyXUI when there is no such file
+
+    :param file_path: Path or bundled image name
+    """
+    if not os.path.exists(file_path):
+        bundled = files('tinyxui.data').joinpath(file_path)
+        if bundled.is_file():
+            return str(bundled)
+    return file_path
+
+
+def load_image(file_path):
+    """
+    Load an image file into a tracked surface
+
+    :param file_path: Path of the image
+    """
+    surface = sdl2.ext.load_image(file_path)
+    handle = ctypes.pointer(surface)
+    return track(handle, "surface", surface.pitch * surface.h)
+
+
+def load_image_bytes(data):
+    """
+    Decode encoded image bytes into a tracked surface
+
+    :param data: Encoded image bytes, such as the contents of a PNG file
+    """
+    image = PIL.Image.open(io.BytesIO(data))
+    surface = sdl2.ext.pillow_to_surface(image, as_argb=False)
+    handle = ctypes.pointer(surface)
+    return track(handle, "surface", surface.pitch * surface.h)
+
+
+def open_font(path, size):
+    """
+    Open a tracked font
+
+    :param path: Path of the font file
+    :param size: Point size
+    """
+    font = sdl2.sdlttf.TTF_OpenFont(bytes(str(path), 'utf-8'), size)
+    try:
+        file_size = os.path.getsize(path)
+    except OSError:
+        file_size = 0
+    return track(font, "font", file_size)
+
+
+def stats():
+    """
+    Returns the number of live SDL objects and their total size, overall
+    and per category
+    """
+    categories = {}
+    total_count = total_size = 0
+    for resource in live.values():
+        entry = categories.setdefault(
+            resource.category, {"count": 0, "bytes": 0})
+        entry["count"] += 1
+        entry["bytes"] += resource.size
+        total_count += 1
+        total_size += resource.size
+
+    return {
+        "count": total_count,
+        "bytes": total_size,
+        "categories": categories,
+    }
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's resource manager on its own!")
+    print("Import it into another codebase to use it.")
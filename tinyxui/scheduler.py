@@ -0,0 +1,148 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+import sdl2
+
+
+timers = []
+ui_thread = None
+_lock = threading.Lock()
+_counter = itertools.count()
+
+
+class Timer:
+    """
+    Handle for a scheduled callback, returned by after() and every()
+    """
+    def __init__(self, callback, interval, repeat=False):
+        self.callback = callback
+        self.interval = interval
+        self.repeat = repeat
+        self.deadline = time.monotonic() + interval
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Stop the timer from firing again
+        """
+        self.cancelled = True
+
+    def __repr__(self):
+        return (
+            f"Timer({self.callback}, interval={self.interval}, "
+            f"repeat={self.repeat}, cancelled={self.cancelled})"
+        )
+
+
+def wake():
+    """
+    Wake the main loop if it is sleeping waiting for events
+    """
+    event = sdl2.SDL_Event()
+    event.type = sdl2.SDL_USEREVENT
+    sdl2.SDL_PushEvent(event)
+
+
+def schedule(timer):
+    """
+    Push a timer onto the heap
+
+    :param timer: Timer object
+    """
+    with _lock:
+        heapq.heappush(timers, (timer.deadline, next(_counter), timer))
+        earliest = timers[0][2] is timer
+
+    # A sleeping main loop only knows about the deadline it went to sleep
+    # with, so an earlier timer from another thread has to wake it up
+    if earliest and ui_thread is not None and \
+            threading.get_ident() != ui_thread:
+        wake()
+    return timer
+
+
+def after(ms, callback):
+    """
+    Run a function once on the UI thread after a delay
+
+    :param ms: Delay in milliseconds
+    :param callback: Function to run
+    """
+    return schedule(Timer(callback, ms / 1000))
+
+
+def every(ms, callback):
+    """
+    Run a function repeatedly on the UI thread
+
+    :param ms: Interval in milliseconds
+    :param callback: Function to run
+    """
+    return schedule(Timer(callback, ms / 1000, repeat=True))
+
+
+def next_timeout():
+    """
+    Returns milliseconds until the next timer is due, or None if there
+    are no timers left
+    """
+    with _lock:
+        while timers and timers[0][2].cancelled:
+            heapq.heappop(timers)
+        if not timers:
+            return None
+        deadline = timers[0][0]
+
+    return max(0, int((deadline - time.monotonic()) * 1000 + 0.999))
+
+
+def run_due():
+    """
+    Run every timer whose deadline has passed. Returns True if any ran.
+    Exceptions raised by callbacks are printed, they don't stop the loop.
+    """
+    now = time.monotonic()
+    due = []
+
+    with _lock:
+        while timers and timers[0][0] <= now:
+            due.append(heapq.heappop(timers)[2])
+
+    for timer in due:
+        if timer.cancelled:
+            continue
+
+        # The other due timers still run and a repeating timer keeps its
+        # schedule
+        try:
+            timer.callback()
+        except Exception:
+            traceback.print_exc()
+
+        if timer.repeat and not timer.cancelled:
+            # Stay on the original grid so intervals don't drift, but
+            # skip missed ticks instead of firing them in a burst
+            timer.deadline += timer.interval
+            if timer.deadline <= now:
+                timer.deadline = now + timer.interval
+            schedule(timer)
+
+    return bool(due)
+
+
+def clear():
+    """
+    Cancel and remove all timers
+    """
+    with _lock:
+        for _, _, timer in timers:
+            timer.cancelled = True
+        timers.clear()
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's scheduler on its own!")
+    print("Import it into another codebase to use it.")
@@ -0,0 +1,250 @@
+import re
+from . import style_provider
+
+
+DIRECTIONS = ("horizontal", "vertical")
+ALIGNMENTS = ("start", "left", "top", "center", "hcenter", "vcenter",
+              "end", "right", "bottom")
+
+# align value -> (horizontal, vertical) alignment, None keeps "start"
+ALIGN = {
+    "start": ("start", "start"),
+    "left": ("start", None),
+    "top": (None, "start"),
+    "center": ("center", "center"),
+    "hcenter": ("center", None),
+    "vcenter": (None, "center"),
+    "end": ("end", "end"),
+    "right": ("end", None),
+    "bottom": (None, "end"),
+}
+
+# Attributes every widget understands, as name -> (type, default)
+COMMON = {
+    "id": ("string", None),
+    "class": ("string", ""),
+    "page": ("string", None),
+    "bind": ("string", None),
+    "visible": ("bool", True),
+    "align": (ALIGNMENTS, "start"),
+    "direction": (DIRECTIONS, "vertical"),
+    "expand": ("bool", False),
+    "hexpand": ("bool", False),
+    "vexpand": ("bool", False),
+    "cache": ("bool", False),
+    "layer": ("bool", False),
+    "clip": ("bool", False),
+}
+
+# Extra attributes and overridden defaults per widget type
+WIDGETS = {
+    "label": {
+        "wrap": ("bool", False),
+        "ellipsize": ("bool", False),
+        "width": ("size", None),
+    },
+    "button": {
+        "width": ("size", 72),
+        "height": ("size", 32),
+    },
+    "icon": {
+        "src": ("string", None),
+        "size": ("size", 16),
+        "symbolic": ("bool", False),
+    },
+    "image": {
+        "src": ("string", "missing.png"),
+        "size": ("size", None),
+        "width": ("size", 16),
+        "height": ("size", 16),
+    },
+    "separator": {
+        "direction": (DIRECTIONS, "horizontal"),
+        "width": ("size", 128),
+        "height": ("size", 128),
+    },
+    "spacer": {
+        "width": ("size", 0),
+        "height": ("size", 0),
+    },
+    "progressbar": {
+        "width": ("size", 128),
+        "height": ("size", 8),
+        "progress": ("progress", 0),
+        "interpolate": ("number", 0),
+    },
+    "progressfill": {
+        "width": ("size", None),
+        "height": ("size", 8),
+    },
+    "stack": {
+        "active": ("page", 0),
+    },
+}
+
+NUMBER = re.compile(r"-?(\d+\.?\d*|\.\d+)")
+
+
+def to_number(value):
+    """
+    Any int or float, numeric strings are accepted too
+
+    :param value: Parsed value
+    """
+    if isinstance(value, str) and NUMBER.fullmatch(value.strip()):
+        value = float(value)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("expected a number")
+    return value
+
+
+def to_size(value):
+    """
+    A non-negative whole number of pixels
+
+    :param value: Parsed value
+    """
+    value = to_number(value)
+    if value < 0:
+        raise ValueError("expected a size of 0 or more")
+    return int(value)
+
+
+def to_progress(value):
+    """
+    A number clamped to 0-100
+
+    :param value: Parsed value
+    """
+    return max(0, min(100, to_number(value)))
+
+
+def to_bool(value):
+    """
+    true or false
+
+    :param value: Parsed value
+    """
+    if not isinstance(value, bool):
+        raise ValueError("expected true or false")
+    return value
+
+
+def to_string(value):
+    """
+    A string, numbers are turned into strings
+
+    :param value: Parsed value
+    """
+    if isinstance(value, bool) or \
+            not isinstance(value, (str, int, float)):
+        raise ValueError("expected a string")
+    return str(value)
+
+
+def to_page(value):
+    """
+    A page index or a page name
+
+    :param value: Parsed value
+    """
+    # Pages are picked by index or by name
+    if isinstance(value, int) and not isinstance(value, bool):
+        if value < 0:
+            raise ValueError("expected a page index of 0 or more")
+        return value
+    return to_string(value)
+
+
+CONVERTERS = {
+    "number": to_number,
+    "size": to_size,
+    "progress": to_progress,
+    "bool": to_bool,
+    "string": to_string,
+    "page": to_page,
+}
+
+
+def spec(name, attribute):
+    """
+    Returns the (type, default) of a widget attribute, or None if the
+    attribute isn't part of the schema
+
+    :param name: Widget type, such as "button"
+    :param attribute: Attribute name
+    """
+    widget_spec = WIDGETS.get(name)
+    if widget_spec is not None and attribute in widget_spec:
+        return widget_spec[attribute]
+    if attribute.startswith("bind_"):
+        return ("string", None)
+    return COMMON.get(attribute)
+
+
+def convert(name, attribute, value):
+    """
+    Check and convert a single attribute value, raises ValueError if it
+    doesn't fit the attribute's type
+
+    :param name: Widget type, such as "button"
+    :param attribute: Attribute name
+    :param value: Parsed value
+    """
+    attribute_spec = spec(name, attribute)
+    if attribute_spec is None:
+        return value
+    kind = attribute_spec[0]
+
+    try:
+        if isinstance(kind, tuple):
+            if not isinstance(value, str) or value.lower() not in kind:
+                raise ValueError(f"expected one of {', '.join(kind)}")
+            return value.lower()
+        return CONVERTERS[kind](value)
+    except ValueError as e:
+        raise ValueError(
+            f"{name} attribute {attribute}={value!r} is invalid, {e}!"
+        ) from None
+
+
+def apply(widget, skip=()):
+    """
+    Convert a widget's attributes and fill in the defaults of its type.
+    The results are stored in widget.props, along with the alignment and
+    expand flags layout uses, so nothing is converted while rendering.
+
+    :param widget: Widget object
+    :param skip: Attributes to leave out, such as ones using template
+        variables that are filled in later
+    """
+    props = {key: default for key, (_, default) in COMMON.items()}
+    for key, (_, default) in WIDGETS.get(widget.name, {}).items():
+        props[key] = default
+
+    for key, value in widget.attributes.items():
+        if key in skip:
+            continue
+        value = convert(widget.name, key, value)
+        widget.attributes[key] = value
+        props[key] = value
+    widget.props = props
+
+    halign, valign = ALIGN[props["align"]]
+    widget.halign = halign or "start"
+    widget.valign = valign or "start"
+
+    # "expand" is a shortcut for both directions
+    widget.hexpand = props["hexpand"] or props["expand"]
+    widget.vexpand = props["vexpand"] or props["expand"]
+
+    # Resolved once here so computed styles are looked up without
+    # splitting the class attribute again
+    widget.classes = style_provider.style_classes(widget)
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's attribute schema on its own!")
+    print("Import it into another codebase to use it.")
@@ -0,0 +1,170 @@
+import gc
+import os
+import random
+import sys
+import sdl2
+from . import main
+from . import resources
+from . import scheduler
+
+
+# Allowed growth between the first and second half of a run, per metric
+TOLERANCE = {
+    "sdl_objects": 0,
+    "sdl_bytes": 0,
+    "python_objects": 2000,
+    "heap_blocks": 20000,
+    "rss": 8 * 1024 * 1024,
+}
+
+
+def rss():
+    """
+    Returns the resident set size of this process in bytes
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak instead of current RSS, still good enough to see growth
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def sample(frame):
+    """
+    Take a snapshot of native and Python memory use
+
+    :param frame: Frame number of the snapshot
+    """
+    stats = resources.stats()
+    return {
+        "frame": frame,
+        "sdl_objects": stats["count"],
+        "sdl_bytes": stats["bytes"],
+        "python_objects": len(gc.get_objects()),
+        "heap_blocks": sys.getallocatedblocks(),
+        "rss": rss(),
+    }
+
+
+def growth(samples, warmup=0.1):
+    """
+    Compare the peak of each metric in the first and second half of a
+    run, skipping the warmup. Bounded memory levels off, leaks keep
+    growing into the second half.
+
+    :param samples: List of snapshots from sample()
+    :param warmup: Fraction of samples to ignore at the start
+    """
+    settled = samples[int(len(samples) * warmup):]
+    half = len(settled) // 2
+    if half == 0:
+        return {metric: 0 for metric in TOLERANCE}
+
+    first, second = settled[:half], settled[half:]
+    return {
+        metric: max(s[metric] for s in second) -
+        max(s[metric] for s in first)
+        for metric in TOLERANCE
+    }
+
+
+def churn(rng, reload_file, reload_every, frame):
+    """
+    Apply one random update to the running document
+
+    :param rng: random.Random instance
+    :param reload_file: TXM document to reload
+    :param reload_every: Reload the document every this many frames
+    :param frame: Current frame number
+    """
+    if reload_every and frame % reload_every == 0:
+        main.load_txm(reload_file)
+        return
+
+    window = main.windows()[0]
+    ids = list(window.widget_map)
+    if not ids:
+        return
+    widget_id = rng.choice(ids)
+    widget = window.widget_map[widget_id]
+
+    match widget.name:
+        case "image":
+            main.refresh_image(widget_id)
+        case "progressbar":
+            main.set_attribute(widget_id, "progress", rng.uniform(0, 100))
+        case _:
+            text = "".join(rng.choice("abcdefghij0123456789 :")
+                           for _ in range(rng.randint(1, 24)))
+            main.set_data(widget_id, text)
+
+
+def run(file, frames=1000000, sample_every=1000, reload_every=5000,
+        seed=0):
+    """
+    Drive a headless window through many frames of random updates and
+    report whether SDL objects, Python objects or RSS grow without bound.
+    Bindings have to be registered before running, like for start().
+
+    :param file: TXM document to run
+    :param frames: Number of frames to render
+    :param sample_every: Take a memory snapshot every this many frames
+    :param reload_every: Reload the document every this many frames, 0
+        to never reload
+    :param seed: Seed for the random updates
+    """
+    rng = random.Random(seed)
+    samples = []
+    count = [0]
+    unreleased = {}
+
+    def on_frame(duration, relayout):
+        count[0] += 1
+        if count[0] % sample_every == 0:
+            samples.append(sample(count[0]))
+        if count[0] >= frames:
+            event = sdl2.SDL_Event()
+            event.type = sdl2.SDL_QUIT
+            sdl2.SDL_PushEvent(event)
+
+    # One update per pass of the main loop, and every update redraws
+    timer = scheduler.every(
+        0, lambda: churn(rng, file, reload_every, count[0] + 1))
+
+    def on_shutdown():
+        # Only the shared fonts are meant to outlive the windows, anything
+        # else still alive was never released
+        categories = resources.stats()["categories"]
+        unreleased.update((category, entry["count"])
+                          for category, entry in categories.items()
+                          if category != "font")
+
+    previous = (main.on_frame, main.on_shutdown)
+    main.on_frame = on_frame
+    main.on_shutdown = on_shutdown
+    try:
+        main.start(file, headless=True)
+    finally:
+        main.on_frame, main.on_shutdown = previous
+        timer.cancel()
+
+    grown = growth(samples)
+    leaks = [metric for metric, amount in grown.items()
+             if amount > TOLERANCE[metric]]
+    return {
+        "frames": count[0],
+        "samples": samples,
+        "growth": grown,
+        "leaks": leaks,
+        "passed": not leaks and not unreleased,
+        # Category -> number of SDL objects left after the windows closed
+        "unreleased": unreleased,
+    }
+
+
+if __name__ == "__main__":
+    """Errors if you try to run TinyXUI on its own"""
+    print("Do not run TinyXUI's soak harness on its own!")
+    print("Import it into another codebase to use it.")
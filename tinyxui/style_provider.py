@@ -1,144 +1,278 @@
 import re
 import sdl2
-from sdl2.sdlgfx import lineRGBA
+
+
+# Widgets that get their direction as a style class, the default
+# direction of each comes from the attribute schema
+ORIENTABLE = ("separator", "box")
+STATES = ("hover", "active")
+stylesheets = {}
 
 
 class Node:
-    def __init__(self, selector=None, properties=None):
+    def __init__(self, selector=None, properties=None, order=0):
         self.selector = selector
         self.properties = properties if properties else []
+        self.order = order
+        self.type = None
+        self.id = None
+        self.classes = ()
+        self.states = ()
+        self.specificity = (0, 0, 0)
+        # Combinators and attribute selectors aren't supported, a rule
+        # that can't be compiled never matches
+        self.supported = True
+        self.compile()
+
+    def compile(self):
+        """
+        Split a compound selector like button.flat#ok:hover into parts
+        and compute its specificity
+        """
+        parts = re.findall(r'([.#:]?)([\w\-]+|\*)', self.selector or "")
+        if "".join(p + n for p, n in parts) != (self.selector or ""):
+            self.supported = False
+            return
+
+        classes = []
+        states = []
+        for prefix, name in parts:
+            if prefix == "#":
+                self.id = name
+            elif prefix == ".":
+                classes.append(name)
+            elif prefix == ":":
+                states.append(name)
+            elif name != "*":
+                self.type = name
+
+        self.classes = tuple(classes)
+        self.states = tuple(states)
+        self.specificity = (
+            1 if self.id else 0,
+            len(self.classes) + len(self.states),
+            1 if self.type else 0,
+        )
+
+    def matches(self, name, widget_id, classes, state):
+        """
+        Check if this rule applies to a widget
+
+        :param name: Widget name
+        :param widget_id: Widget ID or None
+        :param classes: Set of widget classes
+        :param state: Current widget state or None
+        """
+        if not self.supported:
+            return False
+        if self.type is not None and self.type != name:
+            return False
+        if self.id is not None and self.id != widget_id:
+            return False
+        for cls in self.classes:
+            if cls not in classes:
+                return False
+        for pseudo in self.states:
+            if pseudo != state:
+                return False
+        return True
 
     def __repr__(self):
         return f"Node(selector={self.selector}, properties={self.properties})"
-    
 
-class Provider:
-    def filledCircle(sdl_renderer, x, y, rad, r, g, b, a):
-        sdl2.sdlgfx.filledCircleRGBA(sdl_renderer, x, y, rad, r, g, b, a)
-        sdl2.sdlgfx.aacircleRGBA(sdl_renderer, x, y, rad, r, g, b, a)
 
+class Stylesheet:
+    """
+    Compiled stylesheet. Rules are bucketed by id, class and type so only
+    rules that can possibly match a widget are checked, and the computed
+    style for each kind of widget is cached.
+    """
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.selectors = {}
+        self.by_id = {}
+        self.by_class = {}
+        self.by_type = {}
+        self.universal = []
+        self.cache = {}
+
+        for node in nodes:
+            # First rule wins for exact selector lookups, like before
+            self.selectors.setdefault(node.selector, node)
+
+            if node.id is not None:
+                self.by_id.setdefault(node.id, []).append(node)
+            elif node.classes:
+                self.by_class.setdefault(node.classes[0], []).append(node)
+            elif node.type is not None:
+                self.by_type.setdefault(node.type, []).append(node)
+            else:
+                self.universal.append(node)
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def compute(self, name, widget_id=None, classes=(), state=None):
+        """
+        Get the cascaded properties for a widget description
+
+        :param name: Widget name
+        :param widget_id: Widget ID or None
+        :param classes: Tuple of widget classes
+        :param state: "hover", "active" or None
+        """
+        key = (name, widget_id, classes, state)
+        styles = self.cache.get(key)
+        if styles is not None:
+            return styles
+
+        candidates = list(self.universal)
+        candidates += self.by_type.get(name, ())
+        if widget_id is not None:
+            candidates += self.by_id.get(widget_id, ())
+        for cls in classes:
+            candidates += self.by_class.get(cls, ())
+
+        class_set = set(classes)
+        matched = [node for node in candidates
+                   if node.matches(name, widget_id, class_set, state)]
+        matched.sort(key=lambda node: (node.specificity, node.order))
+
+        styles = {}
+        for node in matched:
+            for prop in node.properties:
+                styles[prop["property"]] = prop["value"]
+
+        self.cache[key] = styles
+        return styles
+
+
+def style_classes(widget):
+    """
+    Returns the style classes of a widget, from its class attribute and
+    its direction for orientable widgets
+
+    :param widget: Widget object
+    """
+    classes = widget.props["class"].split()
+    if widget.name in ORIENTABLE:
+        direction = widget.props["direction"]
+        if direction not in classes:
+            classes.append(direction)
+    return tuple(classes)
+
+
+def widget_state(widget):
+    """
+    Returns the pseudo-class state of a widget, active wins over hover
+
+    :param widget: Widget object
+    """
+    if widget.active:
+        return "active"
+    if widget.hovered:
+        return "hover"
+    return None
+
+
+class Provider:
     @staticmethod
-    def roundedRect(sdl_renderer, x1, y1, w, h, radius, r, g, b, a):
+    def roundedRect(display_list, x1, y1, w, h, radius, r, g, b, a):
+        """
+        Add a rounded rectangle to a display list. Radii of at least half
+        the height give a pill shape.
+
+        :param display_list: DisplayList to add to
+        :param x1: Left edge
+        :param y1: Top edge
+        :param w: Right edge
+        :param h: Bottom edge
+        :param radius: Corner radius
+        """
         width = w - x1
         height = h - y1
+        color = (r, g, b, a)
 
-        raw_radius = radius
-        max_radius = height // 2
-        radius = max(0, min(raw_radius, max_radius))
-
-        if raw_radius >= height // 2:
-            circle_positions = [
-                (x1 + radius, y1 + radius),
-                (w - radius, y1 + radius)
-            ]
-            for cx, cy in circle_positions:
-                Provider.filledCircle(sdl_renderer, cx, cy, radius, r, g, b, a)
-            sdl2.SDL_SetRenderDrawColor(sdl_renderer, r, g, b, a)
-            sdl2.SDL_RenderFillRect(
-                sdl_renderer,
-                sdl2.SDL_Rect(x1 + radius, y1, width - radius * 2, height + 1)
-            )
+        if radius >= height // 2:
+            # Pill shapes reach one pixel past their right and bottom edge
+            radius = max(0, height // 2)
+            display_list.rounded_rect(x1, y1, w + 1, h + 1, radius, color)
         else:
-            circle_positions = [
-                (x1 + radius, y1 + radius),
-                (w - radius - 1, y1 + radius),
-                (x1 + radius, h - radius - 1),
-                (w - radius - 1, h - radius - 1),
-            ]
-
-            for cx, cy in circle_positions:
-                Provider.filledCircle(sdl_renderer, cx, cy, radius, r, g, b, a)
-            sdl2.SDL_SetRenderDrawColor(sdl_renderer, r, g, b, a)
-            sdl2.SDL_RenderFillRect(
-                sdl_renderer,
-                sdl2.SDL_Rect(x1 + radius, y1, width - radius * 2, height)
-            )
-
-            sdl2.SDL_RenderFillRect(
-                sdl_renderer,
-                sdl2.SDL_Rect(x1, y1 + radius, width, height - radius * 2)
-            )
+            display_list.rounded_rect(x1, y1, w, h, max(0, radius), color)
 
+    @staticmethod
+    def get_style(ast, widget, with_state=True):
+        """
+        Get the computed style of a widget, including its current state
+        
+        :param ast: Compiled stylesheet
+        :param widget: Widget object
+        :param with_state: Apply :hover and :active rules
+        """
+        return ast.compute(
+            widget.name,
+            widget.attributes.get("id"),
+            widget.classes,
+            widget_state(widget) if with_state else None
+        )
 
     @staticmethod
-    def draw(ast, widget, sdl_renderer):
-        for node in ast:
-            if node.selector == widget.name:
-                
-                def get_styles_for_widget(widget_name):
-                    styles = {prop["property"]: prop["value"] for prop in
-                              Provider.get_properties_for_selector(
-                                  ast, widget_name)}
-
-                    if widget.active:
-                        active_styles = {
-                            prop["property"]:
-                            prop["value"] for prop in
-                            Provider.get_properties_for_selector(
-                                ast, f"{widget_name}:active")}
-                        if active_styles:
-                            styles.update(active_styles)               
-                    
-                    elif widget.hovered:
-                        hover_styles = {
-                            prop["property"]: prop["value"] for prop in
-                            Provider.get_properties_for_selector(
-                                ast, f"{widget_name}:hover")}
-                        if hover_styles:
-                            styles.update(hover_styles)
-
-                    return styles
-                
-                styles = get_styles_for_widget(widget.name)
-
-                bg = styles.get("background", "#ffffff")
-                radius = styles.get("border-radius", 0)
-
-                # Single border color fallback
-                border_color = styles.get("border-color", bg)
-                border_width = styles.get("border-width", 1)
-                bc = hex_to_argb(border_color)
-                bgc = hex_to_argb(bg)
-
-                x, y = widget.x, widget.y
-                w, h = widget.width, widget.height
-
-                if radius == 0:
-                    # Per-side border colors only if radius is 0
-                    bc_top = hex_to_argb(
-                        styles.get("border-top-color", border_color))
-                    bc_right = hex_to_argb(
-                        styles.get("border-right-color", border_color))
-                    bc_bottom = hex_to_argb(
-                        styles.get("border-bottom-color", border_color))
-                    bc_left = hex_to_argb(
-                        styles.get("border-left-color", border_color))
-
-                    lineRGBA(sdl_renderer, x, y, x + w - 1, y, bc_top.r,
-                             bc_top.g, bc_top.b, 255)
-                    lineRGBA(sdl_renderer, x + w - 1, y, x + w - 1, y + h - 1,
-                            bc_right.r, bc_right.g, bc_right.b, 255)
-                    lineRGBA(sdl_renderer, x, y + h - 1, x + w - 1, y + h - 1,
-                             bc_bottom.r, bc_bottom.g, bc_bottom.b, 255)
-                    lineRGBA(sdl_renderer, x, y, x, y + h - 1, bc_left.r,
-                             bc_left.g, bc_left.b, 255)
-                else:
-                    Provider.roundedRect(
-                        sdl_renderer,
-                        x, y,
-                        x + w, y + h,
-                        radius,
-                        bc.r, bc.g, bc.b, 255     
-                    )
-
-                # Draw background
-                Provider.roundedRect(
-                    sdl_renderer,
-                    (x + border_width), (y + border_width),
-                    x + w - border_width, y + h - border_width,
-                    radius,
-                    bgc.r, bgc.g, bgc.b, 255
-                )
+    def draw(ast, widget, display_list):
+        """
+        Add a widget's border and background to a display list
+
+        :param ast: Compiled stylesheet
+        :param widget: Widget object
+        :param display_list: DisplayList to add to
+        """
+        styles = Provider.get_style(ast, widget)
+        if not styles:
+            return
+
+        bg = styles.get("background", "#ffffff")
+        radius = styles.get("border-radius", 0)
+
+        # Single border color fallback
+        border_color = styles.get("border-color", bg)
+        border_width = styles.get("border-width", 1)
+        bc = hex_to_argb(border_color)
+        bgc = hex_to_argb(bg)
+
+        x, y = widget.x, widget.y
+        w, h = widget.width, widget.height
+
+        if radius == 0:
+            # Per-side border colors only if radius is 0, each side is a
+            # one pixel line
+            sides = (
+                ("border-top-color", (x, y, w, 1)),
+                ("border-right-color", (x + w - 1, y, 1, h)),
+                ("border-bottom-color", (x, y + h - 1, w, 1)),
+                ("border-left-color", (x, y, 1, h)),
+            )
+            for name, rect in sides:
+                c = hex_to_argb(styles.get(name, border_color))
+                display_list.fill_rect(*rect, (c.r, c.g, c.b, 255))
+        else:
+            Provider.roundedRect(
+                display_list,
+                x, y,
+                x + w, y + h,
+                radius,
+                bc.r, bc.g, bc.b, 255     
+            )
+
+        # Draw background
+        Provider.roundedRect(
+            display_list,
+            (x + border_width), (y + border_width),
+            x + w - border_width, y + h - border_width,
+            radius,
+            bgc.r, bgc.g, bgc.b, 255
+        )
 
 
     @staticmethod
@@ -150,14 +284,15 @@ class Provider:
         :param selector_name: Widget/class selector
         :param property_name: Property to get
         """
-        for node in ast:
-            if node.selector == selector_name:
-                # Find the property in the node's properties list
-                for prop in node.properties:
-                    if prop['property'] == property_name:
-                        return prop['value']
+        node = ast.selectors.get(selector_name)
+        if node is not None:
+            # Find the property in the node's properties list
+            for prop in node.properties:
+                if prop['property'] == property_name:
+                    return prop['value']
         return None
     
+    @staticmethod
     def get_properties_for_selector(ast, selector_name):
         """
         Get's all properties from a selector
@@ -165,9 +300,9 @@ class Provider:
         :param ast: CSS AST to search through
         :param selector_name: Widget/class selector
         """
-        for node in ast:
-            if node.selector == selector_name:
-                return node.properties
+        node = ast.selectors.get(selector_name)
+        if node is not None:
+            return node.properties
         return []
 
 
@@ -195,10 +330,9 @@ def generate_ast(stylesheet):
     # Strip extra spaces and split by curly braces (to handle each rule block)
     rule_blocks = re.findall(r'([^{]+)\s*{([^}]+)}', css)
     
-    ast = []
+    nodes = []
 
-    for selector, properties_str in rule_blocks:
-        selector = selector.strip()
+    for selectors, properties_str in rule_blocks:
 
         # Split the properties and values
         properties = []
@@ -215,7 +349,21 @@ def generate_ast(stylesheet):
                     properties.append(
                         {'property': property_name, 'value': property_value})
         
-        # Create a Node for each rule and add to the AST
-        ast.append(Node(selector, properties))
+        # Create a Node for each selector in the rule
+        for selector in selectors.split(","):
+            nodes.append(Node(selector.strip(), properties, len(nodes)))
+
+    return Stylesheet(nodes)
 
+
+def get_stylesheet(stylesheet):
+    """
+    Load and compile a stylesheet once, later calls return the cached copy
+    
+    :param stylesheet: Path to the stylesheet
+    """
+    ast = stylesheets.get(str(stylesheet))
+    if ast is None:
+        ast = generate_ast(stylesheet)
+        stylesheets[str(stylesheet)] = ast
     return ast
\ No newline at end of file
@@ -1,4 +1,9 @@
 import re
+from . import schema
+
+
+# $name or ${name} in a string value, replaced by template variables
+VARIABLE = re.compile(r"\$\{([A-Za-z_]\w*)\}|\$([A-Za-z_]\w*)")
 
 
 class Widget:
@@ -7,7 +12,7 @@ class Widget:
     """
     def __init__(self, name, attributes=None, children=None, data=None, x=0,
                 y=0, width=0, height=0, hovered=False, active=False,
-                margin=[0, 0, 0, 0]):
+                margin=[0, 0, 0, 0], parent=None):
         self.name = name
         self.attributes = attributes or {}
         self.children = children or []
@@ -19,6 +24,61 @@ class Widget:
         self.hovered = hovered
         self.active = active
         self.margin = margin
+        self.parent = parent
+        self.measured = None
+        # Area covered by the widget and its children after layout
+        self.bounds = None
+        # Width wrapped and ellipsized labels lay out their text in
+        self.wrap_width = None
+        # Unparsed TXM lines of a stack page that hasn't been shown yet,
+        # as (lines, document, line number of the first line, templates)
+        self.source = None
+        # Template variables used in the attributes or data
+        self.variables = ()
+        # Copies of a template share attributes and props with it until
+        # they change one, see own_attributes()
+        self.shared = False
+        # Converted attributes with defaults, see schema.apply()
+        schema.apply(self)
+
+    def own_attributes(self):
+        """
+        Give a template copy its own attributes and props before they are
+        changed
+        """
+        if self.shared:
+            self.attributes = dict(self.attributes)
+            self.props = dict(self.props)
+            self.shared = False
+
+    def is_active_page(self, index, page):
+        """
+        Check if a child of a stack is the page being shown. The stack's
+        active attribute is either a page index or a page name.
+
+        :param index: Position of the page in the stack
+        :param page: Page widget
+        """
+        active = self.props["active"]
+        if isinstance(active, int):
+            return index == active
+        name = page.props["page"]
+        return (page.props["id"] if name is None else name) == active
+
+    def visible_children(self):
+        """
+        Returns the children that take part in layout, drawing and hit
+        testing. Stacks only show their active page, and other widgets
+        hide children with visible=false.
+        """
+        if self.name == "stack":
+            return [child for index, child in enumerate(self.children)
+                    if self.is_active_page(index, child)]
+        for child in self.children:
+            if not child.props["visible"]:
+                return [child for child in self.children
+                        if child.props["visible"]]
+        return self.children
 
     def __repr__(self):
         return (
@@ -44,8 +104,12 @@ class AST:
             return value[1:-1]
         
         # Integer
-        if value.isdigit():
+        if re.fullmatch(r"-?\d+", value):
             return int(value)
+
+        # Float
+        if re.fullmatch(r"-?(\d+\.\d*|\.\d+)", value):
+            return float(value)
         
         # Boolean
         if value == "true":
@@ -96,9 +160,9 @@ class AST:
     
 
     @staticmethod
-    def parse_widget(line):
+    def split_widget(line):
         """
-        Parse widget and its attributes
+        Parse a widget line into its name, attributes and data
         
         :param line: Line of TXM code to parse
         """
@@ -118,9 +182,307 @@ class AST:
             if data:
                 data = AST.parse_value(data)
 
-        return Widget(name, attributes, data=data)
+        return name, attributes, data
+
+    @staticmethod
+    def parse_widget(line, prototype=False):
+        """
+        Parse widget and its attributes
+        
+        :param line: Line of TXM code to parse
+        :param prototype: The widget is part of a template, attributes
+            using variables are converted once they are filled in
+        """
+        name, attributes, data = AST.split_widget(line)
+        if not (prototype and "$" in line):
+            return Widget(name, attributes, data=data)
+
+        templated = AST.templated_attributes(attributes)
+        widget = Widget(name, {key: value for key, value in attributes.items()
+                               if key not in templated}, data=data)
+        widget.attributes.update(templated)
+        widget.variables = AST.find_variables(widget)
+        return widget
+
+    @staticmethod
+    def templated_attributes(attributes):
+        """
+        Returns the attributes whose values use template variables
+        
+        :param attributes: Attribute dictionary
+        """
+        return {key: value for key, value in attributes.items()
+                if isinstance(value, str) and VARIABLE.search(value)}
+
+    @staticmethod
+    def find_variables(widget):
+        """
+        Returns the names of the template variables a widget uses
+        
+        :param widget: Widget object
+        """
+        names = set()
+        for value in (*widget.attributes.values(), widget.data):
+            if isinstance(value, str) and "$" in value:
+                for braced, bare in VARIABLE.findall(value):
+                    names.add(braced or bare)
+        return tuple(names)
+
+    @staticmethod
+    def substitute(value, variables):
+        """
+        Replace template variables in a value. A value that is only a
+        variable takes the variable's value as is, so numbers stay
+        numbers. Unknown variables are left alone for nested templates.
+        
+        :param value: Attribute value or data
+        :param variables: Dictionary of variable name -> value
+        """
+        if not isinstance(value, str) or "$" not in value:
+            return value
+        match = VARIABLE.fullmatch(value)
+        if match and (match.group(1) or match.group(2)) in variables:
+            return variables[match.group(1) or match.group(2)]
+
+        def replace(match):
+            name = match.group(1) or match.group(2)
+            if name not in variables:
+                return match[0]
+            # Variables passed on to a nested template keep their braces,
+            # so text after them isn't read as part of the name
+            return VARIABLE.sub(lambda m: "${" + (m.group(1) or m.group(2))
+                                + "}", str(variables[name]))
+        return VARIABLE.sub(replace, value)
+
+    @staticmethod
+    def instantiate(prototype, parent, variables, source, nested=False):
+        """
+        Copy a parsed template widget and its children under a parent.
+        Widgets that don't use any of the variables share their
+        attributes and props with the prototype, the rest get their own.
+        Raises ValueError if a variable the copy uses isn't set.
+        
+        :param prototype: Widget parsed from a template or repeat block
+        :param parent: Widget to add the copy to
+        :param variables: Dictionary of variable name -> value
+        :param source: What is copied for error messages, such as
+            "template row" or "repeat"
+        :param nested: The copy is part of another template, so variables
+            that aren't known yet are allowed
+        """
+        widget = object.__new__(Widget)
+        widget.__dict__.update(prototype.__dict__)
+        widget.parent = parent
+
+        substituted = prototype.variables and \
+            any(name in variables for name in prototype.variables)
+        if substituted:
+            widget.attributes = {
+                key: AST.substitute(value, variables)
+                for key, value in prototype.attributes.items()
+            }
+            widget.data = AST.substitute(prototype.data, variables)
+            widget.variables = AST.find_variables(widget)
+        if widget.variables and not nested:
+            raise ValueError(f"{source} variable "
+                             f"${min(widget.variables)} is not set!")
+        if substituted:
+            skip = AST.templated_attributes(widget.attributes) \
+                if nested else ()
+            schema.apply(widget, skip)
+        else:
+            widget.shared = True
+
+        widget.children = []
+        for child in prototype.children:
+            AST.instantiate(child, widget, variables, source, nested)
+        parent.children.append(widget)
+        return widget
+
+    @staticmethod
+    def expand_block(name, attributes, lines, parent, document, first_line,
+                     templates, nested=False):
+        """
+        Handle a template definition or a repeat or for block. The block
+        is parsed once, repeats copy the parsed widgets.
+
+            template(name="row") { ... }       defines row(title="x")
+            repeat(count=3, var="i") { ... }   $i counts from 0 to 2
+            for(var="i", from=1, to=3) { ... } $i counts from 1 to 3
+
+        :param name: template, repeat or for
+        :param attributes: Attributes of the block
+        :param lines: Lines inside the block
+        :param parent: Widget to add the copies to
+        :param document: File path of the lines, for error messages
+        :param first_line: Line number of the first line
+        :param templates: Dictionary of template name -> prototype
+        :param nested: The block is inside another template or repeat
+        """
+        prototype = Widget("template")
+        AST.parse_lines(lines, prototype, document=document,
+                        first_line=first_line, templates=templates,
+                        prototype=True)
+
+        def whole_number(key, default=None):
+            value = attributes.get(key, default)
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"{name} attribute {key}={value!r} is "
+                                 f"invalid, expected a whole number!")
+            return value
+
+        match name:
+            case "template":
+                template_name = attributes.get("name")
+                if not isinstance(template_name, str) or \
+                        not template_name.isidentifier():
+                    raise ValueError(f"template attribute name="
+                                     f"{template_name!r} is invalid!")
+                templates[template_name] = prototype
+                return
+            case "repeat":
+                values = range(max(0, whole_number("count")))
+            case "for":
+                values = range(whole_number("from", 0),
+                               whole_number("to") + 1)
+
+        variable = attributes.get("var", "index")
+        for value in values:
+            for child in prototype.children:
+                AST.instantiate(child, parent, {variable: value}, name,
+                                nested)
 
 
+    @staticmethod
+    def capture_block(lines, start):
+        """
+        Collect the lines of a widget block without parsing them. Returns
+        the lines and the index after the block's closing brace.
+        
+        :param lines: Lines of the TXM document
+        :param start: Index of the first line inside the block
+        """
+        depth = 1
+        index = start
+        while index < len(lines):
+            line = lines[index].strip()
+            index += 1
+            if line == "}":
+                depth -= 1
+                if depth == 0:
+                    return lines[start:index - 1], index
+            elif line.endswith("{") and not line.startswith("//"):
+                depth += 1
+        return lines[start:], index
+
+    @staticmethod
+    def parse_lines(lines, root, settings=None, document=None,
+                    first_line=1, templates=None, prototype=False):
+        """
+        Parse TXM lines into children of a widget. Pages of a stack that
+        aren't active are kept as unparsed lines until they are shown.
+        Malformed lines raise a SyntaxError pointing at the line.
+        
+        :param lines: Lines of TXM code
+        :param root: Widget to add the parsed widgets to
+        :param settings: Settings dictionary to fill, if settings are allowed
+        :param document: File path of the lines, for error messages
+        :param first_line: Line number of the first line
+        :param templates: Dictionary of template name -> prototype, filled
+            by template blocks
+        :param prototype: The lines are a template or repeat block. Their
+            stack pages are parsed right away so copies don't share
+            unparsed pages, and variables are only filled in by copies.
+        """
+        if templates is None:
+            templates = {}
+        stack = [root]
+        index = 0
+
+        while index < len(lines):
+            raw_line = lines[index]
+            line = raw_line.strip()
+            lineno = first_line + index
+            index += 1
+
+            if not line or line.startswith("//"):
+                continue
+
+            try:
+                # Settings
+                if line.startswith("!") and settings is not None:
+                    key, value = AST.parse_setting(raw_line)
+                    settings[key] = value
+                    continue
+
+                # End of widget block
+                if line == "}":
+                    stack.pop()
+                    continue
+
+                # Templates and repeats add copies of their block
+                name = line.split("(", 1)[0].strip()
+                if name in ("template", "repeat", "for"):
+                    if not line.endswith("{"):
+                        raise SyntaxError(f"{name} needs a block")
+                    _, attributes, _ = AST.split_widget(line)
+                    start = index
+                    block, index = AST.capture_block(lines, index)
+                    AST.expand_block(name, attributes, block, stack[-1],
+                                     document, first_line + start, templates,
+                                     prototype)
+                    continue
+                if name in templates:
+                    if line.endswith("{"):
+                        raise SyntaxError(
+                            f"Template {name} can't have children")
+                    _, attributes, _ = AST.split_widget(line)
+                    for child in templates[name].children:
+                        AST.instantiate(child, stack[-1], attributes,
+                                        f"template {name}", prototype)
+                    continue
+
+                widget = AST.parse_widget(line, prototype)
+            except (SyntaxError, TypeError, ValueError) as e:
+                # Errors inside a block already point at their line
+                if isinstance(e, SyntaxError) and e.lineno is not None:
+                    raise
+                message = e.msg if isinstance(e, SyntaxError) else str(e)
+                raise SyntaxError(
+                    f"Line {lineno}: {message}",
+                    (document, lineno, None, raw_line.rstrip("\n"))
+                ) from None
+
+            parent = stack[-1]
+            widget.parent = parent
+            parent.children.append(widget)
+
+            if line.endswith("{"):
+                page_index = len(parent.children) - 1
+                if not prototype and parent.name == "stack" and \
+                        not parent.is_active_page(page_index, widget):
+                    start = index
+                    source, index = AST.capture_block(lines, index)
+                    widget.source = (source, document, first_line + start,
+                                     templates)
+                else:
+                    stack.append(widget)
+
+    @staticmethod
+    def materialize(widget):
+        """
+        Parse the stored lines of a page that is shown for the first time
+        
+        :param widget: Page widget
+        """
+        if widget.source is None:
+            return False
+        lines, document, first_line, templates = widget.source
+        widget.source = None
+        AST.parse_lines(lines, widget, document=document,
+                        first_line=first_line, templates=templates)
+        return True
+
     @staticmethod
     def generate_ast(document):
         """
@@ -132,38 +494,16 @@ class AST:
             "window_title": "TinyXUI",
             "stylesheet": "default.css",
             "width": 320,
-            "height": 240
+            "height": 240,
+            "resizable": False
         }
         root = Widget(
             "root", attributes={"direction": "vertical", "expand": True})
-        stack = [root]
 
         with open(document, "r") as f:
             lines = f.readlines()
 
-        for raw_line in lines:
-            line = raw_line.strip()
-
-            if not line or line.startswith("//"):
-                continue
-
-            # Settings
-            if line.startswith("!"):
-                key, value = AST.parse_setting(raw_line)
-                settings[key] = value
-                continue
-
-            # End of widget block
-            if line == "}":
-                stack.pop()
-                continue
-
-            widget = AST.parse_widget(line)
-
-            stack[-1].children.append(widget)
-
-            if line.endswith("{"):
-                stack.append(widget)
+        AST.parse_lines(lines, root, settings, document=document)
 
         return settings, root
 